@@ -0,0 +1,253 @@
+"""Ajust automàtic dels paràmetres de binarització amb unes quantes imatges de mostra.
+
+Es busquen ``block_size``, ``C`` i ``opening_radius`` amb una graella
+gruixuda i, al voltant dels millors candidats, una de fina. La correcció
+d'il·luminació no es busca: es fa un sol cop a cada imatge sencera amb els
+paràmetres de partida (``illum_sigma``, ``illum_method``), com a la
+conversió, perquè en un retall no es veuen els degradats de llum de tota la
+pàgina. Cada candidat s'avalua en un retall de cada imatge de mostra: la versió
+reduïda (``engine.Pipeline.load_proxy``) només serveix per triar-ne la
+zona amb més contingut, i el retall és a la resolució original. En una
+imatge reduïda els traços de llapis queden d'un píxel i el soroll es
+promitja, de manera que la ``C`` que hi va bé deixa passar el soroll a la
+imatge sencera; al retall, en canvi, els valors trobats són els definitius.
+
+Cada candidat es puntua (més baix, millor) amb mesures objectives del
+traç, que és la classe minoritària de la imatge de treball:
+
+- defectes per cada 100 píxels d'esquelet: taques de menys de
+  ``SPECK_AREA`` píxels, extrems de l'esquelet (traços trencats) i trossos
+  d'esquelet separats;
+- fidelitat a la imatge original, normalitzada pel seu fons: fracció del
+  traç que és tan clar com el paper (borrons, traços engruixits) i fracció
+  dels píxels clarament foscos que no són traç (traços perduts).
+
+Els candidats s'avaluen en paral·lel en processos, com els lots.
+"""
+import argparse
+import concurrent.futures
+import dataclasses
+import itertools
+import multiprocessing
+import sys
+import time
+
+import cv2
+import numpy as np
+from skimage.morphology import skeletonize as sk_skeletonize
+
+import batch
+import config_manager
+import engine
+
+PROXY_SIZE = 512 # Costat màxim de les imatges reduïdes on es tria el retall
+CROP_SIZE = 384 # Costat del retall avaluat, en píxels de la imatge original
+SAMPLE_COUNT = 3
+SPECK_AREA = 6
+PAPER_LEVEL = 0.9 # Fracció del fons a partir de la qual un píxel és paper
+INK_LEVEL = 0.75 # Fracció del fons per sota de la qual un píxel és traç segur
+FIDELITY_WEIGHT = 20.0
+TUNED_FIELDS = ("block_size", "C", "opening_radius")
+
+COARSE_GRID = {"block_size": (5, 9, 15, 25, 41), "C": (3, 6, 10), "opening_radius": (0, 1)}
+
+_worker_samples = None
+_worker_pipeline = None
+
+
+@dataclasses.dataclass
+class Candidate:
+    """Un joc de paràmetres avaluat. ``params`` són els de partida amb ``values`` aplicats."""
+    values: dict
+    score: float = float("inf")
+    metrics: dict = dataclasses.field(default_factory=dict)
+    params: object = None
+
+
+def sample_images(paths, count=SAMPLE_COUNT):
+    """Fins a ``count`` imatges repartides per tota la llista."""
+    if len(paths) <= count: return list(paths)
+    return [paths[int(i)] for i in np.linspace(0, len(paths) - 1, count).round()]
+
+
+def densest_crop(img, size=CROP_SIZE):
+    """``(y, x)`` del retall de ``size`` x ``size`` amb més contrast, en una graella de mig retall."""
+    h, w = img.shape
+    size = min(size, h, w)
+    ys, xs = range(0, h - size + 1, max(1, size // 2)), range(0, w - size + 1, max(1, size // 2))
+    return max(((y, x) for y in ys for x in xs), key=lambda p: img[p[0]:p[0] + size, p[1]:p[1] + size].std())
+
+
+def normalized(img):
+    """Imatge dividida pel seu fons (1 = paper), per jutjar la fidelitat del traç."""
+    background = engine.estimate_background(img, min(img.shape) / 8, "fast")
+    return img.astype(np.float32) / np.maximum(background, 1).astype(np.float32)
+
+
+def illuminated(img, params):
+    """``img`` fins a la correcció d'il·luminació inclosa, com la prepara la conversió."""
+    for stage in engine.PREPROCESS_STAGES:
+        if stage.key(params) is not None: img = stage.run(img, params)
+        if stage.name == "illumination": return img
+    return img
+
+
+def measure(work, reference):
+    """Mesures del traç d'una imatge de treball binària; ``reference`` és ``normalized`` de l'original."""
+    ink = work > 127
+    if ink.mean() > 0.5: ink = ~ink # El traç és la classe minoritària
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(ink.view(np.uint8), 8, cv2.CV_32S)
+    small = stats[:, cv2.CC_STAT_AREA] < SPECK_AREA
+    small[0] = False
+    skeleton = sk_skeletonize(ink & ~small[labels]).view(np.uint8)
+    neighbours = cv2.filter2D(skeleton, cv2.CV_16S, np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]], np.int16), borderType=cv2.BORDER_CONSTANT)
+    dark = reference < INK_LEVEL
+    return {
+        "specks": int(np.count_nonzero(small)),
+        "endpoints": int(np.count_nonzero(skeleton & (neighbours == 1))),
+        "fragments": cv2.connectedComponents(skeleton, connectivity=8)[0] - 1,
+        "skeleton_px": int(np.count_nonzero(skeleton)),
+        "false_ink": round(np.count_nonzero(ink & (reference > PAPER_LEVEL)) / max(1, np.count_nonzero(ink)), 4),
+        "missed_ink": round(np.count_nonzero(dark & ~ink) / max(1, np.count_nonzero(dark)), 4),
+    }
+
+
+def score(metrics):
+    """Puntuació d'una imatge (més baixa, millor)."""
+    if metrics["skeleton_px"] == 0: return float("inf")
+    defects = (metrics["specks"] + metrics["endpoints"] + metrics["fragments"]) * 100 / metrics["skeleton_px"]
+    return defects + FIDELITY_WEIGHT * (metrics["false_ink"] + metrics["missed_ink"])
+
+
+def _init_worker(samples):
+    global _worker_samples, _worker_pipeline
+    _worker_samples, _worker_pipeline = samples, engine.Pipeline()
+
+
+def _evaluate(base, values_list, samples=None, pipeline=None):
+    """Mesures de cada joc de ``values_list`` a cada mostra ``(imatge, referència)``: una llista per candidat.
+
+    Les mostres ja tenen la il·luminació corregida; ``base`` no la torna a
+    aplicar.
+    """
+    if samples is None: samples, pipeline = _worker_samples, _worker_pipeline
+    return [[measure(pipeline.run(img, ("autotune", i), base.replace(**values)), ref) for i, (img, ref) in enumerate(samples)] for values in values_list]
+
+
+def coarse_candidates(grid=COARSE_GRID):
+    return [dict(zip(grid, combo)) for combo in itertools.product(*grid.values())]
+
+
+def fine_candidates(values):
+    """Veïns d'un candidat: mig pas de la graella gruixuda amunt i avall de la mida de bloc i de C."""
+    steps = {
+        "block_size": sorted({max(3, int(round(values["block_size"] * f)) | 1) for f in (0.8, 1.0, 1.25)}),
+        "C": (values["C"] - 2, values["C"], values["C"] + 2),
+        "opening_radius": (values["opening_radius"],),
+    }
+    return [dict(zip(steps, combo)) for combo in itertools.product(*steps.values())]
+
+
+class AutoTuner:
+    """Cerca els millors paràmetres de binarització per a unes imatges.
+
+    ``base`` són els paràmetres de partida, que també decideixen la
+    correcció d'il·luminació de les mostres. Si la graella gruixuda ja ha
+    gastat la meitat de ``time_budget`` segons, no es fa la fina. Amb ``workers`` 1, tot es fa al mateix procés.
+    """
+
+    def __init__(self, base, workers=None, proxy_size=PROXY_SIZE, crop_size=CROP_SIZE, time_budget=10.0, progress=None, grid=COARSE_GRID):
+        self.base = base
+        self.workers = workers or batch.default_workers()
+        self.proxy_size, self.crop_size = proxy_size, crop_size
+        self.time_budget = time_budget
+        self.progress = progress
+        self.grid = grid
+
+    def load(self, paths):
+        """Mostres ``(retall il·luminat, referència)`` de les imatges, a la resolució original."""
+        pipeline = engine.Pipeline()
+        samples = []
+        for path in paths:
+            _, img = pipeline.load(path)
+            _, proxy, factor = pipeline.load_proxy(path, self.proxy_size, self.proxy_size)
+            y, x = densest_crop(proxy, max(1, int(self.crop_size * factor)))
+            y, x = min(int(y / factor), max(0, img.shape[0] - self.crop_size)), min(int(x / factor), max(0, img.shape[1] - self.crop_size))
+            window = (slice(y, y + self.crop_size), slice(x, x + self.crop_size))
+            samples.append((np.ascontiguousarray(illuminated(img, self.base)[window]), normalized(np.ascontiguousarray(img[window]))))
+        return samples
+
+    def run(self, paths, top=5, should_stop=None):
+        """Els ``top`` millors candidats per a les imatges de mostra de ``paths``, del millor al pitjor."""
+        start = time.perf_counter()
+        samples = self.load(sample_images(paths))
+        if not samples: return []
+        base = self.base.replace(median_filter=False, illum_sigma=0.0, tile_budget_mb=0) # Ja aplicats a les mostres
+        executor = None
+        if self.workers > 1:
+            ctx = multiprocessing.get_context("spawn")
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_init_worker, initargs=(samples,))
+        seen = {}
+        try:
+            self._evaluate_all(executor, base, samples, coarse_candidates(self.grid), seen)
+            if self.progress: self.progress("gruixuda", len(seen), time.perf_counter() - start)
+            if time.perf_counter() - start < self.time_budget / 2:
+                engine.check_cancel(should_stop)
+                best = sorted(seen.values(), key=lambda c: c.score)[:3]
+                self._evaluate_all(executor, base, samples, [v for c in best for v in fine_candidates(c.values)], seen)
+                if self.progress: self.progress("fina", len(seen), time.perf_counter() - start)
+        finally:
+            if executor is not None: executor.shutdown(cancel_futures=True)
+        ranked = sorted(seen.values(), key=lambda c: c.score)[:top]
+        for c in ranked: c.params = self.base.replace(**c.values)
+        return ranked
+
+    def _evaluate_all(self, executor, base, samples, values_list, seen):
+        new = []
+        for values in values_list:
+            key = tuple(values[name] for name in TUNED_FIELDS)
+            if values["block_size"] >= 3 and values["C"] >= 0 and key not in seen:
+                seen[key] = Candidate(values); new.append(values)
+        if not new: return
+        if executor is None:
+            measured = _evaluate(base, new, samples, engine.Pipeline())
+        else:
+            size = max(1, -(-len(new) // (2 * self.workers)))
+            chunks = [new[i:i + size] for i in range(0, len(new), size)]
+            measured = [m for chunk in executor.map(_evaluate, itertools.repeat(base), chunks) for m in chunk]
+        for values, per_image in zip(new, measured):
+            candidate = seen[tuple(values[name] for name in TUNED_FIELDS)]
+            candidate.score = round(float(np.mean([score(m) for m in per_image])), 3)
+            candidate.metrics = {name: int(sum(m[name] for m in per_image)) for name in ("specks", "endpoints", "fragments", "skeleton_px")}
+            for name in ("false_ink", "missed_ink"): candidate.metrics[name] = round(float(np.mean([m[name] for m in per_image])), 4)
+
+
+def format_candidate(rank, candidate):
+    p, m = candidate.params, candidate.metrics
+    return (f"{rank}. block_size={p.block_size} C={p.C} opening_radius={p.opening_radius}"
+            f"  puntuació {candidate.score:.2f} · taques {m['specks']} · extrems {m['endpoints']} · trossos {m['fragments']}"
+            f" · traç clar {m['false_ink']:.0%} · traç perdut {m['missed_ink']:.0%}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m autotune", description="Busca block_size, C i opening_radius per a una carpeta d'esbossos.")
+    parser.add_argument("folder", help="Carpeta d'imatges.")
+    parser.add_argument("-p", "--preset", default=config_manager.get_preset_names()[0], help="Preset de partida (per defecte: %(default)s).")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="Processos en paral·lel (0 = tots els nuclis).")
+    parser.add_argument("--top", type=int, default=5, help="Candidats a mostrar (per defecte: %(default)s).")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    paths = engine.list_images(args.folder)
+    if not paths:
+        print(f"Cap imatge a {args.folder}", file=sys.stderr); return 1
+    def progress(stage, count, seconds): print(f"Graella {stage}: {count} candidats, {seconds:.1f} s", flush=True)
+    tuner = AutoTuner(engine.ConversionParams.from_preset(args.preset), workers=args.jobs, progress=progress)
+    for rank, candidate in enumerate(tuner.run(paths, args.top), 1): print(format_candidate(rank, candidate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""Exportació per lots en paral·lel amb cancel·lació i informe per fitxer.
+
+``BatchRunner`` reparteix les imatges entre un grup de processos, reintenta
+els fitxers que fallen (per exemple, un error puntual de potrace) i, si un
+procés mor, torna a executar la resta de fitxers aïllats un a un perquè una
+sola imatge problemàtica no faci caure tot el lot. En acabar escriu
+``manifest.json`` i ``manifest.csv`` a la carpeta de sortida i, si es
+demana, un DXF únic amb tots els dibuixos del lot i ``trace.json``, amb el
+temps de cada etapa de cada fitxer en format Chrome trace-event.
+"""
+import concurrent.futures
+import csv
+import dataclasses
+import json
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+
+import dxf_writer
+import engine
+import profiling
+
+MANIFEST_JSON = "manifest.json"
+MANIFEST_CSV = "manifest.csv"
+COMBINED_DXF = "lot_combinat.dxf"
+TRACE_JSON = "trace.json"
+
+_worker_cancel_event = None
+
+
+@dataclasses.dataclass
+class FileResult:
+    """Resultat de la conversió d'una imatge."""
+    image: str
+    status: str  # "ok", "error" o "cancelled"
+    outputs: list = dataclasses.field(default_factory=list)
+    seconds: float = 0.0
+    attempts: int = 0
+    error: str = ""
+    cached: bool = False
+    stats: dict = dataclasses.field(default_factory=dict)
+    retryable: bool = dataclasses.field(default=True, repr=False)
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _init_worker(cancel_event):
+    global _worker_cancel_event
+    _worker_cancel_event = cancel_event
+
+
+def _convert_one(img_path, params, output_dir, cancel_event=None, cache=None, profile_dir=None):
+    """Converteix una imatge i retorna un ``FileResult`` (mai llança).
+
+    Amb ``cache`` (un ``ResultCache``), si la mateixa imatge ja s'ha
+    convertit amb els mateixos paràmetres se'n copien les sortides. Amb
+    ``profile_dir``, la conversió s'executa amb cProfile i les estadístiques
+    es desen a ``<profile_dir>/<nom>.prof``.
+    """
+    event = cancel_event if cancel_event is not None else _worker_cancel_event
+    should_stop = event.is_set if event is not None else None
+    start = time.perf_counter()
+    stats = {}
+    try:
+        engine.check_cancel(should_stop)
+        key = hit = None
+        if cache is not None:
+            with profiling.span("cache", cat="fitxer", image=os.path.basename(img_path)) as lookup:
+                key = cache.key(img_path, params)
+                hit = cache.get(key, img_path, output_dir)
+        if hit:
+            outputs, stats = hit
+            stats["spans"] = [lookup]
+            return FileResult(img_path, "ok", outputs, time.perf_counter() - start, cached=True, stats=stats)
+        prof_path = os.path.join(profile_dir, os.path.splitext(os.path.basename(img_path))[0] + ".prof") if profile_dir else None
+        if prof_path: os.makedirs(profile_dir, exist_ok=True)
+        with profiling.cprofile(prof_path), engine.timed(stats, "convert", cat="fitxer", image=os.path.basename(img_path)):
+            outputs = engine.convert_image(img_path, params, output_dir, should_stop=should_stop, stats=stats)
+        if key: cache.put(key, img_path, outputs, {k: v for k, v in stats.items() if k != "spans"})
+        status, error = "ok", ""
+    except engine.Cancelled:
+        outputs, status, error = [], "cancelled", ""
+    except engine.ConversionError as e:
+        # Imatge il·legible: reintentar-ho no serviria de res.
+        return FileResult(img_path, "error", [], time.perf_counter() - start, error=str(e), retryable=False)
+    except Exception as e:
+        outputs, status, error = [], "error", f"{type(e).__name__}: {e}"
+    return FileResult(img_path, status, outputs, time.perf_counter() - start, error=error, stats=stats)
+
+
+class BatchRunner:
+    """Executa un lot de conversions en un grup de processos.
+
+    ``workers`` <= 1 executa el lot en el mateix procés. ``retries`` és el
+    nombre de reintents per fitxer fallit. ``progress(done, total, result)``
+    es crida des del fil que executa ``run`` cada cop que acaba un fitxer.
+    Amb ``combined_dxf``, els DXF del lot s'ajunten en ``COMBINED_DXF``; amb
+    ``trace``, les etapes de tots els fitxers es desen a ``TRACE_JSON``.
+    ``profile_dir`` desa un perfil de cProfile per fitxer (vegeu ``_convert_one``).
+    ``cache`` és un ``result_cache.ResultCache`` opcional: les imatges que ja
+    hi són no es tornen a convertir i, en acabar, se n'aplica el límit de mida.
+    """
+
+    def __init__(self, params, output_dir, workers=None, retries=1, progress=None, combined_dxf=False, cache=None, trace=False, profile_dir=None):
+        self.params = params
+        self.output_dir = output_dir
+        self.workers = default_workers() if not workers else workers
+        self.retries = retries
+        self.progress = progress
+        self.combined_dxf = combined_dxf
+        self.combined_dxf_path = None
+        self.cache = cache
+        self.trace = trace
+        self.trace_path = None
+        self.profile_dir = profile_dir
+        self._ctx = multiprocessing.get_context("spawn")
+        self._cancel_event = self._ctx.Event() if self.workers > 1 else threading.Event()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Atura el lot: descarta els fitxers pendents i avisa els processos actius."""
+        self._cancel_event.set()
+        with self._lock:
+            if self._executor is not None: self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, image_files):
+        """Converteix ``image_files`` i retorna els ``FileResult`` en el mateix ordre."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._results, self._attempts, self._total = {}, {}, len(image_files)
+        if self.workers <= 1:
+            self._run_inline(image_files)
+        else:
+            pending = list(image_files)
+            if not self._run_pool(pending, self.workers):
+                # Un procés ha mort: repetim la resta d'un en un per aïllar-lo.
+                for img_path in [f for f in pending if f not in self._results]:
+                    if not self._run_pool([img_path], 1):
+                        self._record(FileResult(img_path, "error", attempts=self._attempts.get(img_path, 0), error="El procés de conversió s'ha aturat inesperadament."))
+        for img_path in image_files:
+            if img_path not in self._results: self._record(FileResult(img_path, "cancelled"))
+        results = [self._results[f] for f in image_files]
+        if self.combined_dxf: self.combined_dxf_path = self._combine_dxf(results)
+        if self.trace: self.trace_path = self._write_trace(results)
+        if self.cache is not None:
+            try: self.cache.evict()
+            except OSError: traceback.print_exc()
+        write_manifest(self.output_dir, results, self.params, self.combined_dxf_path)
+        return results
+
+    def _combine_dxf(self, results):
+        layer = engine.dxf_layer_for_preset(self.params.preset)
+        sources = [o for r in results if r.status == "ok" for o in r.outputs if o.lower().endswith(".dxf")]
+        if not layer or not sources: return None
+        path = os.path.join(self.output_dir, COMBINED_DXF)
+        try:
+            dxf_writer.combine(path, sources, {layer[0]: layer[1]})
+        except Exception:
+            traceback.print_exc(); return None
+        return path
+
+    def _write_trace(self, results):
+        path = os.path.join(self.output_dir, TRACE_JSON)
+        try:
+            return profiling.write_chrome_trace(path, [s for r in results for s in r.stats.get("spans", ())])
+        except OSError:
+            traceback.print_exc(); return None
+
+    def _record(self, result):
+        self._results[result.image] = result
+        if self.progress: self.progress(len(self._results), self._total, result)
+
+    def _should_retry(self, result):
+        return result.status == "error" and result.retryable and result.attempts <= self.retries and not self.cancelled
+
+    def _run_inline(self, image_files):
+        for img_path in image_files:
+            while True:
+                result = _convert_one(img_path, self.params, self.output_dir, self._cancel_event, self.cache, self.profile_dir)
+                self._attempts[img_path] = result.attempts = self._attempts.get(img_path, 0) + 1
+                if not self._should_retry(result): break
+            self._record(result)
+
+    def _run_pool(self, image_files, workers):
+        """Retorna ``False`` si el grup de processos s'ha trencat."""
+        if self.cancelled: return True
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(image_files)) or 1, mp_context=self._ctx, initializer=_init_worker, initargs=(self._cancel_event,))
+        with self._lock: self._executor = executor
+        broken = False
+        try:
+            futures = {executor.submit(_convert_one, f, self.params, self.output_dir, None, self.cache, self.profile_dir): f for f in image_files}
+            while futures:
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    img_path = futures.pop(future)
+                    if future.cancelled(): continue
+                    self._attempts[img_path] = self._attempts.get(img_path, 0) + 1
+                    try:
+                        result = future.result()
+                    except concurrent.futures.process.BrokenProcessPool:
+                        broken = True; continue
+                    result.attempts = self._attempts[img_path]
+                    if self._should_retry(result):
+                        try:
+                            futures[executor.submit(_convert_one, img_path, self.params, self.output_dir, None, self.cache, self.profile_dir)] = img_path; continue
+                        except RuntimeError: pass  # El grup ja s'està tancant
+                    self._record(result)
+                if broken: break
+        finally:
+            with self._lock: self._executor = None
+            executor.shutdown(wait=not broken, cancel_futures=True)
+        return not broken
+
+
+def write_manifest(output_dir, results, params=None, combined_dxf=None, prefix=""):
+    """Escriu l'informe del lot en JSON i CSV (amb ``prefix`` al nom). Retorna les dues rutes."""
+    json_path = os.path.join(output_dir, prefix + MANIFEST_JSON)
+    csv_path = os.path.join(output_dir, prefix + MANIFEST_CSV)
+    summary = {status: sum(1 for r in results if r.status == status) for status in ("ok", "error", "cancelled")}
+    summary["cached"] = sum(1 for r in results if r.cached)
+    data = {
+        "summary": {"total": len(results), **summary, "seconds": round(sum(r.seconds for r in results), 3), "combined_dxf": combined_dxf},
+        "params": dataclasses.asdict(params) if params is not None else None,
+        "files": [{"image": r.image, "status": r.status, "outputs": r.outputs, "seconds": round(r.seconds, 3), "attempts": r.attempts, "error": r.error, "cached": r.cached, **{k: v for k, v in r.stats.items() if k != "spans"}} for r in results],
+    }
+    try:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f); writer.writerow(['image', 'status', 'outputs', 'seconds', 'attempts', 'error'])
+            for r in results:
+                writer.writerow([r.image, r.status, ";".join(r.outputs), f"{r.seconds:.3f}", r.attempts, r.error])
+    except Exception:
+        traceback.print_exc()
+    return json_path, csv_path
@@ -0,0 +1,264 @@
+"""Banc de proves de rendiment amb esbossos sintètics.
+
+Genera esbossos deterministes (rectes, corbes, ombrejat i lletra manuscrita)
+a diverses resolucions i nivells de soroll, els converteix en els dos modes
+i mesura el temps de cada etapa amb ``engine.timed``: preprocés, esquelet,
+recorregut del graf, unió de traços, simplificació, potrace, lectura de
+l'SVG, ordenació i escriptors. De cada etapa es guarda el mínim de
+``repeat`` execucions, que és la mesura menys sorollosa.
+
+Els resultats es desen en JSON i es poden comparar amb una referència desada
+abans a la mateixa màquina::
+
+    python -m benchmark --save-baseline
+    python -m benchmark --baseline benchmark_baseline.json
+
+``--illum`` mesura els mètodes d'estimació del fons de la correcció
+d'il·luminació: temps i error respecte del difuminat exacte. Els resultats
+van a un fitxer a part (``benchmark_illum.json``) perquè no substitueixin
+els de les etapes, que són els que es comparen amb la referència.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import engine
+
+DEFAULT_SIZES = ((1024, 768), (2048, 1536))
+QUICK_SIZES = ((640, 480),)
+DEFAULT_NOISE = (0.0, 0.04)
+MODES = ("centerline", "outline")
+MODE_PRESETS = {"centerline": "Làser - Marcat / Gravat (SCORE)", "outline": "Làser - Tall (CUT)"}
+DEFAULT_TOLERANCE = 0.25 # Alentiment relatiu que es considera una regressió
+MIN_DELTA = 0.01 # Segons: per sota d'aquesta diferència no es compta
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_OUTPUT = "benchmark_results.json"
+ILLUM_OUTPUT = "benchmark_illum.json"
+ILLUM_SIGMAS = (20, 50, 70, 200)
+
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def synthetic_sketch(width, height, noise=0.0, seed=0):
+    """Esbós en grisos de ``width`` x ``height`` amb traços de llapis sobre paper.
+
+    El paper té una il·luminació irregular. ``noise`` és la desviació del
+    soroll gaussià (fracció de 255); també afegeix taques petites.
+    """
+    rng = np.random.default_rng(seed)
+    s = min(width, height) / 1000 # Escala dels traços
+    gx, gy = np.linspace(0, 1, width), np.linspace(0, 1, height)
+    img = (235 - 35 * np.outer(gy, gx) - 15 * np.outer(np.sin(np.pi * gy), np.ones(width))).astype(np.uint8)
+
+    def point(): return int(rng.integers(0, width)), int(rng.integers(0, height))
+    def ink(): return int(rng.integers(20, 80))
+    def thickness(): return max(1, int(round(rng.uniform(1.5, 4.0) * s)))
+
+    for _ in range(12):
+        cv2.line(img, point(), point(), ink(), thickness(), cv2.LINE_AA)
+    t = np.linspace(0, 1, 96)[:, None]
+    for _ in range(10):
+        c = rng.uniform((0, 0), (width, height), (4, 2))
+        pts = (1 - t)**3 * c[0] + 3 * (1 - t)**2 * t * c[1] + 3 * (1 - t) * t**2 * c[2] + t**3 * c[3]
+        cv2.polylines(img, [np.rint(pts).astype(np.int32)], False, ink(), thickness(), cv2.LINE_AA)
+    for _ in range(3): # Ombrejat: traços paral·lels dins d'un requadre
+        (cx, cy), size, angle = point(), rng.uniform(60, 200) * s, rng.uniform(0, np.pi)
+        d, n = np.array([np.cos(angle), np.sin(angle)]), np.array([-np.sin(angle), np.cos(angle)])
+        for off in np.arange(-size, size, max(4.0, 9 * s)):
+            a, b = np.array([cx, cy]) + off * n - size * d, np.array([cx, cy]) + off * n + size * d
+            cv2.line(img, tuple(np.rint(a).astype(int).tolist()), tuple(np.rint(b).astype(int).tolist()), ink(), max(1, thickness() - 1), cv2.LINE_AA)
+    for _ in range(5):
+        text = "".join(rng.choice(list(_LETTERS), int(rng.integers(4, 10))))
+        cv2.putText(img, text, point(), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, 1.6 * s, ink(), thickness(), cv2.LINE_AA)
+    if noise > 0:
+        noisy = img + rng.normal(0, noise * 255, img.shape)
+        specks = rng.random(img.shape) < noise * 0.01
+        noisy[specks] -= 120
+        img = np.clip(noisy, 0, 255).astype(np.uint8)
+    return img
+
+
+def run_stages(img, params, output_dir, stats):
+    """Converteix ``img`` i escriu totes les sortides, acumulant temps a ``stats``."""
+    h, w = img.shape
+    work = engine.preprocess(img, params, stats)
+    paths = engine.vectorize(work, params, os.path.join(output_dir, f"bench__{params.mode}.svg"), stats)
+    with engine.timed(stats, "write_dxf"): engine.export_dxf_from_svg_paths(os.path.join(output_dir, "bench.dxf"), paths, w, h, params.dpi, "CUT", 1)
+    with engine.timed(stats, "write_dst"): engine.export_dst_from_paths(os.path.join(output_dir, "bench.dst"), paths, w, h, params.dpi, params.stitch_length_mm)
+    return paths
+
+
+def time_case(img, params, repeat=3):
+    """Temps mínim de cada etapa en ``repeat`` execucions, més el total i la mida del resultat."""
+    best, totals = {}, []
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(repeat):
+            stats = {}
+            start = time.perf_counter()
+            paths = run_stages(img, params, tmp, stats)
+            totals.append(time.perf_counter() - start)
+            for name, seconds in stats["timings"].items(): best[name] = min(best.get(name, np.inf), seconds)
+    return {
+        "stages": {name: round(seconds, 5) for name, seconds in best.items()},
+        "total": round(min(totals), 5),
+        "paths": len(paths),
+        "points": int(sum(len(p) for p in paths)),
+    }
+
+
+def background_error(img, sigma, repeat=3):
+    """Temps i error de cada mètode de ``engine.ILLUM_METHODS`` per a un ``sigma``.
+
+    Retorna ``{mètode: {"seconds", "max_error", "mean_error"}}``; l'error és
+    la diferència absoluta, en nivells de gris, amb el fons exacte.
+    """
+    results, exact = {}, None
+    for method in engine.ILLUM_METHODS:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            background = engine.estimate_background(img, sigma, method)
+            times.append(time.perf_counter() - start)
+        if exact is None: exact = background.astype(np.int16)
+        diff = np.abs(background.astype(np.int16) - exact)
+        results[method] = {"seconds": round(min(times), 5), "max_error": int(diff.max()), "mean_error": round(float(diff.mean()), 3)}
+    return results
+
+
+def run_illumination(sizes=DEFAULT_SIZES, sigmas=ILLUM_SIGMAS, repeat=3, progress=None):
+    """``background_error`` per a cada mida i sigma, amb esbossos sense soroll."""
+    cases = {}
+    for size in sizes:
+        img = synthetic_sketch(*size)
+        for sigma in sigmas:
+            name = f"{size[0]}x{size[1]}/sigma{sigma:g}"
+            cases[name] = background_error(img, sigma, repeat)
+            if progress: progress(name, cases[name])
+    return {"meta": environment(), "repeat": repeat, "illumination": cases}
+
+
+def format_illumination(name, methods):
+    return f"{name}: " + "  ".join(f"{m} {r['seconds'] * 1000:.1f} ms (error màx {r['max_error']}, mitjà {r['mean_error']:.2f})" for m, r in methods.items())
+
+
+def case_name(size, noise, mode):
+    return f"{size[0]}x{size[1]}/soroll{noise:g}/{mode}"
+
+
+def run_suite(sizes=DEFAULT_SIZES, noises=DEFAULT_NOISE, modes=MODES, repeat=3, progress=None):
+    """Executa tots els casos i retorna el diccionari de resultats.
+
+    Cada mode es mesura amb el preset de ``MODE_PRESETS`` i l'ordenació de
+    camins activada.
+    """
+    cases = {}
+    for size in sizes:
+        for noise in noises:
+            img = synthetic_sketch(*size, noise=noise)
+            for mode in modes:
+                name = case_name(size, noise, mode)
+                params = engine.ConversionParams.from_preset(MODE_PRESETS[mode]).replace(mode=mode, optimize_travel=True)
+                cases[name] = time_case(img, params, repeat)
+                if progress: progress(name, cases[name])
+    return {"meta": environment(), "repeat": repeat, "cases": cases}
+
+
+def environment():
+    """Dades de la màquina, per saber si dues mesures són comparables."""
+    try: potrace = engine.potrace_backend.resolve_backend("auto")
+    except engine.potrace_backend.PotraceError: potrace = None
+    return {
+        "python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+        "cpus": os.cpu_count(), "numpy": np.__version__, "opencv": cv2.__version__,
+        "potrace": potrace, "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE, min_delta=MIN_DELTA):
+    """Etapes més lentes que la referència.
+
+    Retorna una llista de ``(cas, etapa, referència, actual)`` per a les
+    etapes (i el total, amb el nom ``"total"``) que han empitjorat més d'un
+    ``tolerance`` relatiu i més de ``min_delta`` segons. Els casos o etapes
+    que no són a les dues mesures s'ignoren.
+    """
+    regressions = []
+    for name, case in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None: continue
+        pairs = [(stage, base["stages"].get(stage), seconds) for stage, seconds in case["stages"].items()]
+        pairs.append(("total", base.get("total"), case["total"]))
+        for stage, before, after in pairs:
+            if before is not None and after > before * (1 + tolerance) and after - before > min_delta:
+                regressions.append((name, stage, before, after))
+    return regressions
+
+
+def format_case(name, case):
+    stages = "  ".join(f"{stage} {seconds * 1000:.0f}" for stage, seconds in sorted(case["stages"].items(), key=lambda kv: -kv[1]))
+    return f"{name}: {case['total']:.3f} s, {case['paths']} camins, {case['points']} punts\n    ms: {stages}"
+
+
+def _size(text):
+    w, sep, h = text.lower().partition("x")
+    if not sep: raise argparse.ArgumentTypeError(f"mida no vàlida: {text} (p. ex. 1600x1200)")
+    return int(w), int(h)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Mesura el temps de cada etapa de la conversió amb esbossos sintètics.")
+    parser.add_argument("-o", "--output", help=f"Fitxer JSON de resultats (per defecte: {DEFAULT_OUTPUT}, o {ILLUM_OUTPUT} amb --illum).")
+    parser.add_argument("--baseline", help="Compara amb aquesta referència i surt amb codi 1 si hi ha regressions.")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="FITXER", help="Desa els resultats com a referència (per defecte: %(const)s).")
+    parser.add_argument("--size", dest="sizes", type=_size, action="append", help="Resolució AMPLExALT (es pot repetir).")
+    parser.add_argument("--noise", dest="noises", type=float, action="append", help="Nivell de soroll, 0-1 (es pot repetir).")
+    parser.add_argument("--mode", dest="modes", choices=MODES, action="append", help="Mode de vectorització (per defecte, tots dos).")
+    parser.add_argument("--repeat", type=int, default=3, help="Execucions per cas; es guarda el mínim (per defecte: %(default)s).")
+    parser.add_argument("--quick", action="store_true", help="Només resolucions petites i una execució.")
+    parser.add_argument("--illum", action="store_true", help="Mesura només els mètodes d'estimació del fons (temps i error).")
+    parser.add_argument("--sigma", dest="sigmas", type=float, action="append", help="Sigma del fons per a --illum (es pot repetir).")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Alentiment relatiu admès (per defecte: %(default)s).")
+    return parser
+
+
+def _is_stage_results(path):
+    try:
+        with open(path, encoding="utf-8") as f: return "cases" in json.load(f)
+    except (OSError, ValueError):
+        return False
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.illum and (args.baseline or args.save_baseline): parser.error("--illum no es pot comparar ni desar com a referència")
+    output = args.output if args.output is not None else ILLUM_OUTPUT if args.illum else DEFAULT_OUTPUT
+    if args.illum and output and _is_stage_results(output): parser.error(f"{output} té resultats de les etapes; --illum no el substitueix")
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    repeat = 1 if args.quick else max(1, args.repeat)
+    if args.illum:
+        results = run_illumination(sizes, args.sigmas or ILLUM_SIGMAS, repeat, progress=lambda name, methods: print(format_illumination(name, methods), flush=True))
+        if output:
+            with open(output, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+        return 0
+    results = run_suite(sizes, args.noises or DEFAULT_NOISE, args.modes or MODES, repeat, progress=lambda name, case: print(format_case(name, case), flush=True))
+    for path in filter(None, (output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+    if not args.baseline: return 0
+    with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, stage, before, after in regressions:
+        print(f"Regressió a {name}, {stage}: {before * 1000:.1f} -> {after * 1000:.1f} ms (x{after / before:.2f})", file=sys.stderr)
+    if not regressions: print(f"Sense regressions respecte de {args.baseline}.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
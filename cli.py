@@ -0,0 +1,173 @@
+"""Conversió per línia de comandes, sense interfície gràfica.
+
+Exemples:
+    python -m cli carpeta_esbossos/ -p "Làser - Tall (CUT)"
+    python -m cli foto.jpg -o sortida/ --set min_area=300 --set mode=centerline
+    python -m cli carpeta_compartida/ --watch --cache
+"""
+import argparse
+import dataclasses
+import os
+import sys
+import time
+
+import batch
+import config_manager
+import engine
+import result_cache
+import watch
+
+
+def _parse_value(field, text):
+    """Converteix el text de ``--set`` al tipus del camp de ``ConversionParams``."""
+    default = field.default
+    if isinstance(default, bool):
+        if text.lower() in ("1", "true", "yes", "si", "sí"): return True
+        if text.lower() in ("0", "false", "no"): return False
+        raise ValueError(f"Valor booleà no vàlid: {text}")
+    if isinstance(default, int): return int(text)
+    if isinstance(default, float): return float(text)
+    return text
+
+
+def parse_overrides(items):
+    """Converteix una llista de ``clau=valor`` en un diccionari tipat."""
+    fields = {f.name: f for f in dataclasses.fields(engine.ConversionParams)}
+    overrides = {}
+    for item in items:
+        key, sep, text = item.partition("=")
+        key = key.strip()
+        if key.endswith("_var"): key = key[:-4]
+        if not sep or key not in fields:
+            raise ValueError(f"Paràmetre desconegut o mal format: {item}")
+        overrides[key] = _parse_value(fields[key], text.strip())
+    return overrides
+
+
+def collect_jobs(inputs, output_dir=None):
+    """Retorna parelles (imatge, carpeta de sortida) per a fitxers i carpetes.
+
+    Sense ``output_dir``, la sortida va a ``output_vector/`` al costat de les
+    imatges, igual que a l'aplicació.
+    """
+    jobs = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files = engine.list_images(item)
+            folder = item
+        elif os.path.isfile(item):
+            files = [item]
+            folder = os.path.dirname(os.path.abspath(item))
+        else:
+            raise FileNotFoundError(f"No existeix: {item}")
+        out = output_dir or os.path.join(folder, "output_vector")
+        jobs.extend((f, out) for f in files)
+    return jobs
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Converteix fotos d'esbossos a SVG amb els presets de l'aplicació.")
+    parser.add_argument("inputs", nargs="*", help="Imatges o carpetes d'imatges.")
+    parser.add_argument("-p", "--preset", default=config_manager.get_preset_names()[0], help="Nom del preset (per defecte: %(default)s).")
+    parser.add_argument("-o", "--output", help="Carpeta de sortida (per defecte: output_vector/ al costat de cada imatge).")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="CLAU=VALOR", help="Sobreescriu un paràmetre del preset (p. ex. min_area=300).")
+    parser.add_argument("--list-presets", action="store_true", help="Mostra els presets disponibles i surt.")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="Processos en paral·lel (0 = tots els nuclis, 1 = sense processos).")
+    parser.add_argument("--retries", type=int, default=1, help="Reintents per a cada fitxer fallit (per defecte: %(default)s).")
+    parser.add_argument("--combined-dxf", action="store_true", help=f"Ajunta els DXF de cada carpeta de sortida en {batch.COMBINED_DXF}.")
+    parser.add_argument("--cache", nargs="?", const=result_cache.default_cache_dir(), metavar="CARPETA", help="Reutilitza les sortides d'imatges ja convertides amb els mateixos paràmetres (per defecte a %(const)s).")
+    parser.add_argument("--cache-mb", type=int, default=result_cache.DEFAULT_MAX_BYTES >> 20, help="Mida màxima de la memòria cau en MB (per defecte: %(default)s).")
+    parser.add_argument("--trace", action="store_true", help=f"Desa {batch.TRACE_JSON} amb el temps de cada etapa (format Chrome trace-event, per a chrome://tracing o Perfetto).")
+    parser.add_argument("--cprofile", nargs="?", const="", metavar="CARPETA", help="Desa un perfil de cProfile per imatge (<nom>.prof, per defecte a la carpeta de sortida).")
+    parser.add_argument("--watch", action="store_true", help="Vigila la carpeta i converteix les imatges noves o modificades fins a Ctrl+C.")
+    parser.add_argument("--poll", action="store_true", help="Amb --watch, compara la carpeta periòdicament en lloc d'usar inotify (carpetes de xarxa).")
+    parser.add_argument("--settle", type=float, default=watch.DEFAULT_SETTLE, help="Amb --watch, segons sense canvis per donar un fitxer per escrit (per defecte: %(default)s).")
+    parser.add_argument("--queue", type=int, default=watch.DEFAULT_QUEUE_SIZE, help="Amb --watch, fitxers màxims esperant conversió (per defecte: %(default)s).")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Només mostra els errors.")
+    return parser
+
+
+def _print_result(counter, result, quiet):
+    if result.status == "error":
+        print(f"[{counter}] Error en {result.image}: {result.error}", file=sys.stderr)
+    elif not quiet:
+        travel = f", recorregut {result.stats['travel_before_mm']:.0f} -> {result.stats['travel_after_mm']:.0f} mm" if "travel_after_mm" in result.stats else ""
+        cached = ", memòria cau" if result.cached else ""
+        print(f"[{counter}] {result.image} -> {', '.join(os.path.basename(o) for o in result.outputs) or result.status} ({result.seconds:.2f} s{cached}{travel})", flush=True)
+
+
+def _make_cache(args):
+    return result_cache.ResultCache(args.cache, args.cache_mb << 20) if args.cache else None
+
+
+def run_watch(args, params):
+    """Converteix les imatges que arriben a la carpeta fins que es prem Ctrl+C."""
+    folder = args.inputs[0]
+    output_dir = args.output or os.path.join(folder, "output_vector")
+    count = 0
+
+    def on_result(result):
+        nonlocal count
+        count += 1
+        _print_result(count, result, args.quiet)
+
+    watcher = watch.FolderWatcher(folder, settle=args.settle, use_inotify=not args.poll)
+    service = watch.WatchService(folder, params, output_dir, workers=args.jobs, queue_size=args.queue, cache=_make_cache(args), on_result=on_result, watcher=watcher)
+    if not args.quiet: print(f"Vigilant {folder} ({watcher.backend}). Ctrl+C per aturar.", flush=True)
+    service.start()
+    try:
+        while service.running: time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+    if not args.quiet: print(f"Vigilància aturada: {count} conversions.")
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.list_presets:
+        for name in config_manager.get_preset_names(): print(name)
+        return 0
+    if not args.inputs: parser.error("cal indicar almenys una imatge o carpeta")
+    if args.preset not in config_manager.PRESETS:
+        parser.error(f"preset desconegut: {args.preset}")
+
+    try:
+        params = engine.ConversionParams.from_preset(args.preset).replace(**parse_overrides(args.overrides))
+        jobs = collect_jobs(args.inputs, args.output)
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+
+    if args.watch:
+        if len(args.inputs) != 1 or not os.path.isdir(args.inputs[0]): parser.error("--watch necessita una sola carpeta")
+        return run_watch(args, params)
+
+    groups = {}
+    for img_path, out_dir in jobs: groups.setdefault(out_dir, []).append(img_path)
+
+    def progress(done, total, result): _print_result(f"{done}/{total}", result, args.quiet)
+
+    cache = _make_cache(args)
+    results = []
+    for out_dir, files in groups.items():
+        profile_dir = (args.cprofile or out_dir) if args.cprofile is not None else None
+        runner = batch.BatchRunner(params, out_dir, workers=args.jobs, retries=args.retries, progress=progress, combined_dxf=args.combined_dxf, cache=cache, trace=args.trace, profile_dir=profile_dir)
+        try:
+            results.extend(runner.run(files))
+        except KeyboardInterrupt:
+            runner.cancel()
+            print("Lot cancel·lat.", file=sys.stderr)
+            return 130
+        if runner.trace_path and not args.quiet: print(f"Traça de rendiment: {runner.trace_path}")
+        if profile_dir and not args.quiet: print(f"Perfils cProfile a {profile_dir} (python -m pstats <fitxer>.prof)")
+    ok = sum(1 for r in results if r.status == "ok")
+    if not args.quiet: print(f"Lot completat: {ok}/{len(results)} OK.")
+    return 0 if ok == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
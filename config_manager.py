@@ -7,6 +7,7 @@ DEFAULT_STANDARD_SETTINGS = {
     "mode_var": "outline",
     "batch_aggressive_var": False,
     "illum_sigma_var": 50.0,
+    "illum_method_var": "fast", # Fons: "exact", "fast" o "fastest" (piràmide, error de pocs nivells de gris)
     "median_filter_var": False,
     "clahe_var": False,
     "bin_method_var": "adaptive",
@@ -16,15 +17,37 @@ DEFAULT_STANDARD_SETTINGS = {
     "invert_var": False,
     "opening_radius_var": 0,
     "min_area_var": 100,
+    "max_area_var": 0, # 0 = sense límit
+    "keep_largest_var": 0, # 0 = tots els objectes
+    "fill_holes_var": 0, # Àrea màxima dels forats a omplir (0 = no s'omplen)
+    "remove_border_var": False,
     "prune_short_var": 5.0,
+    "join_max_dist_var": 5.0, # Distància màxima per unir extrems de traços (px)
     "simplification_epsilon_var": 2.0,
+    "simplify_method_var": "rdp", # "rdp" (Ramer–Douglas–Peucker) o "vw" (Visvalingam–Whyatt)
+    "optimize_travel_var": False, # Reordena els camins per reduir els desplaçaments en buit
+    "potrace_turdsize_var": 2, # potrace -t: elimina taques de fins a aquesta àrea (px)
+    "potrace_alphamax_var": 1.0, # potrace -a: suavitat de les cantonades
+    "potrace_opttolerance_var": 0.2, # potrace -O: tolerància d'optimització de corbes
     "stroke_mm_var": 0.1,
+    "svg_precision_var": 2, # Decimals de les coordenades SVG
+    "svg_compress_var": False, # Desa .svgz (SVG comprimit amb gzip)
     "dpi_var": 96,
     "scale_preset_var": "Cap",
     "last_folder": "",
     "stitch_length_mm_var": 1.0 # Nou paràmetre per a brodat
 }
 
+# Paràmetres de l'aplicació, no del dibuix: no formen part dels presets i en
+# canviar de preset es mantenen com els ha deixat l'usuari.
+APP_SETTINGS = {
+    "batch_workers_var": 0, # Processos per a l'exportació per lots (0 = tots els nuclis)
+    "combined_dxf_var": False, # Ajunta els DXF del lot en un de sol
+    "result_cache_var": True, # Reutilitza les sortides d'imatges sense canvis
+    "result_cache_mb_var": 2048, # Mida màxima de la memòria cau de resultats (MB)
+    "tile_budget_mb_var": 1024, # Memòria del preprocés; les imatges més grans es fan per franges (0 = sense límit)
+}
+
 PRESETS = {
     "Dibuix / Modelat 3D (Extrusió)": {
         "mode_var": "outline",
@@ -92,7 +115,7 @@ PRESETS = {
 
 def load_config():
     """Carrega la configuració de l'usuari des del fitxer o els valors per defecte."""
-    config = DEFAULT_STANDARD_SETTINGS.copy()
+    config = {**DEFAULT_STANDARD_SETTINGS, **APP_SETTINGS}
     if os.path.exists(CONFIG_FILE):
         try:
             with open(CONFIG_FILE, 'r') as f:
@@ -133,6 +156,27 @@ def get_preset_settings(preset_name):
         settings.update(PRESETS[preset_name])
     return settings
 
+TEMPORARY_PRESET_SUFFIX = " · auto-ajust"
+
+def add_temporary_preset(base_name, settings):
+    """Afegeix en memòria un preset amb ``settings`` derivat de ``base_name`` i en retorna el nom.
+
+    El nom comença pel del preset de partida perquè les sortides que en
+    depenen (capes DXF, brodat) no canviïn. No es desa mai al fitxer de
+    configuració i es substitueix cada vegada que es torna a crear.
+    """
+    name = base_preset_name(base_name) + TEMPORARY_PRESET_SUFFIX
+    PRESETS[name] = dict(settings)
+    return name
+
+def remove_temporary_presets():
+    """Treu de la memòria tots els presets temporals."""
+    for name in [n for n in PRESETS if n.endswith(TEMPORARY_PRESET_SUFFIX)]: del PRESETS[name]
+
+def base_preset_name(preset_name):
+    """Nom del preset de partida d'un preset temporal (o el mateix nom)."""
+    return preset_name[:-len(TEMPORARY_PRESET_SUFFIX)] if preset_name.endswith(TEMPORARY_PRESET_SUFFIX) else preset_name
+
 def get_preset_names():
     return list(PRESETS.keys())
 
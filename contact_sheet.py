@@ -0,0 +1,109 @@
+"""Full de contactes: miniatures de totes les imatges d'una carpeta
+preprocessades amb els mateixos paràmetres.
+
+Cada miniatura és la previsualització reduïda de la finestra principal
+(``engine.Pipeline.process_proxy``, amb els paràmetres reescalats per
+``ConversionParams.scaled``), de manera que s'hi veu el mateix que en
+previsualitzar la imatge. Es calculen en un grup de fils: OpenCV allibera
+el GIL i els fils comparteixen la memòria cau de la ``Pipeline``, i així en
+canviar un paràmetre de la neteja només es recalcula la neteja. Les
+miniatures acabades es guarden per fitxer i paràmetres de preprocés: tornar
+a uns paràmetres ja vistos és immediat.
+"""
+import concurrent.futures
+import dataclasses
+import time
+
+import numpy as np
+
+import batch
+import engine
+
+DEFAULT_SIZE = (240, 180)
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+@dataclasses.dataclass
+class Thumbnail:
+    """Miniatura d'una imatge."""
+    path: str
+    image: object = None # Imatge de treball reduïda (primer pla a 255), o None si hi ha hagut un error
+    foreground: float = 0.0 # Fracció de píxels a 255 de la imatge de treball
+    seconds: float = 0.0
+    cached: bool = False
+    error: str = ""
+
+
+def preprocess_key(params):
+    """Els paràmetres que afecten el preprocés (el mode, els DPI... no hi compten)."""
+    return tuple((stage.name, stage.key(params)) for stage in engine.PREPROCESS_STAGES)
+
+
+class ContactSheet:
+    """Calcula i guarda les miniatures d'un conjunt d'imatges.
+
+    Amb ``pipeline`` (la de la previsualització) es reaprofiten les etapes
+    ja calculades i no es reserva una segona memòria cau; sense, se'n crea
+    una de pròpia.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, workers=None, pipeline=None, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.size = size
+        self.workers = workers or batch.default_workers()
+        self.pipeline = pipeline or engine.Pipeline()
+        self.cache = engine.StageCache(cache_bytes)
+
+    def _key(self, path, params):
+        return ("thumb", self.size, preprocess_key(params), engine.file_key(path))
+
+    def cached(self, path, params):
+        """La miniatura si ja és a la memòria cau, o ``None``."""
+        try: img = self.cache.get(self._key(path, params))
+        except OSError: return None
+        return None if img is None else Thumbnail(path, img, np.count_nonzero(img) / img.size, cached=True)
+
+    def thumbnail(self, path, params, should_stop=None):
+        """Calcula la miniatura de ``path``. Els errors van a ``Thumbnail.error``; només llança ``engine.Cancelled``."""
+        start = time.perf_counter()
+        try:
+            key = self._key(path, params)
+            img = self.cache.get(key)
+            if img is None:
+                img, _ = self.pipeline.process_proxy(path, params, *self.size, should_stop=should_stop)
+                self.cache.put(key, img)
+        except engine.Cancelled:
+            raise
+        except Exception as e:
+            return Thumbnail(path, seconds=time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+        return Thumbnail(path, img, np.count_nonzero(img) / img.size, time.perf_counter() - start)
+
+    def generate(self, paths, params, on_thumbnail=None, should_stop=None):
+        """Miniatures de ``paths`` en l'ordre de la llista.
+
+        Les que ja són a la memòria cau es lliuren primer i la resta a mesura
+        que s'acaben, amb ``on_thumbnail(índex, miniatura)`` des del fil que
+        crida ``generate``. Si ``should_stop()`` es torna cert, les pendents
+        es descarten i queden a ``None``.
+        """
+        results = [None] * len(paths)
+
+        def deliver(i, thumb):
+            results[i] = thumb
+            if on_thumbnail: on_thumbnail(i, thumb)
+
+        pending = []
+        for i, path in enumerate(paths):
+            thumb = self.cached(path, params)
+            if thumb is None: pending.append(i)
+            else: deliver(i, thumb)
+        if not pending: return results
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(self.workers, len(pending)))
+        try:
+            futures = {executor.submit(self.thumbnail, paths[i], params, should_stop): i for i in pending}
+            for future in concurrent.futures.as_completed(futures):
+                if should_stop and should_stop(): break
+                try: deliver(futures[future], future.result())
+                except engine.Cancelled: pass
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return results
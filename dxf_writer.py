@@ -0,0 +1,157 @@
+"""Escriptura de DXF en streaming.
+
+Es fa servir el format AutoCAD R12 mínim: una capçalera amb la versió i
+l'extensió del dibuix (en mil·límetres; R12 no en declara les unitats), la
+taula de capes i la secció ENTITIES. Tots els programes de tall làser el
+llegeixen. Cada camí és una ``POLYLINE`` amb els seus ``VERTEX``.
+El text d'un bloc de camins es forma amb una sola operació ``%`` sobre les
+coordenades i s'escriu directament al fitxer, de manera que la memòria no
+depèn de la mida del dibuix.
+
+``combine`` ajunta els DXF d'un lot en un de sol, col·locant cada dibuix a
+la dreta de l'anterior; les coordenades es desplacen per blocs de text, sense
+carregar cap fitxer sencer.
+"""
+import numpy as np
+
+CHUNK_VALUES = 1 << 16 # Coordenades per bloc de text
+COMBINE_CHUNK_CHARS = 1 << 22
+COMBINE_GAP_MM = 5.0
+
+_NUMBER = "%.4f"
+
+
+def _layer_table(layers):
+    parts = ["0\nSECTION\n2\nTABLES\n0\nTABLE\n2\nLAYER\n70\n%d\n" % len(layers)]
+    for name, color in layers.items():
+        parts.append(f"0\nLAYER\n2\n{name}\n70\n0\n62\n{color}\n6\nCONTINUOUS\n")
+    parts.append("0\nENDTAB\n0\nENDSEC\n")
+    return "".join(parts)
+
+
+class DxfWriter:
+    """Escriptor de DXF R12 que afegeix polilínies a mesura que arriben.
+
+    ``layers`` és un diccionari ``{nom: color ACI}`` i ``extents`` el
+    requadre ``((xmin, ymin), (xmax, ymax))`` del dibuix en mil·límetres.
+    """
+
+    def __init__(self, path, layers, extents=((0.0, 0.0), (0.0, 0.0))):
+        self._f = open(path, "w", encoding="ascii", newline="\n")
+        (x0, y0), (x1, y1) = extents
+        self._f.write("0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1009\n") # R12 no té $INSUNITS: les unitats (mm) van implícites
+        self._f.write(f"9\n$EXTMIN\n10\n{x0:.4f}\n20\n{y0:.4f}\n9\n$EXTMAX\n10\n{x1:.4f}\n20\n{y1:.4f}\n0\nENDSEC\n")
+        self._f.write(_layer_table(layers))
+        self._f.write("0\nSECTION\n2\nENTITIES\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_raw(self, text):
+        """Afegeix text d'entitats ja format."""
+        self._f.write(text)
+
+    def add_polylines(self, paths, layer):
+        """Afegeix camins (seqüències de punts en mm); els tancats porten l'indicador 1."""
+        chunk, count = [], 0
+        for points in paths:
+            if len(points) < 2: continue
+            chunk.append(np.asarray(points, dtype=float))
+            count += 2 * len(points)
+            if count >= CHUNK_VALUES:
+                self._f.write(_polylines_text(chunk, layer)); chunk, count = [], 0
+        if chunk: self._f.write(_polylines_text(chunk, layer))
+
+    def close(self):
+        if self._f.closed: return
+        self._f.write("0\nENDSEC\n0\nEOF\n")
+        self._f.close()
+
+
+def _polylines_text(chunk, layer):
+    vertex = f"0\nVERTEX\n8\n{layer}\n10\n{_NUMBER}\n20\n{_NUMBER}\n"
+    template, values = [], []
+    for pts in chunk:
+        closed = len(pts) > 2 and (pts[0] == pts[-1]).all()
+        if closed: pts = pts[:-1]
+        template.append(f"0\nPOLYLINE\n8\n{layer}\n66\n1\n70\n{int(closed)}\n10\n0.0\n20\n0.0\n30\n0.0\n")
+        template.append(vertex * len(pts))
+        template.append(f"0\nSEQEND\n8\n{layer}\n")
+        values.append(pts.reshape(-1))
+    return "".join(template) % tuple(np.concatenate(values).tolist())
+
+
+def read_extents(path):
+    """Llegeix ``$EXTMIN`` i ``$EXTMAX`` de la capçalera d'un DXF."""
+    values, current = {}, None
+    with open(path, encoding="ascii", errors="replace") as f:
+        for code in f:
+            value = next(f, "").strip()
+            code = code.strip()
+            if code == "9": current = value
+            elif code in ("10", "20") and current in ("$EXTMIN", "$EXTMAX"): values[current, code] = float(value)
+            elif code == "2" and value == "ENTITIES": break
+    return ((values.get(("$EXTMIN", "10"), 0.0), values.get(("$EXTMIN", "20"), 0.0)),
+            (values.get(("$EXTMAX", "10"), 0.0), values.get(("$EXTMAX", "20"), 0.0)))
+
+
+def _shift_entities(text, dx, dy):
+    """Desplaça les coordenades (codis 10 i 20) d'un tros de text que comença amb un codi."""
+    lines = np.array(text.split("\n"), dtype=object)
+    codes, values = lines[0::2], lines[1::2]
+    for code, delta in (("10", dx), ("20", dy)):
+        mask = codes[:len(values)] == code
+        if not mask.any() or delta == 0: continue
+        shifted = values[mask].astype(float) + delta
+        values[mask] = ((_NUMBER + "\n") * len(shifted) % tuple(shifted.tolist())).split("\n")[:-1]
+    lines[1::2] = values
+    return "\n".join(lines.tolist())
+
+
+def _last_entity_start(text):
+    # Un "0" seguit d'un nom en majúscules és sempre un codi 0 (inici
+    # d'entitat); un valor 0 va seguit d'un codi numèric.
+    cut = text.rfind("\n0\n")
+    while cut > 0 and not text[cut + 3:cut + 4].isupper(): cut = text.rfind("\n0\n", 0, cut)
+    return cut
+
+
+def _copy_entities(src_path, writer, dx, dy):
+    with open(src_path, encoding="ascii", errors="replace") as f:
+        for code in f: # Salta fins a l'inici de les entitats, per parelles codi/valor
+            if code.strip() == "2" and next(f, "").strip() == "ENTITIES": break
+            elif code.strip() != "2": next(f, "")
+        carry = ""
+        while True:
+            block = f.read(COMBINE_CHUNK_CHARS)
+            text = carry + block
+            end = 0 if text.startswith("0\nENDSEC\n") else text.find("\n0\nENDSEC\n")
+            if end >= 0 or not block:
+                if end > 0: writer.write_raw(_shift_entities(text[:end], dx, dy) + "\n")
+                return
+            cut = _last_entity_start(text)
+            if cut <= 0:
+                carry = text; continue
+            writer.write_raw(_shift_entities(text[:cut], dx, dy) + "\n")
+            carry = text[cut + 1:]
+
+
+def combine(path, sources, layers, gap_mm=COMBINE_GAP_MM):
+    """Ajunta els DXF ``sources`` (escrits amb ``DxfWriter``) en un de sol.
+
+    Els dibuixos es col·loquen d'esquerra a dreta, separats ``gap_mm``
+    mil·límetres i alineats a baix. Retorna la llista de desplaçaments.
+    """
+    extents = [read_extents(s) for s in sources]
+    offsets, x = [], 0.0
+    for (x0, y0), (x1, _) in extents:
+        offsets.append((x - x0, -y0))
+        x += (x1 - x0) + gap_mm
+    height = max((y1 - y0 for (_, y0), (_, y1) in extents), default=0.0)
+    with DxfWriter(path, layers, ((0.0, 0.0), (max(x - gap_mm, 0.0), height))) as writer:
+        for src, (dx, dy) in zip(sources, offsets):
+            _copy_entities(src, writer, dx, dy)
+    return offsets
@@ -0,0 +1,124 @@
+"""Punts de brodat: remostreig per longitud d'arc i fitxers Tajima DST.
+
+Els camins (en mil·límetres, amb l'eix Y cap amunt) es remostregen en punts
+de la mateixa longitud, no més llargs que la longitud demanada, i entre
+camins s'hi posa un salt (la màquina es desplaça sense cosir). El DST guarda
+cada moviment en tres bytes, en unitats de 0,1 mm i en ternari equilibrat
+(±1, ±3, ±9, ±27, ±81), de manera que un moviment no pot superar 121
+unitats; els més llargs es parteixen en diversos registres.
+"""
+import os
+
+import numpy as np
+
+DST_UNIT_MM = 0.1
+DST_MAX_STEP = 121
+DST_HEADER_SIZE = 512
+DST_END = b"\x00\x00\xf3"
+
+# Bits de cada dígit ternari: (byte, bit del +1, bit del -1) per a X i Y,
+# de pes 1, 3, 9, 27 i 81.
+_X_BITS = ((0, 0, 1), (1, 0, 1), (0, 2, 3), (1, 2, 3), (2, 2, 3))
+_Y_BITS = ((0, 7, 6), (1, 7, 6), (0, 5, 4), (1, 5, 4), (2, 5, 4))
+_JUMP_BIT = 0x80
+_SET_BITS = 0x03
+
+
+def resample_paths(paths, stitch_len):
+    """Remostreja els camins en punts de longitud uniforme.
+
+    Cada camí de longitud ``L`` es divideix en ``ceil(L / stitch_len)``
+    punts iguals, conservant-ne els extrems. Tots els camins s'interpolen
+    alhora sobre una longitud d'arc global. Retorna ``(xy, jump)``: l'array
+    ``N x 2`` de punts i una màscara que marca el primer punt de cada camí,
+    al qual s'arriba amb un salt.
+    """
+    paths = [np.asarray(p, dtype=float) for p in paths if len(p) > 0]
+    if not paths or stitch_len <= 0: return np.empty((0, 2)), np.empty(0, bool)
+    pts = np.concatenate(paths)
+    lengths = np.array([len(p) for p in paths])
+    starts = np.cumsum(lengths) - lengths
+    seg = np.hypot(*np.diff(pts, axis=0).T)
+    seg[starts[1:] - 1] = 1.0 # Separació fictícia entre camins
+    arc = np.concatenate(([0.0], np.cumsum(seg)))
+    path_len = arc[starts + lengths - 1] - arc[starts]
+    counts = np.maximum(1, np.ceil(path_len / stitch_len - 1e-9)).astype(np.int64)
+    counts[path_len == 0] = 0 # Un camí d'un sol punt és una puntada
+    owner = np.repeat(np.arange(len(paths)), counts + 1)
+    first = np.cumsum(counts + 1) - (counts + 1)
+    k = np.arange(owner.size) - first[owner]
+    target = arc[starts][owner] + path_len[owner] * np.divide(k, counts[owner], out=np.zeros(owner.size), where=counts[owner] > 0)
+    xy = np.column_stack((np.interp(target, arc, pts[:, 0]), np.interp(target, arc, pts[:, 1])))
+    jump = k == 0
+    return xy, jump
+
+
+def _split_moves(moves, jump):
+    """Parteix els moviments de més de ``DST_MAX_STEP`` unitats en parts iguals."""
+    parts = np.maximum(1, -(-np.abs(moves).max(axis=1) // DST_MAX_STEP))
+    if (parts == 1).all(): return moves, jump
+    owner = np.repeat(np.arange(len(moves)), parts)
+    j = np.arange(owner.size) - (np.cumsum(parts) - parts)[owner]
+    n, d = parts[owner][:, None], moves[owner]
+    return (d * (j[:, None] + 1)) // n - (d * j[:, None]) // n, jump[owner]
+
+
+def encode_dst_records(moves, jump):
+    """Codifica moviments enters (0,1 mm) com a registres DST de tres bytes."""
+    records = np.zeros((len(moves), 3), np.uint8)
+    records[:, 2] = _SET_BITS
+    records[jump, 2] |= _JUMP_BIT
+    for axis, bits in ((0, _X_BITS), (1, _Y_BITS)):
+        v = moves[:, axis].astype(np.int64)
+        for byte, plus, minus in bits:
+            digit = (v + 1) % 3 - 1 # Dígit en ternari equilibrat
+            records[digit == 1, byte] |= 1 << plus
+            records[digit == -1, byte] |= 1 << minus
+            v = (v - digit) // 3
+    return records.tobytes()
+
+
+def _signed(value):
+    return ("+" if value >= 0 else "-") + "%5d" % abs(value)
+
+
+def _dst_header(label, n_records, extents, end):
+    min_x, min_y, max_x, max_y = (int(v) for v in extents)
+    fields = [
+        "LA:%-16s" % label[:16], "ST:%7d" % n_records, "CO:%3d" % 0,
+        "+X:%5d" % max(max_x, 0), "-X:%5d" % max(-min_x, 0), "+Y:%5d" % max(max_y, 0), "-Y:%5d" % max(-min_y, 0),
+        "AX:" + _signed(int(end[0])), "AY:" + _signed(int(end[1])), "MX:" + _signed(0), "MY:" + _signed(0), "PD:******",
+    ]
+    header = ("\r".join(fields) + "\r\x1a").encode("ascii", "replace")
+    return header.ljust(DST_HEADER_SIZE, b" ")
+
+
+def write_dst(path, xy_mm, jump, label=None):
+    """Escriu un fitxer Tajima DST amb els punts ``xy_mm`` (Y cap amunt).
+
+    L'origen del disseny és el centre del requadre dels punts, com esperen
+    les màquines per centrar-lo al bastidor.
+    """
+    if label is None: label = os.path.splitext(os.path.basename(path))[0]
+    pos = np.empty((0, 2), np.int64)
+    if len(xy_mm):
+        center = (xy_mm.min(axis=0) + xy_mm.max(axis=0)) / 2
+        pos = np.rint((xy_mm - center) / DST_UNIT_MM).astype(np.int64)
+    moves, flags = _split_moves(np.diff(np.vstack(([0, 0], pos)), axis=0), np.asarray(jump, bool))
+    body = encode_dst_records(moves, flags)
+    extents = (*pos.min(axis=0), *pos.max(axis=0)) if len(pos) else (0, 0, 0, 0)
+    end = pos[-1] if len(pos) else (0, 0)
+    with open(path, "wb") as f:
+        f.write(_dst_header(label, len(moves) + 1, extents, end))
+        f.write(body)
+        f.write(DST_END)
+
+
+def decode_dst_records(data):
+    """Moviments i salts d'uns registres DST (sense capçalera ni final)."""
+    records = np.frombuffer(data, np.uint8).reshape(-1, 3).astype(np.int64)
+    moves = np.zeros((len(records), 2), np.int64)
+    for axis, bits in ((0, _X_BITS), (1, _Y_BITS)):
+        for weight, (byte, plus, minus) in zip((1, 3, 9, 27, 81), bits):
+            moves[:, axis] += weight * ((records[:, byte] >> plus & 1) - (records[:, byte] >> minus & 1))
+    return moves, (records[:, 2] & _JUMP_BIT) > 0
@@ -0,0 +1,756 @@
+"""Motor de conversió independent de la interfície gràfica.
+
+Conté tot el procés (preprocés, vectorització i exportació) perquè es pugui
+fer servir tant des de l'aplicació Tk com des de la línia de comandes
+(``python -m cli``) en màquines sense pantalla.
+"""
+import collections
+import dataclasses
+import os
+import threading
+
+import cv2
+import numpy as np
+from skimage.morphology import skeletonize as sk_skeletonize
+
+try:
+    from PIL import Image as _PILImage # Només per llegir la mida de la capçalera
+except ImportError:
+    _PILImage = None
+
+import config_manager
+import dxf_writer
+import embroidery
+import polylines
+import potrace_backend
+import profiling
+import simplify
+import skeleton_graph
+import svg_paths
+import svg_writer
+import tiling
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+SCALE_PRESET_OPTIONS = ["Cap", "Alçada 20mm", "Alçada 25mm", "Alçada 30mm", "Amplada 20mm", "Amplada 25mm", "Amplada 30mm"]
+SCALE_PRESET_VALUES = {"Cap": None, "Alçada 20mm": ("height", 20), "Alçada 25mm": ("height", 25), "Alçada 30mm": ("height", 30), "Amplada 20mm": ("width", 20), "Amplada 25mm": ("width", 25), "Amplada 30mm": ("width", 30)}
+
+
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+DEFAULT_IMAGE_CACHE_BYTES = 256 * 1024 * 1024
+REDUCED_READ_FLAGS = {8: cv2.IMREAD_REDUCED_GRAYSCALE_8, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2}
+
+
+class ConversionError(Exception):
+    """Error en convertir una imatge."""
+
+
+class Cancelled(Exception):
+    """La conversió s'ha aturat a petició de l'usuari."""
+
+
+def check_cancel(should_stop):
+    """Punt de control entre etapes: llança ``Cancelled`` si cal aturar-se."""
+    if should_stop is not None and should_stop(): raise Cancelled()
+
+
+timed = profiling.timed # Mesura d'etapes: els mòduls del motor el fan servir com a engine.timed
+
+
+@dataclasses.dataclass(frozen=True)
+class ConversionParams:
+    """Paràmetres d'una conversió, sense cap dependència de Tk.
+
+    Els noms dels camps són les claus de ``config_manager`` sense el sufix
+    ``_var``. ``preset`` és el nom del perfil, que decideix els fitxers
+    addicionals (DXF per als perfils de làser, CSV per al brodat).
+    """
+    mode: str = "outline"
+    illum_sigma: float = 50.0
+    illum_method: str = "fast"
+    median_filter: bool = False
+    clahe: bool = False
+    bin_method: str = "adaptive"
+    threshold: int = 127
+    block_size: int = 11
+    C: int = 2
+    invert: bool = False
+    opening_radius: int = 0
+    min_area: int = 100
+    max_area: int = 0
+    keep_largest: int = 0
+    fill_holes: int = 0
+    remove_border: bool = False
+    prune_short: float = 5.0
+    join_max_dist: float = 5.0
+    simplification_epsilon: float = 2.0
+    simplify_method: str = "rdp"
+    potrace_turdsize: int = 2
+    potrace_alphamax: float = 1.0
+    potrace_opttolerance: float = 0.2
+    potrace_backend: str = "auto"
+    tile_budget_mb: int = tiling.DEFAULT_BUDGET_MB
+    curve_tolerance: float = svg_paths.DEFAULT_TOLERANCE
+    optimize_travel: bool = False
+    stroke_mm: float = 0.1
+    svg_precision: int = svg_writer.DEFAULT_PRECISION
+    svg_compress: bool = False
+    dpi: int = 96
+    scale_preset: str = "Cap"
+    stitch_length_mm: float = 1.0
+    preset: str = ""
+
+    @classmethod
+    def from_settings(cls, settings, preset=None):
+        """Construeix els paràmetres a partir d'un diccionari de configuració.
+
+        Accepta les claus amb sufix ``_var`` (com ``config_manager``) o sense.
+        Les claus desconegudes s'ignoren.
+        """
+        fields = {f.name for f in dataclasses.fields(cls)}
+        values = {}
+        for key, value in settings.items():
+            name = key[:-4] if key.endswith("_var") else key
+            if name in fields: values[name] = value
+        if preset is None: preset = settings.get("last_preset_profile", values.get("preset", ""))
+        values["preset"] = preset
+        return cls(**values)
+
+    @classmethod
+    def from_preset(cls, preset_name):
+        """Paràmetres d'un preset de ``config_manager``."""
+        return cls.from_settings(config_manager.get_preset_settings(preset_name), preset=preset_name)
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+    def scaled(self, factor):
+        """Paràmetres equivalents per a una imatge reescalada per ``factor``.
+
+        Els paràmetres en píxels (sigma, mida de bloc, radi d'obertura, àrees,
+        poda, unió d'extrems, ε, tolerància de corbes) s'ajusten perquè una imatge reduïda doni un resultat
+        semblant al de la resolució completa. Els DPI també s'escalen perquè
+        les mides en mil·límetres no canviïn.
+        """
+        if factor == 1: return self
+        return self.replace(
+            illum_sigma=self.illum_sigma * factor,
+            block_size=max(3, int(round(self.block_size * factor)) | 1),
+            opening_radius=int(round(self.opening_radius * factor)),
+            min_area=int(round(self.min_area * factor * factor)),
+            max_area=int(round(self.max_area * factor * factor)),
+            fill_holes=int(round(self.fill_holes * factor * factor)),
+            potrace_turdsize=int(round(self.potrace_turdsize * factor * factor)),
+            prune_short=self.prune_short * factor,
+            join_max_dist=self.join_max_dist * factor,
+            simplification_epsilon=self.simplification_epsilon * factor,
+            curve_tolerance=self.curve_tolerance * factor,
+            dpi=self.dpi * factor,
+        )
+
+
+# Camps que canvien les sortides (i la clau de ``result_cache``). La resta
+# (``tile_budget_mb``, ``potrace_backend``) només decideixen com es calculen:
+# les franges i els dos backends de potrace donen el mateix resultat.
+OUTPUT_FIELDS = (
+    "mode", "illum_sigma", "illum_method", "median_filter", "clahe", "bin_method", "threshold", "block_size", "C", "invert",
+    "opening_radius", "min_area", "max_area", "keep_largest", "fill_holes", "remove_border", "prune_short", "join_max_dist",
+    "simplification_epsilon", "simplify_method", "potrace_turdsize", "potrace_alphamax", "potrace_opttolerance",
+    "curve_tolerance", "optimize_travel", "stroke_mm", "svg_precision", "svg_compress", "dpi", "scale_preset",
+    "stitch_length_mm", "preset",
+)
+
+
+def list_images(folder):
+    """Llista ordenada de les imatges suportades d'una carpeta."""
+    return sorted([os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS) and not f.startswith('.')])
+
+
+# --- Preprocés ---
+
+def load_gray(path, reduce=1):
+    """Llegeix una imatge en grisos; amb ``reduce`` 2, 4 o 8, reduïda en descodificar-la."""
+    img_gray = cv2.imread(path, REDUCED_READ_FLAGS[reduce] if reduce > 1 else cv2.IMREAD_GRAYSCALE)
+    if img_gray is None: raise ConversionError(f"No es pot llegir la imatge: {path}")
+    return img_gray
+
+
+def file_key(path):
+    """Clau d'un fitxer d'imatge que canvia si el fitxer es modifica."""
+    st = os.stat(path)
+    return ("load", os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def image_size(path):
+    """``(amplada, alçada)`` de la capçalera del fitxer, o ``None`` si no es pot llegir.
+
+    No té en compte l'orientació EXIF, que ``cv2.imread`` sí que aplica.
+    """
+    if _PILImage is None: return None
+    try:
+        with _PILImage.open(path) as im: return im.size
+    except (OSError, ValueError):
+        return None
+
+
+def read_reduction(size, max_w, max_h):
+    """Factor de ``REDUCED_READ_FLAGS`` més gran que encara dona almenys ``max_w`` x ``max_h``."""
+    w, h = size
+    factor = max(min(max_w / w, max_h / h), min(max_w / h, max_h / w)) # Qualsevol orientació
+    return next((r for r in REDUCED_READ_FLAGS if r * factor <= 1), 1)
+
+
+def _median(img, params): return cv2.medianBlur(img, 5)
+
+
+# Sigma mínima, en píxels del nivell reduït, a la qual s'atura la piràmide de
+# ``estimate_background``. Com més petita, més nivells i més ràpid, però més
+# error. Amb esbossos de 2048x1536 i sigma 20-200, l'error màxim respecte del
+# difuminat exacte és de 3-4 nivells de gris ("fast") i de 5-7 ("fastest"),
+# la mitjana no arriba a 1 i canvia menys de l'1% dels píxels binaritzats
+# (``python -m benchmark --illum``).
+ILLUM_METHODS = {"exact": None, "fast": 8.0, "fastest": 4.0}
+
+
+PYRAMID_BYTES_PER_PX = 10 # Files de treball de l'ampliació del fons (float32) i de la divisió
+
+
+def _pyramid_levels(shape, sigma, min_sigma):
+    """Nivells de ``cv2.pyrDown`` de la piràmide per a ``sigma`` (0 = difuminat exacte)."""
+    h, w, level = shape[0], shape[1], 0
+    while sigma / 2**(level + 1) >= min_sigma and min(h, w) >= 16:
+        h, w, level = (h + 1) // 2, (w + 1) // 2, level + 1
+    return level
+
+
+def _pyramid_rest(sigma, level):
+    # Cada pyrDown difumina amb sigma ~1 del seu nivell: en píxels originals, la variància acumulada és (4^level - 1) / 3.
+    return np.sqrt(max(sigma**2 - (4**level - 1) / 3, 1.0)) / 2**level
+
+
+def _blur_halo(sigma):
+    return int(np.ceil(4 * sigma)) + 1
+
+
+def _upsample_rows(small, shape, y0, y1):
+    """Files ``[y0, y1)`` de l'ampliació bilineal de ``small`` a ``shape`` (com ``cv2.INTER_LINEAR``).
+
+    Cada fila es calcula igual sigui quina sigui la franja, de manera que
+    el fons per franges és idèntic al de la imatge sencera. ``small`` pot
+    ser un array mapat a memòria: només se'n llegeixen les files necessàries.
+    """
+    hs, ws = small.shape
+    sy = np.maximum((np.arange(y0, y1) + 0.5) * (hs / shape[0]) - 0.5, 0.0)
+    i0 = np.minimum(sy.astype(np.intp), hs - 1)
+    i1 = np.minimum(i0 + 1, hs - 1)
+    fy = (sy - i0).astype(np.float32)[:, None]
+    top = i0[0]
+    rows = np.asarray(small[top:i1[-1] + 1], np.float32)
+    rows = rows[i0 - top] * (1 - fy) + rows[i1 - top] * fy
+    # Horitzontalment, amb la mateixa alçada: cada fila de sortida només depèn de la seva.
+    return cv2.convertScaleAbs(cv2.resize(rows, (shape[1], y1 - y0), interpolation=cv2.INTER_LINEAR)) # Arrodoneix a uint8
+
+
+def _pyr_down_strips(src, dst, rows):
+    """``cv2.pyrDown`` de ``src`` a ``dst`` per franges de ``rows`` files de sortida, igual que el de la imatge sencera."""
+    h = src.shape[0]
+    for o0 in range(0, dst.shape[0], rows):
+        o1 = min(dst.shape[0], o0 + rows)
+        a, b = max(0, 2 * o0 - 4), min(h, 2 * o1 + 4) # Dues files de sortida de marge; a és parell
+        dst[o0:o1] = cv2.pyrDown(np.ascontiguousarray(src[a:b]))[o0 - a // 2:o1 - a // 2]
+
+
+def _blur_strips(src, dst, sigma, rows):
+    """``cv2.GaussianBlur`` de ``src`` a ``dst`` per franges, amb el marge del radi del nucli."""
+    h, halo = src.shape[0], _blur_halo(sigma)
+    for y0 in range(0, h, rows):
+        y1 = min(h, y0 + rows)
+        a, b = max(0, y0 - halo), min(h, y1 + halo)
+        dst[y0:y1] = cv2.GaussianBlur(np.ascontiguousarray(src[a:b]), (0, 0), sigmaX=sigma, sigmaY=sigma)[y0 - a:y1 - a]
+
+
+def estimate_background(img, sigma, method="exact"):
+    """Fons de la imatge: difuminat gaussià de desviació ``sigma``.
+
+    ``"exact"`` difumina a resolució completa; el cost creix amb ``sigma``
+    (més d'un segon a partir de sigma 70 en 3 MP). Els altres mètodes
+    redueixen la imatge amb ``cv2.pyrDown``, difuminen la versió petita
+    amb la sigma que falta i la tornen a ampliar, amb un cost gairebé
+    constant.
+    """
+    min_sigma = ILLUM_METHODS[method]
+    level = 0 if min_sigma is None else _pyramid_levels(img.shape, sigma, min_sigma)
+    if level == 0: return cv2.GaussianBlur(img, (0, 0), sigmaX=sigma, sigmaY=sigma)
+    small = img
+    for _ in range(level): small = cv2.pyrDown(small)
+    rest = _pyramid_rest(sigma, level)
+    small = cv2.GaussianBlur(small, (0, 0), sigmaX=rest, sigmaY=rest)
+    return _upsample_rows(small, img.shape, 0, img.shape[0])
+
+
+def _illumination(img, params):
+    blurred = estimate_background(img, params.illum_sigma, params.illum_method)
+    return cv2.divide(img, blurred, scale=255)
+
+
+def _illumination_strips(src, dst, params, budget_bytes):
+    """Correcció d'il·luminació per franges (``tiling``), amb el mateix resultat que ``_illumination``.
+
+    Els nivells de la piràmide i el difuminat del nivell petit es fan per
+    franges amb els seus marges i es guarden en fitxers temporals; el fons
+    s'amplia franja a franja i es divideix directament.
+    """
+    sigma, (h, w) = params.illum_sigma, src.shape
+    min_sigma = ILLUM_METHODS[params.illum_method]
+    level = 0 if min_sigma is None else _pyramid_levels(src.shape, sigma, min_sigma)
+    if level == 0:
+        small = tiling.temporary_array(src.shape)
+        _blur_strips(src, small, sigma, tiling.strip_rows(w, budget_bytes, tiling.LOCAL_BYTES_PER_PX, _blur_halo(sigma)))
+    else:
+        small = src
+        for _ in range(level):
+            down = tiling.temporary_array(((small.shape[0] + 1) // 2, (small.shape[1] + 1) // 2))
+            _pyr_down_strips(small, down, tiling.strip_rows(small.shape[1], budget_bytes, tiling.LOCAL_BYTES_PER_PX, 4))
+            small = down
+        rest = _pyramid_rest(sigma, level)
+        blurred = tiling.temporary_array(small.shape)
+        _blur_strips(small, blurred, rest, tiling.strip_rows(small.shape[1], budget_bytes, tiling.LOCAL_BYTES_PER_PX, _blur_halo(rest)))
+        small = blurred
+    rows = tiling.strip_rows(w, budget_bytes, PYRAMID_BYTES_PER_PX)
+    for y0 in range(0, h, rows):
+        y1 = min(h, y0 + rows)
+        background = np.asarray(small[y0:y1]) if level == 0 else _upsample_rows(small, src.shape, y0, y1)
+        dst[y0:y1] = cv2.divide(np.ascontiguousarray(src[y0:y1]), background, scale=255)
+
+
+def _clahe(img, params):
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    return clahe.apply(img)
+
+
+def _block_size(params):
+    bs = params.block_size
+    return bs + 1 if bs % 2 == 0 else bs
+
+
+def _binarize_key(params):
+    if params.bin_method == "adaptive": return ("adaptive", _block_size(params), params.C)
+    return ("global", params.threshold)
+
+
+def _binarize(img, params):
+    # Binarització (sortida estàndard: traç negre, fons blanc)
+    if params.bin_method == "adaptive":
+        img_bin = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, _block_size(params), params.C)
+    else:
+        _, img_bin = cv2.threshold(img, params.threshold, 255, cv2.THRESH_BINARY_INV)
+    # Conversió a format de treball (traç blanc, fons negre)
+    return cv2.bitwise_not(img_bin)
+
+
+def _invert(img, params): return cv2.bitwise_not(img)
+
+
+def _opening(img, params):
+    radius = params.opening_radius
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2*radius+1, 2*radius+1))
+    return cv2.morphologyEx(img, cv2.MORPH_OPEN, kernel)
+
+
+def _touches_border(stats, shape):
+    h, w = shape
+    x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    return (x == 0) | (y == 0) | (x + stats[:, cv2.CC_STAT_WIDTH] == w) | (y + stats[:, cv2.CC_STAT_HEIGHT] == h)
+
+
+def filter_components(img, min_area=0, max_area=0, keep_largest=0, remove_border=False):
+    """Filtra els components blancs (connectivitat 8) en una sola passada.
+
+    Es decideix quins components es conserven a partir de ``stats`` i la
+    imatge resultant s'obté indexant una taula amb la imatge d'etiquetes.
+    ``0`` desactiva ``max_area`` i ``keep_largest``. Els criteris són els de
+    ``tiling.select_components``, compartits amb el preprocés per franges.
+    """
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats(img, 8, cv2.CV_32S)
+    keep = tiling.select_components(*tiling.component_stats(stats, centroids, img.shape), min_area, max_area, keep_largest, remove_border)
+    lut = np.where(keep, 255, 0).astype(np.uint8)
+    return lut[labels]
+
+
+def fill_holes(img, max_hole_area):
+    """Omple els forats negres (connectivitat 4) de menys de ``max_hole_area`` píxels.
+
+    Un forat és una regió de fons que no toca la vora de la imatge.
+    """
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(cv2.bitwise_not(img), 4, cv2.CV_32S)
+    fill = (stats[:, cv2.CC_STAT_AREA] < max_hole_area) & ~_touches_border(stats, img.shape)
+    fill[0] = False
+    lut = np.where(fill, 255, 0).astype(np.uint8)
+    return cv2.bitwise_or(img, lut[labels])
+
+
+def _cleanup_key(params):
+    key = (params.min_area, params.max_area, params.keep_largest, params.fill_holes, params.remove_border)
+    return key if any(key) else None
+
+
+def _cleanup(img, params):
+    img = filter_components(img, params.min_area, params.max_area, params.keep_largest, params.remove_border)
+    if params.fill_holes > 0: img = fill_holes(img, params.fill_holes)
+    return img
+
+
+# ``key(params)`` retorna els paràmetres que afecten l'etapa, o ``None`` si
+# l'etapa no fa res amb aquests paràmetres (llavors la sortida és l'entrada).
+# ``halo(params)`` és el radi en files de l'etapa si és local (cada píxel de
+# sortida només depèn dels veïns a aquesta distància), o ``None`` si amb
+# aquests paràmetres no ho és. ``strips(src, dst, params, budget_bytes)``, si
+# n'hi ha, és la versió per franges d'una etapa no local.
+Stage = collections.namedtuple("Stage", ["name", "key", "run", "halo", "strips"], defaults=(None, None))
+
+# Ordre del preprocés: pre-filtres, binarització i post-filtres sobre la
+# imatge de treball.
+PREPROCESS_STAGES = (
+    Stage("median", lambda p: (5,) if p.median_filter else None, _median, lambda p: 2),
+    Stage("illumination", lambda p: (p.illum_sigma, p.illum_method) if p.illum_sigma > 0 else None, _illumination,
+          lambda p: _blur_halo(p.illum_sigma) if p.illum_method == "exact" else None, _illumination_strips), # La piràmide té la seva versió per franges
+    Stage("clahe", lambda p: (2.0, 8) if p.clahe else None, _clahe), # Histogrames per rajoles de tota la imatge
+    Stage("binarize", _binarize_key, _binarize, lambda p: _block_size(p) // 2 + 1 if p.bin_method == "adaptive" else 0),
+    Stage("invert", lambda p: (True,) if p.invert else None, _invert, lambda p: 0),
+    Stage("opening", lambda p: (p.opening_radius,) if p.opening_radius > 0 else None, _opening, lambda p: 2 * p.opening_radius + 1),
+    Stage("cleanup", _cleanup_key, _cleanup),
+)
+
+
+def preprocess(img_gray, params, stats=None):
+    """Binaritza una imatge en grisos. Retorna la imatge de treball.
+
+    Amb ``stats``, el temps de cada etapa es desa amb el nom de l'etapa.
+    Les imatges que no caben a ``params.tile_budget_mb`` es processen per
+    franges (``tiling``), amb el mateix resultat.
+    """
+    if tiling.should_tile(img_gray.shape, params.tile_budget_mb):
+        return tiling.preprocess_tiled(img_gray, params, PREPROCESS_STAGES, params.tile_budget_mb, stats)
+    img = img_gray
+    for stage in PREPROCESS_STAGES:
+        if stage.key(params) is None: continue
+        with timed(stats, stage.name, pixels=img.size): img = stage.run(img, params)
+    return img
+
+
+class StageCache:
+    """Memòria cau LRU de resultats d'etapes, limitada en bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._items = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if value.nbytes > self.max_bytes: return
+        value.flags.writeable = False # Els resultats compartits no s'han de modificar
+        with self._lock:
+            if key in self._items: self._bytes -= self._items.pop(key).nbytes
+            self._items[key] = value
+            self._bytes += value.nbytes
+            while self._bytes > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self._bytes -= old.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear(); self._bytes = 0
+
+
+class Pipeline:
+    """Preprocés amb memòria cau per etapes.
+
+    Cada etapa guarda la seva sortida amb una clau formada pels seus propis
+    paràmetres i la clau de l'etapa anterior, de manera que en canviar un
+    paràmetre només es recalculen les etapes posteriors. Els resultats són
+    de només lectura.
+
+    Les imatges descodificades (senceres, reduïdes i proxies) van a una
+    memòria cau a part, ``images``, perquè les precàrregues de les imatges
+    veïnes no expulsin les etapes de la imatge actual.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, image_bytes=DEFAULT_IMAGE_CACHE_BYTES):
+        self.cache = StageCache(max_bytes)
+        self.images = StageCache(image_bytes)
+
+    def _cached_image(self, key, read):
+        img = self.images.get(key)
+        if img is None:
+            img = read()
+            self.images.put(key, img)
+        return img
+
+    def load(self, path):
+        key = file_key(path)
+        return key, self._cached_image(key, lambda: load_gray(path))
+
+    def run(self, img, key, params, should_stop=None, stats=None):
+        """Aplica les etapes a ``img``, identificada per ``key``.
+
+        A ``stats`` s'hi desen les etapes calculades; les que surten de la
+        memòria cau porten ``cached=True``. Les imatges massa grans per a
+        ``params.tile_budget_mb`` es processen per franges i només se'n
+        guarda el resultat final.
+        """
+        if tiling.should_tile(img.shape, params.tile_budget_mb):
+            check_cancel(should_stop)
+            for stage in PREPROCESS_STAGES:
+                stage_params = stage.key(params)
+                if stage_params is not None: key = (stage.name, stage_params, key)
+            cached = self.cache.get(key)
+            if cached is None:
+                cached = tiling.preprocess_tiled(img, params, PREPROCESS_STAGES, params.tile_budget_mb, stats)
+                self.cache.put(key, cached)
+            return cached
+        for stage in PREPROCESS_STAGES:
+            check_cancel(should_stop)
+            stage_params = stage.key(params)
+            if stage_params is None: continue
+            key = (stage.name, stage_params, key)
+            with timed(stats, stage.name, pixels=img.size) as info:
+                cached = self.cache.get(key)
+                if cached is None:
+                    cached = stage.run(img, params)
+                    self.cache.put(key, cached)
+                else:
+                    info["cached"] = True
+            img = cached
+        return img
+
+    def process_file(self, path, params, should_stop=None, stats=None):
+        key, img = self.load(path)
+        return self.run(img, key, params, should_stop, stats)
+
+    def load_proxy(self, path, max_w, max_h):
+        """Versió reduïda de la imatge que cap a ``max_w`` x ``max_h``.
+
+        Retorna ``(clau, imatge, factor)``; si la imatge ja hi cap, el factor és 1.
+        Si la mida de la capçalera ho permet, la imatge ja es descodifica
+        reduïda (``IMREAD_REDUCED_GRAYSCALE_*``) i no se n'arriba a llegir la
+        versió sencera.
+        """
+        size = image_size(path)
+        reduce = read_reduction(size, max_w, max_h) if size else 1
+        if reduce == 1:
+            key, img = self.load(path)
+            h, w = img.shape
+        else:
+            key = file_key(path)
+            img = self._cached_image(("reduced", reduce, key), lambda: load_gray(path, reduce))
+            w, h = size if (img.shape[1] >= img.shape[0]) == (size[0] >= size[1]) else size[::-1] # Orientació EXIF
+        factor = min(1.0, max_w / w, max_h / h)
+        if factor >= 1.0: return key, img, 1.0
+        size = (max(1, int(round(w * factor))), max(1, int(round(h * factor))))
+        proxy_key = ("proxy", size, key)
+        proxy = self._cached_image(proxy_key, lambda: cv2.resize(img, size, interpolation=cv2.INTER_AREA))
+        return proxy_key, proxy, size[0] / w
+
+    def process_proxy(self, path, params, max_w, max_h, should_stop=None, stats=None):
+        """Preprocés interactiu sobre una versió reduïda de la imatge.
+
+        Retorna la imatge de treball i els paràmetres reescalats, que són els
+        que cal fer servir per vectoritzar-la.
+        """
+        key, img, factor = self.load_proxy(path, max_w, max_h)
+        scaled = params.scaled(factor)
+        return self.run(img, key, scaled, should_stop, stats), scaled
+
+
+def process_file(path, params, stats=None):
+    """Llegeix i binaritza un fitxer d'imatge."""
+    with timed(stats, "load") as info:
+        img = load_gray(path); info["pixels"] = img.size
+    return preprocess(img, params, stats)
+
+
+# --- Vectorització ---
+
+def vectorize(img_work, params, output_svg_path=None, stats=None):
+    """Vectoritza segons ``params.mode`` i, si cal, escriu l'SVG.
+
+    Si es passa el diccionari ``stats``, s'hi afegeixen les mesures de la
+    vectorització: el recorregut en buit de ``order_for_travel`` i, a
+    ``stats["timings"]``, el temps de cada etapa.
+    """
+    if params.mode == 'outline':
+        return vectorize_outline_potrace(img_work, params, output_svg_path, stats)
+    return vectorize_centerline(img_work, params, output_svg_path, stats)
+
+
+def order_for_travel(paths, params, stats=None):
+    """Reordena els camins per reduir el recorregut en buit si ``params.optimize_travel``.
+
+    El recorregut comença a l'origen de la imatge. A ``stats`` s'hi desen
+    ``travel_before_mm`` i ``travel_after_mm``.
+    """
+    if not params.optimize_travel: return paths
+    before = polylines.travel_length(paths)
+    with timed(stats, "order_paths", paths=len(paths)): paths = polylines.order_paths(paths)
+    if stats is not None:
+        mm_per_px = 25.4 / params.dpi
+        stats["travel_before_mm"] = round(before * mm_per_px, 1)
+        stats["travel_after_mm"] = round(polylines.travel_length(paths) * mm_per_px, 1)
+    return paths
+
+
+def vectorize_outline_potrace(binarized_image_np, params, output_svg_path=None, stats=None):
+    """Contorn omplert amb potrace. Sense ``output_svg_path`` només retorna els camins.
+
+    Els píxels blancs de la imatge de treball s'envien a potrace en memòria.
+    L'SVG exportat és el de potrace amb traç fi i sense emplenat; els camins
+    retornats (previsualització, DXF) són els subcamins de potrace aproximats
+    amb un error de corda de ``params.curve_tolerance`` píxels i simplificats
+    amb ``params.simplification_epsilon``. L'ordre de l'SVG és el de potrace;
+    ``order_for_travel`` només reordena els camins retornats.
+    """
+    with timed(stats, "potrace", pixels=binarized_image_np.size) as info:
+        svg_content = potrace_backend.trace_svg(binarized_image_np > 127, params.potrace_turdsize, params.potrace_alphamax, params.potrace_opttolerance, params.potrace_backend)
+        info["svg_bytes"] = len(svg_content)
+    if output_svg_path:
+        with timed(stats, "write_svg"), svg_writer.open_text(output_svg_path) as f: f.write(potrace_backend.style_for_cutting(svg_content))
+    with timed(stats, "svg_parse") as info:
+        paths = [list(map(tuple, poly.tolist())) for poly in svg_paths.paths_from_svg(svg_content, params.curve_tolerance)]
+        info["paths"] = len(paths)
+    with timed(stats, "simplify") as info:
+        paths = simplify.simplify_paths(paths, params.simplification_epsilon, params.simplify_method)
+        info["paths"], info["points"] = len(paths), sum(len(p) for p in paths)
+    return order_for_travel(paths, params, stats)
+
+
+def vectorize_centerline(binarized_image_np, params, output_svg_path=None, stats=None):
+    """Traç únic a partir de l'esquelet de la imatge."""
+    paths = order_for_travel(trace_centerline(binarized_image_np, params, stats), params, stats)
+    if output_svg_path:
+        h, w = binarized_image_np.shape
+        with timed(stats, "write_svg", paths=len(paths)): create_svg_from_paths(output_svg_path, paths, w, h, params.dpi, params.stroke_mm, "blue", params.scale_preset, params.svg_precision)
+    return paths
+
+
+def trace_centerline(binarized_image_np, params, stats=None):
+    with timed(stats, "skeletonize", pixels=binarized_image_np.size): skeleton = sk_skeletonize(binarized_image_np / 255)
+    with timed(stats, "graph_trace") as info:
+        graph = skeleton_graph.SkeletonGraph(skeleton)
+        info["skeleton_px"] = len(graph)
+        if len(graph) == 0: return []
+        raw_paths = [graph.to_xy(path) for path in graph.trace()]
+        info["paths"] = len(raw_paths)
+
+    with timed(stats, "join_paths") as info:
+        paths = polylines.join_paths(raw_paths, params.join_max_dist)
+        info["paths"] = len(paths)
+
+    with timed(stats, "simplify") as info:
+        prune_len = params.prune_short
+        if prune_len > 0: paths = [p for p in paths if np.sum(np.linalg.norm(np.diff(p, axis=0), axis=1)) >= prune_len]
+        paths = simplify.simplify_paths(paths, params.simplification_epsilon, params.simplify_method)
+        info["paths"], info["points"] = len(paths), sum(len(p) for p in paths)
+        return paths
+
+
+# --- Exportació ---
+
+def create_svg_from_paths(svg_path, paths, w_px, h_px, dpi, stroke_w_mm, color, scale_preset="Cap", precision=svg_writer.DEFAULT_PRECISION):
+    """Escriu les polilínies com a camins SVG; ``.svgz`` es desa comprimit."""
+    mm_per_px = 25.4 / dpi
+    w_mm, h_mm = w_px * mm_per_px, h_px * mm_per_px
+    if scale_preset != "Cap" and SCALE_PRESET_VALUES.get(scale_preset):
+        dim, val = SCALE_PRESET_VALUES[scale_preset]
+        if dim == "width" and w_mm > 0: ratio = val / w_mm; w_mm, h_mm = val, h_mm * ratio
+        elif dim == "height" and h_mm > 0: ratio = val / h_mm; w_mm, h_mm = w_mm * ratio, val
+    svg_writer.write_svg(svg_path, paths, w_px, h_px, f"{w_mm:.3f}mm", f"{h_mm:.3f}mm", color, stroke_w_mm, precision)
+
+
+def export_dxf_from_svg_paths(dxf_path, paths, w_px, h_px, dpi, layer, color):
+    """Escriu els camins en mm (Y cap amunt) a la capa ``layer`` d'un DXF en streaming."""
+    mm_per_px = 25.4 / dpi
+    scale, offset = np.array([mm_per_px, -mm_per_px]), np.array([0.0, h_px * mm_per_px])
+    with dxf_writer.DxfWriter(dxf_path, {layer: color}, ((0.0, 0.0), (w_px * mm_per_px, h_px * mm_per_px))) as writer:
+        writer.add_polylines((np.asarray(p, dtype=float) * scale + offset for p in paths if len(p) > 1), layer)
+
+
+def stitches_from_paths(paths, h_px, dpi, stitch_len_mm):
+    """Punts de brodat en mm (Y cap amunt) cada ``stitch_len_mm``, amb salts entre camins."""
+    mm_per_px = 25.4 / dpi
+    paths_mm = []
+    for p in paths:
+        p = np.asarray(p, dtype=float)
+        if len(p): paths_mm.append(np.column_stack((p[:, 0] * mm_per_px, (h_px - p[:, 1]) * mm_per_px)))
+    return embroidery.resample_paths(paths_mm, stitch_len_mm)
+
+
+def export_csv_from_paths(csv_path, paths, w_px, h_px, dpi, stitch_len_mm):
+    """Escriu els punts de brodat remostrejats; la columna ``Salt`` marca els salts."""
+    xy, jump = stitches_from_paths(paths, h_px, dpi, stitch_len_mm)
+    rows = np.column_stack((xy, jump))
+    with open(csv_path, 'w', newline='') as f:
+        f.write("X_mm,Y_mm,Salt\r\n")
+        f.write(("%.3f,%.3f,%d\r\n" * len(rows)) % tuple(rows.reshape(-1).tolist()))
+
+
+def export_dst_from_paths(dst_path, paths, w_px, h_px, dpi, stitch_len_mm):
+    """Escriu els punts de brodat en format Tajima DST."""
+    xy, jump = stitches_from_paths(paths, h_px, dpi, stitch_len_mm)
+    embroidery.write_dst(dst_path, xy, jump)
+
+
+def dxf_layer_for_preset(preset):
+    """Capa i color DXF d'un perfil de làser, o ``None`` si no n'és."""
+    if "Làser" not in preset: return None
+    return ("CUT", 1) if "Tall" in preset else ("SCORE", 5)
+
+
+def convert_image(img_path, params, output_dir, should_stop=None, stats=None):
+    """Converteix una imatge i retorna la llista de fitxers escrits.
+
+    Escriu ``<nom>__<mode>.svg`` (``.svgz`` si ``params.svg_compress``) i,
+    segons el perfil, el DXF o el CSV i el DST de brodat. Llança una excepció si
+    la conversió falla, o ``Cancelled`` si ``should_stop()`` és cert entre
+    etapes. ``stats`` rep les mesures de ``vectorize`` i el temps de cada etapa.
+    """
+    base_name = os.path.splitext(os.path.basename(img_path))[0]
+    processed_img = process_file(img_path, params, stats)
+    check_cancel(should_stop)
+    mode = params.mode
+    svg_path = os.path.join(output_dir, f"{base_name}__{mode}.svgz" if params.svg_compress else f"{base_name}__{mode}.svg")
+    paths = vectorize(processed_img, params, svg_path, stats)
+    outputs = [svg_path]
+    check_cancel(should_stop)
+
+    h, w = processed_img.shape
+    layer = dxf_layer_for_preset(params.preset)
+    if layer and paths:
+        dxf_path = os.path.join(output_dir, f"{base_name}__{mode}.dxf")
+        with timed(stats, "write_dxf", paths=len(paths)): export_dxf_from_svg_paths(dxf_path, paths, w, h, params.dpi, *layer)
+        outputs.append(dxf_path)
+    elif "Brodat" in params.preset and paths:
+        csv_path = os.path.join(output_dir, f"{base_name}__{mode}.csv")
+        with timed(stats, "write_csv", paths=len(paths)): export_csv_from_paths(csv_path, paths, w, h, params.dpi, params.stitch_length_mm)
+        dst_path = os.path.join(output_dir, f"{base_name}__{mode}.dst")
+        with timed(stats, "write_dst", paths=len(paths)): export_dst_from_paths(dst_path, paths, w, h, params.dpi, params.stitch_length_mm)
+        outputs += [csv_path, dst_path]
+    return outputs
@@ -2,26 +2,29 @@ import tkinter as tk
 from tkinter import filedialog, ttk
 from PIL import Image, ImageTk
 import os
-import cv2
-import numpy as np
+import autotune
 import config_manager
+import contact_sheet
+import engine
+import batch
+import overlay
+import preview
+import profiling
+import result_cache
+import watch
 import threading
 import subprocess
-import tempfile
-import json
-from bs4 import BeautifulSoup
-import ezdxf
-import csv
 import traceback
 import sys
-
-from skimage.morphology import skeletonize as sk_skeletonize
-from svg.path import parse_path
+import time
 
 # --- Colors i Fonts ---
 COLORS = { "Nexe_50": "#EFF1EF", "Nexe_100": "#DFE2DF", "Nexe_200": "#C4CAC4", "Nexe_300": "#A9B2A8", "Nexe_400": "#8F9A8D", "Nexe_500": "#80947E", "Nexe_600": "#5B6959", "Nexe_700": "#485346", "Nexe_800": "#343D34", "Nexe_900": "#242923", "Black": "#111111", "White": "#FFFFFF" }
 FONTS = { "Title": ("Fraunces", 16, "bold"), "SectionTitle": ("Fraunces", 12, "bold"), "UI_Label": ("Inter", 10), "UI_Button": ("Inter", 10, "bold"), "UI_Small": ("Inter", 9), "UI_Tooltip": ("Inter", 8, "normal") }
 
+# --- Previsualització ---
+REFINE_DELAY_MS = 800 # Inactivitat abans de refinar a resolució completa
+
 class Sketch2SVGApp:
     def __init__(self, master):
         self.master = master
@@ -47,23 +50,58 @@ class Sketch2SVGApp:
         self.block_size_var = tk.IntVar(value=11)
         self.C_var = tk.IntVar(value=2)
         self.illum_sigma_var = tk.DoubleVar(value=50.0)
+        self.illum_method_var = tk.StringVar(value="fast")
         self.clahe_var = tk.BooleanVar(value=False)
         self.median_filter_var = tk.BooleanVar(value=False)
         self.opening_radius_var = tk.IntVar(value=0)
         self.min_area_var = tk.IntVar(value=100)
+        self.max_area_var = tk.IntVar(value=0)
+        self.keep_largest_var = tk.IntVar(value=0)
+        self.fill_holes_var = tk.IntVar(value=0)
+        self.remove_border_var = tk.BooleanVar(value=False)
         self.invert_var = tk.BooleanVar(value=False)
         self.prune_short_var = tk.DoubleVar(value=5.0)
+        self.join_max_dist_var = tk.DoubleVar(value=5.0)
         self.simplification_epsilon_var = tk.DoubleVar(value=2.0)
+        self.simplify_method_var = tk.StringVar(value="rdp")
+        self.optimize_travel_var = tk.BooleanVar(value=False)
+        self.potrace_turdsize_var = tk.IntVar(value=2)
+        self.potrace_alphamax_var = tk.DoubleVar(value=1.0)
+        self.potrace_opttolerance_var = tk.DoubleVar(value=0.2)
         self.stroke_mm_var = tk.DoubleVar(value=0.1)
+        self.svg_precision_var = tk.IntVar(value=2)
+        self.svg_compress_var = tk.BooleanVar(value=False)
         self.stitch_length_mm_var = tk.DoubleVar(value=1.0)
         self.dpi_var = tk.IntVar(value=96)
         self.scale_preset_var = tk.StringVar(value="Cap")
         self.vector_preview_var = tk.BooleanVar(value=False)
-        self.scale_preset_options = ["Cap", "Alçada 20mm", "Alçada 25mm", "Alçada 30mm", "Amplada 20mm", "Amplada 25mm", "Amplada 30mm"]
-        self.scale_preset_values = {"Cap": None, "Alçada 20mm": ("height", 20), "Alçada 25mm": ("height", 25), "Alçada 30mm": ("height", 30), "Amplada 20mm": ("width", 20), "Amplada 25mm": ("width", 25), "Amplada 30mm": ("width", 30)}
+        self.proxy_preview_var = tk.BooleanVar(value=True)
+        self.refine_preview_var = tk.BooleanVar(value=False)
+        self.batch_workers_var = tk.IntVar(value=0)
+        self.combined_dxf_var = tk.BooleanVar(value=False)
+        self.result_cache_var = tk.BooleanVar(value=True)
+        self.result_cache_mb_var = tk.IntVar(value=2048)
+        self.tile_budget_mb_var = tk.IntVar(value=1024)
+        self.watch_folder_var = tk.BooleanVar(value=False)
+        self.profile_panel_var = tk.BooleanVar(value=False)
+        self.batch_trace_var = tk.BooleanVar(value=False)
+        self.watch_service = None
+        self._watch_thread = None # Fil que atura el servei anterior i engega el nou
+        self.scale_preset_options = engine.SCALE_PRESET_OPTIONS
+        self.scale_preset_values = engine.SCALE_PRESET_VALUES
         self.image_files = []
         self.current_image_index = -1
         self.img_tk = None
+        self.batch_runner = None
+        self.pipeline = engine.Pipeline()
+        self.preview_scheduler = preview.PreviewScheduler(self._run_preview, self._on_preview_done)
+        self.prefetcher = preview.Prefetcher(self._prefetch_image)
+        self.contact_sheet_window = None
+        self.autotune_window = None
+        self.preview_view = overlay.View()
+        self.preview_shown = None # (imatge de treball, camins preparats, ruta) de la darrera previsualització
+        self._pan_from = None
+        self.flagged_images = set() # Marcades al full de contactes: no entren al lot
 
     def _build_ui(self):
         self.canvas = tk.Canvas(self.master, bg=COLORS["Nexe_50"], highlightthickness=0)
@@ -80,6 +118,8 @@ class Sketch2SVGApp:
         ttk.Label(self.control_frame, text="Controls de Sketch2SVG", font=FONTS["Title"], foreground=COLORS["Nexe_800"]).pack(fill="x", pady=(0, 20))
         self._create_general_config_section()
         self._create_preprocessing_section()
+        self._create_simplification_section()
+        self._create_outline_params_section()
         self._create_centerline_params_section()
         self._create_svg_units_section()
         self._create_actions_section()
@@ -89,7 +129,18 @@ class Sketch2SVGApp:
         self.preview_frame.grid_propagate(False)
         self.preview_canvas = tk.Canvas(self.preview_frame, bg=COLORS["White"], highlightthickness=0)
         self.preview_canvas.pack(expand=True, fill="both")
+        self.preview_canvas.bind("<MouseWheel>", lambda e: self._zoom_preview(1.25 if e.delta > 0 else 0.8, e.x, e.y))
+        self.preview_canvas.bind("<Button-4>", lambda e: self._zoom_preview(1.25, e.x, e.y)) # Rodeta a X11
+        self.preview_canvas.bind("<Button-5>", lambda e: self._zoom_preview(0.8, e.x, e.y))
+        self.preview_canvas.bind("<ButtonPress-1>", lambda e: setattr(self, "_pan_from", (e.x, e.y)))
+        self.preview_canvas.bind("<B1-Motion>", self._pan_preview)
+        self.preview_canvas.bind("<Double-Button-1>", lambda e: self._set_preview_view(overlay.View()))
+        self.preview_canvas.bind("<Configure>", lambda e: self._render_preview())
         self.preview_canvas.create_text(20, 20, anchor="nw", text="Selecciona una carpeta per començar.", fill=COLORS["Nexe_800"])
+        self.profile_tree = ttk.Treeview(self.preview_frame, columns=("stage", "ms", "counts", "mb"), show="headings", height=8)
+        for column, title, width in (("stage", "Etapa", 120), ("ms", "ms", 70), ("counts", "Detall", 260), ("mb", "Memòria màx. (MB)", 120)):
+            self.profile_tree.heading(column, text=title)
+            self.profile_tree.column(column, width=width, anchor="e" if column in ("ms", "mb") else "w")
 
         self.status_bar = ttk.Label(self.master, text="Estat: Esperant...", relief=tk.SUNKEN, anchor=tk.W, background=COLORS["Nexe_100"], foreground=COLORS["Nexe_800"])
         self.status_bar.grid(row=1, column=0, columnspan=2, sticky="ew")
@@ -105,12 +156,22 @@ class Sketch2SVGApp:
         
         ttk.Label(frame, text="Perfil d'ús (Preset):").pack(fill="x")
         preset_names = list(config_manager.PRESETS.keys())
-        ttk.OptionMenu(frame, self.preset_profile_var, preset_names[0], *preset_names, command=self.apply_preset).pack(fill="x", pady=(0, 5))
+        self.preset_menu = ttk.OptionMenu(frame, self.preset_profile_var, preset_names[0], *preset_names, command=self.apply_preset)
+        self.preset_menu.pack(fill="x", pady=(0, 5))
         ttk.Button(frame, text="Restaurar configuració del perfil", command=self.reset_current_profile_settings).pack(fill="x", pady=(0, 10))
         
         ttk.Button(frame, text="Tria carpeta d'esbossos...", command=self.select_folder).pack(fill="x")
         self.folder_path_label = ttk.Label(frame, text="Cap carpeta seleccionada", wraplength=350, font=FONTS["UI_Small"], foreground=COLORS["Nexe_400"])
         self.folder_path_label.pack(fill="x", pady=2)
+        nav_frame = ttk.Frame(frame)
+        nav_frame.pack(fill="x", pady=2)
+        ttk.Button(nav_frame, text="◀", width=3, command=self.previous_image).pack(side="left")
+        ttk.Button(nav_frame, text="▶", width=3, command=self.next_image).pack(side="right")
+        self.nav_label = ttk.Label(nav_frame, text="", anchor="center", font=FONTS["UI_Small"])
+        self.nav_label.pack(side="left", fill="x", expand=True)
+        ToolTip(nav_frame, "Imatge anterior o següent de la carpeta (també amb Re Pàg / Av Pàg).")
+        self.master.bind_all("<Prior>", lambda e: self.previous_image())
+        self.master.bind_all("<Next>", lambda e: self.next_image())
         
         ttk.Label(frame, text="Mode de vectorització:").pack(fill="x", pady=(10, 2))
         ttk.Radiobutton(frame, text="Contorn omplert (Tall Làser)", variable=self.mode_var, value="outline", command=self.update_parameters_visibility).pack(anchor="w")
@@ -122,6 +183,12 @@ class Sketch2SVGApp:
         self._add_section_title(frame, "Preprocés d'Imatge")
         
         self.add_slider(frame, "Correcció il·luminació:", self.illum_sigma_var, 0, 200, 1, "Suavitza el fons per corregir il·luminació irregular.")
+        illum_frame = ttk.Frame(frame)
+        illum_frame.pack(fill="x")
+        ttk.Label(illum_frame, text="Càlcul del fons:").pack(side="left")
+        for text, value in (("Exacte", "exact"), ("Ràpid", "fast"), ("Molt ràpid", "fastest")):
+            ttk.Radiobutton(illum_frame, text=text, variable=self.illum_method_var, value=value, command=self.preview_image).pack(side="left")
+        ToolTip(illum_frame, "El càlcul ràpid difumina una versió reduïda de la imatge: és molt més ràpid amb sigmes grans i el fons difereix en pocs nivells de gris.")
         ttk.Checkbutton(frame, text="Filtre Median (reducció soroll)", variable=self.median_filter_var, command=self.preview_image).pack(anchor="w")
         ttk.Checkbutton(frame, text="CLAHE (millora contrast)", variable=self.clahe_var, command=self.preview_image).pack(anchor="w")
         
@@ -135,14 +202,36 @@ class Sketch2SVGApp:
         ttk.Checkbutton(frame, text="Invertir colors", variable=self.invert_var, command=self.preview_image).pack(anchor="w", pady=(10, 0))
         self.add_slider(frame, "Radi 'Obertura' (neteja):", self.opening_radius_var, 0, 10, 1, "Tapa forats als traços i elimina soroll.")
         self.add_slider(frame, "Mínim Àrea Objecte:", self.min_area_var, 0, 1000, 10, "Elimina taques o components petits.")
+        self.add_slider(frame, "Màxim Àrea Objecte:", self.max_area_var, 0, 100000, 100, "Elimina components massa grans (0 = sense límit).")
+        self.add_slider(frame, "Objectes més grans:", self.keep_largest_var, 0, 50, 1, "Conserva només els N components més grans (0 = tots).")
+        self.add_slider(frame, "Omple forats (àrea):", self.fill_holes_var, 0, 1000, 10, "Omple els forats interiors més petits que aquesta àrea.")
+        ttk.Checkbutton(frame, text="Elimina objectes que toquen la vora", variable=self.remove_border_var, command=self.preview_image).pack(anchor="w")
+
+    def _create_simplification_section(self):
+        frame = ttk.Frame(self.control_frame)
+        frame.pack(fill="x", pady=5, anchor='w')
+        self._add_section_title(frame, "Simplificació de Línies")
+        self.add_slider(frame, "Simplificació línies ε (px):", self.simplification_epsilon_var, 0, 10, 0.1, "Suavitza les línies eliminant punts redundants.")
+        ttk.Radiobutton(frame, text="Douglas-Peucker (distància)", variable=self.simplify_method_var, value="rdp", command=self.preview_image).pack(anchor="w")
+        ttk.Radiobutton(frame, text="Visvalingam-Whyatt (àrea)", variable=self.simplify_method_var, value="vw", command=self.preview_image).pack(anchor="w")
+        travel_check = ttk.Checkbutton(frame, text="Optimitza l'ordre dels camins", variable=self.optimize_travel_var, command=self.preview_image)
+        travel_check.pack(anchor="w", pady=(5, 0))
+        ToolTip(travel_check, "Ordena i orienta els camins per reduir els desplaçaments en buit del làser o el plotter.")
+
+    def _create_outline_params_section(self):
+        self.outline_params_frame = ttk.Frame(self.control_frame)
+        self._add_section_title(self.outline_params_frame, "Paràmetres Contorn (potrace)")
+        self.add_slider(self.outline_params_frame, "Taca mínima (px):", self.potrace_turdsize_var, 0, 100, 1, "Potrace ignora les taques d'aquesta àrea o menys.")
+        self.add_slider(self.outline_params_frame, "Suavitat cantonades:", self.potrace_alphamax_var, 0, 1.34, 0.01, "Valors baixos fan més cantonades; valors alts, corbes més suaus.")
+        self.add_slider(self.outline_params_frame, "Tolerància corbes:", self.potrace_opttolerance_var, 0, 1, 0.05, "Uneix corbes consecutives per reduir la mida del fitxer (0 = desactivat).")
 
     def _create_centerline_params_section(self):
         self.centerline_params_frame = ttk.Frame(self.control_frame)
         self._add_section_title(self.centerline_params_frame, "Paràmetres Traç Únic")
         self.add_slider(self.centerline_params_frame, "Poda segments curts (px):", self.prune_short_var, 0, 50, 0.5, "Elimina línies curtes sorolloses.")
-        self.add_slider(self.centerline_params_frame, "Simplificació línies ε (px):", self.simplification_epsilon_var, 0, 10, 0.1, "Suavitza les línies eliminant punts redundants.")
+        self.add_slider(self.centerline_params_frame, "Unió d'extrems (px):", self.join_max_dist_var, 0, 20, 0.5, "Uneix traços amb extrems més propers que aquesta distància.")
         self.add_slider(self.centerline_params_frame, "Gruix de traç (mm):", self.stroke_mm_var, 0.01, 2.0, 0.01, "Gruix visual per a l'SVG (no afecta el gravat).")
-        self.add_slider(self.centerline_params_frame, "Llargada de punt (mm):", self.stitch_length_mm_var, 0.1, 5.0, 0.1, "Llargada mitjana per a punts de brodat (CSV).")
+        self.add_slider(self.centerline_params_frame, "Llargada de punt (mm):", self.stitch_length_mm_var, 0.1, 5.0, 0.1, "Llargada màxima dels punts de brodat (CSV i DST).")
         
     def _create_svg_units_section(self):
         frame = ttk.Frame(self.control_frame)
@@ -151,14 +240,53 @@ class Sketch2SVGApp:
         self.add_slider(frame, "Resolució DPI:", self.dpi_var, 50, 300, 1, "Píxels per polzada de la imatge original.")
         ttk.Label(frame, text="Mida final (escala):").pack(anchor="w")
         ttk.OptionMenu(frame, self.scale_preset_var, self.scale_preset_options[0], *self.scale_preset_options, command=lambda e: self.preview_image()).pack(fill="x")
+        self.add_slider(frame, "Decimals coordenades:", self.svg_precision_var, 0, 4, 1, "Precisió de les coordenades de l'SVG; menys decimals, fitxers més petits.")
+        ttk.Checkbutton(frame, text="Desa comprimit (.svgz)", variable=self.svg_compress_var).pack(anchor="w")
 
     def _create_actions_section(self):
         frame = ttk.Frame(self.control_frame)
         frame.pack(fill="x", pady=5, anchor='w')
         self._add_section_title(frame, "Accions")
-        ttk.Checkbutton(frame, text="Previsualització Vectorial (lent)", variable=self.vector_preview_var, command=self.preview_image).pack(anchor="w", pady=5)
+        ttk.Checkbutton(frame, text="Previsualització Vectorial", variable=self.vector_preview_var, command=self.preview_image).pack(anchor="w", pady=5)
+        ttk.Checkbutton(frame, text="Previsualització ràpida (resolució reduïda)", variable=self.proxy_preview_var, command=self.preview_image).pack(anchor="w")
+        ttk.Checkbutton(frame, text="Refina a resolució completa en repòs", variable=self.refine_preview_var).pack(anchor="w", pady=(0, 5))
+        profile_check = ttk.Checkbutton(frame, text="Mostra el temps de cada etapa", variable=self.profile_panel_var, command=self._toggle_profile_panel)
+        profile_check.pack(anchor="w", pady=(0, 5))
+        ToolTip(profile_check, "Taula amb el temps, els comptadors i la memòria màxima de cada etapa de la darrera previsualització.")
+        workers_frame = ttk.Frame(frame)
+        workers_frame.pack(fill="x", pady=2)
+        ttk.Label(workers_frame, text="Processos en paral·lel:", width=20).pack(side="left")
+        ttk.Spinbox(workers_frame, from_=0, to=batch.default_workers(), textvariable=self.batch_workers_var, width=6).pack(side="right")
+        ToolTip(workers_frame, "Nombre de processos per a l'exportació per lots (0 = tots els nuclis).")
+        budget_frame = ttk.Frame(frame)
+        budget_frame.pack(fill="x", pady=2)
+        ttk.Label(budget_frame, text="Memòria per imatge (MB):", width=20).pack(side="left")
+        ttk.Spinbox(budget_frame, from_=0, to=65536, increment=256, textvariable=self.tile_budget_mb_var, width=6).pack(side="right")
+        ToolTip(budget_frame, "Les imatges que no hi caben es preprocessen per franges, amb el mateix resultat (0 = sense límit).")
+        combined_check = ttk.Checkbutton(frame, text="DXF únic per a tot el lot", variable=self.combined_dxf_var)
+        combined_check.pack(anchor="w")
+        ToolTip(combined_check, f"Als perfils de làser, ajunta tots els DXF del lot a {batch.COMBINED_DXF}.")
+        cache_check = ttk.Checkbutton(frame, text="Reutilitza resultats ja calculats", variable=self.result_cache_var)
+        cache_check.pack(anchor="w")
+        ToolTip(cache_check, "Les imatges sense canvis i amb els mateixos paràmetres es copien de la memòria cau en lloc de tornar-les a processar.")
+        trace_check = ttk.Checkbutton(frame, text=f"Desa la traça de rendiment ({batch.TRACE_JSON})", variable=self.batch_trace_var)
+        trace_check.pack(anchor="w")
+        ToolTip(trace_check, "Temps de cada etapa de cada fitxer del lot, per obrir amb chrome://tracing o ui.perfetto.dev.")
+        watch_check = ttk.Checkbutton(frame, text="Vigila la carpeta", variable=self.watch_folder_var, command=self.toggle_watch)
+        watch_check.pack(anchor="w")
+        ToolTip(watch_check, "Converteix a output_vector/ les imatges noves o modificades de la carpeta quan s'acaben d'escriure, amb els paràmetres del moment d'activar-ho o de canviar de preset.")
+        self.autotune_button = ttk.Button(frame, text="Auto-ajust de la binarització", command=self.start_autotune)
+        self.autotune_button.pack(fill="x", pady=(10, 0))
+        ToolTip(self.autotune_button, "Prova combinacions de mida de bloc, C, sigma d'il·luminació i obertura en retalls d'unes quantes imatges de la carpeta i proposa les millors com a preset temporal.")
+        sheet_button = ttk.Button(frame, text="Full de contactes", command=self.open_contact_sheet)
+        sheet_button.pack(fill="x", pady=(10, 0))
+        ToolTip(sheet_button, "Miniatures de totes les imatges de la carpeta amb els paràmetres actuals. Clic dret per marcar les que no s'han d'exportar.")
         self.export_button = ttk.Button(frame, text="Exporta lot", command=self.export_batch)
-        self.export_button.pack(fill="x", pady=10, ipady=5)
+        self.export_button.pack(fill="x", pady=(10, 5), ipady=5)
+        self.batch_progress = ttk.Progressbar(frame, orient="horizontal", mode="determinate")
+        self.batch_progress.pack(fill="x", pady=(0, 5))
+        self.cancel_button = ttk.Button(frame, text="Cancel·la lot", command=self.cancel_batch, state=tk.DISABLED)
+        self.cancel_button.pack(fill="x")
 
     def add_slider(self, parent_frame, label_text, var_obj, from_, to, resolution, tooltip=""):
         f = ttk.Frame(parent_frame)
@@ -176,6 +304,11 @@ class Sketch2SVGApp:
         if tooltip: ToolTip(f, tooltip)
         
     def on_closing(self):
+        self.preview_scheduler.stop()
+        self.prefetcher.stop()
+        if self.contact_sheet_window is not None: self.contact_sheet_window.close()
+        if self.autotune_window is not None: self.autotune_window.close()
+        if self.watch_service is not None: self.watch_service.stop(wait=False)
         config_manager.save_config(self._get_current_settings())
         self.master.destroy()
 
@@ -186,11 +319,13 @@ class Sketch2SVGApp:
             if hasattr(self, key) and isinstance(getattr(self, key), (tk.StringVar, tk.IntVar, tk.DoubleVar, tk.BooleanVar)):
                 getattr(self, key).set(value)
         self.update_parameters_visibility()
+        if self.watch_service is not None: self.toggle_watch()
 
     def _load_initial_config(self):
         settings = config_manager.load_config()
         self.preset_profile_var.set(settings.get("last_preset_profile", list(config_manager.PRESETS.keys())[0]))
         self.apply_preset()
+        for key in config_manager.APP_SETTINGS: getattr(self, key).set(settings[key])
         last_folder = settings.get("last_folder", "")
         if os.path.isdir(last_folder):
             self.select_folder(last_folder)
@@ -199,7 +334,7 @@ class Sketch2SVGApp:
         settings = {var_name: getattr(self, var_name).get() for var_name in dir(self) if var_name.endswith("_var")}
         path = self.folder_path_label.cget("text")
         settings["last_folder"] = path if "Cap carpeta" not in path else ""
-        settings["last_preset_profile"] = self.preset_profile_var.get()
+        settings["last_preset_profile"] = config_manager.base_preset_name(self.preset_profile_var.get()) # Els temporals no es desen
         return settings
 
     def reset_current_profile_settings(self):
@@ -207,304 +342,239 @@ class Sketch2SVGApp:
 
     def update_parameters_visibility(self):
         if self.mode_var.get() == "centerline":
+            self.outline_params_frame.pack_forget()
             self.centerline_params_frame.pack(fill="x", pady=10, anchor='w')
         else:
             self.centerline_params_frame.pack_forget()
+            self.outline_params_frame.pack(fill="x", pady=10, anchor='w')
         self.preview_image()
 
     def select_folder(self, folder_path=None):
         if folder_path is None: folder_path = filedialog.askdirectory()
         if folder_path and os.path.isdir(folder_path):
             self.folder_path_label.config(text=folder_path)
-            self.image_files = sorted([os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg')) and not f.startswith('.')])
+            self.image_files = engine.list_images(folder_path)
+            self.flagged_images.clear()
+            if self.watch_service is not None: self.toggle_watch()
             if self.image_files:
                 self.current_image_index = 0
                 self.preview_image()
             else:
                 self.status_bar.config(text="Cap imatge suportada a la carpeta.")
     
-    def preview_image(self):
+    def _get_params(self):
+        """Còpia immutable dels paràmetres actuals. Cal cridar-la des del fil de Tk."""
+        settings = {var_name: getattr(self, var_name).get() for var_name in dir(self) if var_name.endswith("_var")}
+        return engine.ConversionParams.from_settings(settings, preset=self.preset_profile_var.get())
+
+    def preview_image(self, full_res=False):
         if hasattr(self, 'image_files') and self.image_files:
             path = self.image_files[self.current_image_index]
             self.status_bar.config(text=f"Processant {os.path.basename(path)}...")
-            threading.Thread(target=self._process_and_update_thread, args=(path,), daemon=True).start()
-
-    def _process_and_update_thread(self, path):
-        img_np = self._process_image_for_preview(path)
-        vector_paths = []
-        if img_np is not None and self.vector_preview_var.get():
-            _, vector_paths = self._vectorize_for_preview(img_np, self.mode_var.get())
-        self.master.after(0, self._update_preview_display, img_np, path, vector_paths)
+            max_size = None
+            if self.proxy_preview_var.get() and not full_res:
+                canvas_w, canvas_h = self.preview_canvas.winfo_width(), self.preview_canvas.winfo_height()
+                if canvas_w > 20 and canvas_h > 20: max_size = (canvas_w - 20, canvas_h - 20)
+            params = self._get_params()
+            self.preview_scheduler.submit((path, params, self.vector_preview_var.get(), max_size))
+            if self.contact_sheet_window is not None: self.contact_sheet_window.refresh(self.image_files, params)
+            neighbours = preview.neighbour_indices(self.current_image_index, len(self.image_files))
+            self.prefetcher.prefetch([(self.image_files[i], max_size) for i in neighbours])
+        self._update_nav_label()
+
+    def _update_nav_label(self):
+        if self.image_files and self.current_image_index >= 0:
+            name = os.path.basename(self.image_files[self.current_image_index])
+            self.nav_label.config(text=f"{self.current_image_index + 1} / {len(self.image_files)} · {name}")
+        else:
+            self.nav_label.config(text="")
+
+    def show_image(self, index):
+        if not self.image_files: return
+        self.current_image_index = index % len(self.image_files)
+        self.preview_image()
+
+    def next_image(self): self.show_image(self.current_image_index + 1)
+
+    def previous_image(self): self.show_image(self.current_image_index - 1)
+
+    def open_contact_sheet(self):
+        if not self.image_files:
+            self.status_bar.config(text="Error: Cal triar una carpeta amb imatges.")
+            return
+        if self.contact_sheet_window is None: self.contact_sheet_window = ContactSheetWindow(self)
+        else: self.contact_sheet_window.window.lift()
+        self.contact_sheet_window.refresh(self.image_files, self._get_params())
+
+    def start_autotune(self):
+        image_files = [f for f in self.image_files if f not in self.flagged_images]
+        if not image_files:
+            self.status_bar.config(text="Error: Cal triar una carpeta amb imatges.")
+            return
+        self.autotune_button.config(state=tk.DISABLED)
+        self.status_bar.config(text="Auto-ajust: buscant els millors paràmetres...")
+        progress = lambda stage, count, seconds: self.master.after(0, lambda: self.status_bar.config(text=f"Auto-ajust: graella {stage}, {count} candidats en {seconds:.1f} s..."))
+        tuner = autotune.AutoTuner(self._get_params(), workers=self._batch_workers() or None, progress=progress)
+        threading.Thread(target=self._autotune_thread, args=(tuner, image_files), daemon=True).start()
+
+    def _autotune_thread(self, tuner, image_files):
+        start = time.perf_counter()
+        try:
+            candidates, error = tuner.run(image_files), None
+        except Exception as e:
+            traceback.print_exc()
+            candidates, error = [], e
+        self.master.after(0, self._finish_autotune, candidates, time.perf_counter() - start, error)
+
+    def _finish_autotune(self, candidates, seconds, error):
+        self.autotune_button.config(state=tk.NORMAL)
+        if error is not None or not candidates:
+            self.status_bar.config(text=f"Auto-ajust: error: {error}" if error is not None else "Auto-ajust: cap candidat vàlid.")
+            return
+        self.status_bar.config(text=f"Auto-ajust: {len(candidates)} candidats en {seconds:.1f} s. Tria'n un per provar-lo.")
+        if self.autotune_window is not None: self.autotune_window.close()
+        self.autotune_window = AutoTuneWindow(self, candidates)
+
+    def apply_autotune_candidate(self, candidate):
+        """Desa el candidat com a preset temporal (amb la resta de paràmetres actuals) i l'aplica."""
+        settings = {key: getattr(self, key).get() for key in config_manager.DEFAULT_STANDARD_SETTINGS if hasattr(self, key)}
+        settings.update({f"{name}_var": getattr(candidate.params, name) for name in autotune.TUNED_FIELDS})
+        name = config_manager.add_temporary_preset(self.preset_profile_var.get(), settings)
+        self.preset_menu.set_menu(name, *config_manager.get_preset_names())
+        self.preset_profile_var.set(name)
+        self.apply_preset(name)
+
+    def _prefetch_image(self, item):
+        # Fil de precàrrega: només descodifica, a la mida que farà servir la previsualització.
+        path, max_size = item
+        if max_size: self.pipeline.load_proxy(path, *max_size)
+        else: self.pipeline.load(path)
+
+    def _run_preview(self, request, should_stop):
+        # S'executa al fil del planificador: només fa servir la còpia dels paràmetres.
+        path, params, vector_preview, max_size = request
+        vector_paths, stats = [], {}
+        if max_size:
+            try:
+                img_np, params = self.pipeline.process_proxy(path, params, *max_size, should_stop=should_stop, stats=stats)
+            except engine.Cancelled:
+                raise
+            except Exception as e:
+                traceback.print_exc(); img_np = None
+                stats["error"] = f"{type(e).__name__}: {e}"
+        else:
+            img_np = self._process_image_for_preview(path, params, should_stop, stats)
+        if img_np is not None and vector_preview:
+            engine.check_cancel(should_stop)
+            _, vector_paths = self._vectorize_for_preview(img_np, params, stats)
+        return img_np, overlay.VectorOverlay(vector_paths) if vector_paths else None, stats
+
+    def _on_preview_done(self, request, result):
+        img_np, vector_paths, stats = result
+        self.master.after(0, self._update_preview_display, img_np, request[0], vector_paths, stats)
+        if request[3] and img_np is not None:
+            generation = self.preview_scheduler.generation
+            self.master.after(REFINE_DELAY_MS, self._refine_preview, generation)
+
+    def _refine_preview(self, generation):
+        # Només si no hi ha hagut cap petició nova des de la previsualització reduïda.
+        if self.refine_preview_var.get() and self.preview_scheduler.generation == generation:
+            self.preview_image(full_res=True)
         
-    def _process_image_for_preview(self, path):
+    def _process_image_for_preview(self, path, params, should_stop=None, stats=None):
         try:
-            img_gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-            if img_gray is None: raise ValueError("No es pot llegir la imatge.")
-
-            # Pre-filtres
-            if self.median_filter_var.get(): img_gray = cv2.medianBlur(img_gray, 5)
-            sigma = self.illum_sigma_var.get()
-            if sigma > 0:
-                blurred = cv2.GaussianBlur(img_gray, (0, 0), sigmaX=sigma, sigmaY=sigma)
-                img_gray = cv2.divide(img_gray, blurred, scale=255)
-            if self.clahe_var.get():
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-                img_gray = clahe.apply(img_gray)
-            
-            # Binarització (sortida estàndard: traç negre, fons blanc)
-            if self.bin_method_var.get() == "adaptive":
-                bs = self.block_size_var.get();
-                if bs % 2 == 0: bs += 1
-                img_bin = cv2.adaptiveThreshold(img_gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, bs, self.C_var.get())
-            else:
-                _, img_bin = cv2.threshold(img_gray, self.threshold_var.get(), 255, cv2.THRESH_BINARY_INV)
-            
-            # Conversió a format de treball (traç blanc, fons negre)
-            img_work = cv2.bitwise_not(img_bin)
-            if self.invert_var.get(): img_work = cv2.bitwise_not(img_work)
-            
-            # Post-filtres sobre imatge amb traç blanc
-            radius = self.opening_radius_var.get()
-            if radius > 0:
-                kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2*radius+1, 2*radius+1))
-                img_work = cv2.morphologyEx(img_work, cv2.MORPH_OPEN, kernel)
-            
-            min_area = self.min_area_var.get()
-            if min_area > 0:
-                n, labels, stats, _ = cv2.connectedComponentsWithStats(img_work, 8, cv2.CV_32S)
-                for i in range(1, n):
-                    if stats[i, cv2.CC_STAT_AREA] < min_area: img_work[labels == i] = 0
-            
-            return img_work
+            return self.pipeline.process_file(path, params, should_stop, stats)
+        except engine.Cancelled:
+            raise
         except Exception as e:
-            traceback.print_exc(); return None
+            traceback.print_exc()
+            if stats is not None: stats["error"] = f"{type(e).__name__}: {e}"
+            return None
 
-    def _update_preview_display(self, img_np, path, vector_paths=None):
+    def _update_preview_display(self, img_np, path, vectors=None, stats=None):
         self.master.update_idletasks() # Forcem l'actualització de la UI abans de llegir mides
-        self.preview_canvas.delete("all")
+        self._show_profile(stats)
         if img_np is None:
-            self.preview_canvas.create_text(20,20, anchor='nw', text=f"Error processant {os.path.basename(path)}")
+            self.preview_shown = None
+            error = (stats or {}).get("error", "")
+            self.preview_canvas.delete("all")
+            self.preview_canvas.create_text(20,20, anchor='nw', text=f"Error processant {os.path.basename(path)}\n{error}")
+            self.status_bar.config(text=f"Error processant {os.path.basename(path)}: {error}")
             return
-
+        if self.preview_shown is None or self.preview_shown[2] != path: self.preview_view = overlay.View() # Imatge nova: vista sencera
+        self.preview_shown = (img_np, vectors, path)
+        self._render_preview()
+
+        status = f"Previsualitzant {os.path.basename(path)}"
+        if stats and "travel_after_mm" in stats:
+            status += f" · Recorregut en buit: {stats['travel_before_mm']:.0f} → {stats['travel_after_mm']:.0f} mm"
+        if vectors: status += f" · {vectors.count} camins"
+        if stats and stats.get("spans"):
+            status += f" · {sum(s['seconds'] for s in stats['spans']) * 1000:.0f} ms"
+        if stats and stats.get("error"): status += f" · Error: {stats['error']}"
+        self.status_bar.config(text=status)
+
+    def _render_preview(self):
+        """Torna a dibuixar la darrera previsualització amb la vista actual, sense recalcular-la."""
+        if self.preview_shown is None: return
         canvas_w, canvas_h = self.preview_canvas.winfo_width(), self.preview_canvas.winfo_height()
         if canvas_w < 2 or canvas_h < 2: return # Evitem dibuixar si el canvas no és visible
-        
-        img_h, img_w = img_np.shape
-        ratio = min((canvas_w-20) / img_w, (canvas_h-20) / img_h)
-        disp_w, disp_h = int(img_w * ratio), int(img_h * ratio)
-        
-        img_pil = Image.fromarray(img_np).resize((disp_w, disp_h), Image.LANCZOS)
-        self.img_tk = ImageTk.PhotoImage(img_pil)
-        self.preview_canvas.create_image(canvas_w/2, canvas_h/2, anchor='center', image=self.img_tk)
-
-        if vector_paths:
-            ox, oy = (canvas_w - disp_w) / 2, (canvas_h - disp_h) / 2
-            for path in vector_paths:
-                scaled_path = [(x * ratio + ox, y * ratio + oy) for x, y in path]
-                if len(scaled_path) > 1:
-                    self.preview_canvas.create_line(scaled_path, fill="lime", width=1.5)
-
-        self.status_bar.config(text=f"Previsualitzant {os.path.basename(path)}")
-
-    def _vectorize_for_preview(self, img_np, mode):
-        if mode == 'outline':
-            return self._vectorize_outline_potrace(img_np, preview_only=True)
-        else:
-            return self._vectorize_centerline(img_np, preview_only=True)
+        img_np, vectors, _ = self.preview_shown
+        rgb, _ = overlay.render(img_np, vectors, self.preview_view, (canvas_w, canvas_h))
+        self.img_tk = ImageTk.PhotoImage(Image.fromarray(rgb))
+        self.preview_canvas.delete("all")
+        self.preview_canvas.create_image(0, 0, anchor='nw', image=self.img_tk)
 
-    def _vectorize_outline_potrace(self, binarized_image_np, output_svg_path=None, preview_only=False):
-        tmp_path = None
-        try:
-            with tempfile.NamedTemporaryFile(suffix=".bmp", delete=False) as tmp_file:
-                tmp_path = tmp_file.name
-            
-            img_for_potrace = cv2.bitwise_not(binarized_image_np) # Potrace vol traç negre
-            cv2.imwrite(tmp_path, img_for_potrace)
-            
-            command = ["potrace", tmp_path]
-            if preview_only:
-                command.extend(["-b", "svg"])
-            else:
-                command.extend(["-s", "-o", output_svg_path, "--fillcolor", "none", "--strokecolor", "black", "--stroke-width", "0.01mm"])
+    def _set_preview_view(self, view):
+        self.preview_view = view
+        self._render_preview()
 
-            result = subprocess.run(command, check=True, capture_output=True, text=True)
-            svg_content = result.stdout if preview_only else open(output_svg_path, 'r', encoding='utf-8').read()
+    def _preview_geometry(self):
+        return self.preview_shown[0].shape, (self.preview_canvas.winfo_width(), self.preview_canvas.winfo_height())
 
-            soup = BeautifulSoup(svg_content, 'xml')
-            paths = [self._convert_svgpath_to_points(parse_path(p.get('d'))) for p in soup.find_all('path') if p.get('d')]
-            return True, [p for p in paths if p]
-        except Exception as e:
-            traceback.print_exc(); return False, []
-        finally:
-            if tmp_path and os.path.exists(tmp_path): os.remove(tmp_path)
+    def _zoom_preview(self, factor, x, y):
+        if self.preview_shown is not None: self._set_preview_view(self.preview_view.zoomed(factor, x, y, *self._preview_geometry()))
+        return "break" # No desplacis el panell de controls
+
+    def _pan_preview(self, event):
+        if self.preview_shown is None or self._pan_from is None: return
+        dx, dy = event.x - self._pan_from[0], event.y - self._pan_from[1]
+        self._pan_from = (event.x, event.y)
+        self._set_preview_view(self.preview_view.panned(dx, dy, *self._preview_geometry()))
+
+    def _toggle_profile_panel(self):
+        if self.profile_panel_var.get(): self.profile_tree.pack(fill="x", side="bottom", pady=(5, 0), before=self.preview_canvas)
+        else: self.profile_tree.pack_forget()
 
-    def _vectorize_centerline(self, binarized_image_np, output_svg_path=None, preview_only=False):
+    def _show_profile(self, stats):
+        self.profile_tree.delete(*self.profile_tree.get_children())
+        for name, seconds, counts, peak_mb in profiling.summarize((stats or {}).get("spans", ())):
+            detail = ", ".join(f"{k}={v}" for k, v in counts.items())
+            self.profile_tree.insert("", "end", values=(name, f"{seconds * 1000:.1f}", detail, "" if peak_mb is None else f"{peak_mb:.0f}"))
+
+    def _vectorize_for_preview(self, img_np, params, stats=None):
         try:
-            skeleton = sk_skeletonize(binarized_image_np / 255)
-            skel_coords = np.argwhere(skeleton)
-            if skel_coords.size == 0: return True, []
-
-            graph = {tuple(p): [tuple(n) for n in self._get_neighbors(p, skeleton)] for p in skel_coords}
-            raw_paths = []
-            
-            nodes_to_process = [node for node, nbrs in graph.items() if len(nbrs) != 2]
-            for start_node in nodes_to_process:
-                if start_node not in graph: continue
-                for neighbor in list(graph[start_node]):
-                    path = [start_node, neighbor]
-                    self._remove_edge(graph, start_node, neighbor)
-                    curr, prev = neighbor, start_node
-                    while curr in graph and len(graph.get(curr, [])) == 1:
-                        prev, curr = curr, graph[curr][0]
-                        path.append(curr)
-                        self._remove_edge(graph, prev, curr)
-                    raw_paths.append([(c,r) for r,c in path])
-
-            while graph:
-                start_node = next(iter(graph))
-                path = [start_node]
-                curr = start_node
-                while curr in graph and graph[curr]:
-                    neighbor = graph[curr][0]
-                    self._remove_edge(graph, curr, neighbor)
-                    curr = neighbor
-                    path.append(curr)
-                    if curr == start_node: break
-                raw_paths.append([(c,r) for r,c in path])
-
-            paths = self._join_paths(raw_paths, max_dist=5)
-            
-            prune_len = self.prune_short_var.get()
-            if prune_len > 0: paths = [p for p in paths if np.sum(np.linalg.norm(np.diff(p, axis=0), axis=1)) >= prune_len]
-            epsilon = self.simplification_epsilon_var.get()
-            if epsilon > 0: paths = [self._ramer_douglas_peucker(p, epsilon) for p in paths if len(p) > 1]
-            
-            if not preview_only and output_svg_path:
-                h, w = binarized_image_np.shape
-                self._create_svg_from_paths(output_svg_path, paths, w, h, self.dpi_var.get(), self.stroke_mm_var.get(), "blue")
-            return True, paths
+            return True, engine.vectorize(img_np, params, stats=stats)
         except Exception as e:
-            traceback.print_exc(); return False, []
-
-    def _join_paths(self, paths, max_dist):
-        paths = [list(p) for p in paths]
-        while True:
-            merged = False
-            i = 0
-            while i < len(paths):
-                j = i + 1
-                while j < len(paths):
-                    p1, p2 = paths[i], paths[j]
-                    endpoints1 = [np.array(p1[0]), np.array(p1[-1])]
-                    endpoints2 = [np.array(p2[0]), np.array(p2[-1])]
-                    
-                    min_dist = float('inf')
-                    best_case = (-1, -1)
-                    for i1 in range(2):
-                        for i2 in range(2):
-                            dist = np.linalg.norm(endpoints1[i1] - endpoints2[i2])
-                            if dist < min_dist:
-                                min_dist = dist
-                                best_case = (i1, i2)
-
-                    if min_dist < max_dist:
-                        if best_case == (1, 0): paths[i].extend(p2) # end1 -> start2
-                        elif best_case == (0, 0): p1.reverse(); paths[i] = p1 + p2 # start1 -> start2
-                        elif best_case == (1, 1): p2.reverse(); paths[i].extend(p2) # end1 -> end2
-                        elif best_case == (0, 1): p1.reverse(); p2.reverse(); paths[i] = p2 + p1 # start1 -> end2
-                        
-                        paths.pop(j)
-                        merged = True; break
-                    else: j += 1
-                if merged: break
-                i += 1
-            if not merged: break
-        return paths
-
-    def _get_neighbors(self, p, skeleton):
-        r, c = p
-        neighbors = []
-        for dr in [-1,0,1]:
-            for dc in [-1,0,1]:
-                if dr==0 and dc==0: continue
-                nr, nc = r+dr, c+dc
-                if 0 <= nr < skeleton.shape[0] and 0 <= nc < skeleton.shape[1] and skeleton[nr,nc]:
-                    neighbors.append((nr,nc))
-        return neighbors
-
-    def _remove_edge(self, graph, n1, n2):
-        if n1 in graph and n2 in graph.get(n1, []): graph[n1].remove(n2)
-        if n2 in graph and n1 in graph.get(n2, []): graph[n2].remove(n1)
-        if n1 in graph and not graph[n1]: del graph[n1]
-        if n2 in graph and not graph[n2]: del graph[n2]
-    
-    def _convert_svgpath_to_points(self, path_obj, step=1.0):
-        length = path_obj.length()
-        if length == 0: return []
-        points = []
-        num_steps = max(2, int(length / step))
-        for i in range(num_steps + 1):
-            p = path_obj.point(i/num_steps)
-            points.append((p.real, p.imag))
-        return points
-        
-    def _create_svg_from_paths(self, svg_path, paths, w_px, h_px, dpi, stroke_w_mm, color):
-        mm_per_px = 25.4 / dpi
-        w_mm, h_mm = w_px * mm_per_px, h_px * mm_per_px
-        scale_preset_str = self.scale_preset_var.get()
-        if scale_preset_str != "Cap" and self.scale_preset_values[scale_preset_str]:
-            dim, val = self.scale_preset_values[scale_preset_str]
-            if dim == "width" and w_mm > 0: ratio = val / w_mm; w_mm, h_mm = val, h_mm * ratio
-            elif dim == "height" and h_mm > 0: ratio = val / h_mm; w_mm, h_mm = w_mm * ratio, val
-        svg = f'<svg width="{w_mm:.3f}mm" height="{h_mm:.3f}mm" viewBox="0 0 {w_px} {h_px}" xmlns="http://www.w3.org/2000/svg">'
-        for path in paths:
-            points = " ".join([f"{x:.3f},{y:.3f}" for x,y in path])
-            svg += f'<polyline points="{points}" style="fill:none;stroke:{color};stroke-width:{stroke_w_mm:.3f}"/>'
-        svg += '</svg>'
-        with open(svg_path, 'w', encoding='utf-8') as f: f.write(svg)
-
-    def _ramer_douglas_peucker(self, points, epsilon):
-        if len(points) < 3: return points
-        dmax, index = 0.0, 0
-        p1, p2 = np.array(points[0]), np.array(points[-1])
-        if np.allclose(p1, p2): return [p1.tolist()]
-        line_vec = p2 - p1
-        line_len = np.linalg.norm(line_vec)
-        if line_len == 0: return [p1.tolist()]
-        
-        for i in range(1, len(points) - 1):
-            d = np.linalg.norm(np.cross(line_vec, p1-np.array(points[i]))) / line_len
-            if d > dmax: index, dmax = i, d
-        if dmax > epsilon:
-            res1 = self._ramer_douglas_peucker(points[:index+1], epsilon)
-            res2 = self._ramer_douglas_peucker(points[index:], epsilon)
-            return res1[:-1] + res2
-        else: return [points[0], points[-1]]
-
-    def _export_dxf_from_svg_paths(self, dxf_path, paths, w_px, h_px, dpi, layer, color):
-        try:
-            doc = ezdxf.new('R2010'); msp = doc.modelspace()
-            doc.layers.new(layer, dxfattribs={'color': color})
-            mm_per_px = 25.4 / dpi
-            for path in paths:
-                dxf_points = [(p[0] * mm_per_px, (h_px - p[1]) * mm_per_px) for p in path]
-                if len(dxf_points) > 1: msp.add_lwpolyline(dxf_points, dxfattribs={'layer': layer})
-            doc.saveas(dxf_path)
-        except Exception as e: self.status_bar.config(text=f"Error exportant DXF: {e}")
-
-    def _export_csv_from_paths(self, csv_path, paths, w_px, h_px, dpi, stitch_len_mm):
-        try:
-            with open(csv_path, 'w', newline='') as f:
-                writer = csv.writer(f); writer.writerow(['X_mm', 'Y_mm'])
-                mm_per_px = 25.4 / dpi
-                for path in paths:
-                    for x, y in path: writer.writerow([f"{x * mm_per_px:.3f}", f"{(h_px - y) * mm_per_px:.3f}"])
-        except Exception as e: self.status_bar.config(text=f"Error exportant CSV: {e}")
-
-    def _finish_batch_export(self, count, total, out_dir, errors):
+            traceback.print_exc()
+            if stats is not None: stats["error"] = f"{type(e).__name__}: {e}"
+            return False, []
+
+    def _finish_batch_export(self, results, out_dir, skipped=0):
+        self.batch_runner = None
         self.export_button.config(state=tk.NORMAL)
-        msg = f"Lot completat: {count}/{total} OK."
+        self.cancel_button.config(state=tk.DISABLED)
+        ok = [r for r in results if r.status == "ok"]
+        errors = [os.path.splitext(os.path.basename(r.image))[0] for r in results if r.status == "error"]
+        cancelled = sum(1 for r in results if r.status == "cancelled")
+        msg = f"Lot completat: {len(ok)}/{len(results)} OK."
+        cached = sum(1 for r in ok if r.cached)
+        if cached: msg += f" Reutilitzats: {cached}."
+        if cancelled: msg += f" Cancel·lats: {cancelled}."
+        if skipped: msg += f" Omeses (marcades): {skipped}."
         if errors: msg += f" Errors en: {', '.join(errors)}"
+        msg += f" Informe a {batch.MANIFEST_JSON}."
+        if self.batch_trace_var.get(): msg += f" Traça a {batch.TRACE_JSON}."
         self.status_bar.config(text=msg)
         try:
             if sys.platform == "win32": os.startfile(out_dir)
@@ -516,43 +586,229 @@ class Sketch2SVGApp:
         if not (hasattr(self, 'image_files') and self.image_files):
             self.status_bar.config(text="Error: No hi ha imatges per exportar.")
             return
+        image_files = [f for f in self.image_files if f not in self.flagged_images]
+        if not image_files:
+            self.status_bar.config(text="Error: Totes les imatges estan marcades al full de contactes.")
+            return
         output_dir = os.path.join(self.folder_path_label.cget("text"), "output_vector")
         os.makedirs(output_dir, exist_ok=True)
         self.export_button.config(state=tk.DISABLED)
-        threading.Thread(target=self._export_batch_thread, args=(output_dir,), daemon=True).start()
-
-    def _export_batch_thread(self, output_dir):
-        results, errors = [], []
-        for i, img_path in enumerate(self.image_files):
-            base_name = os.path.splitext(os.path.basename(img_path))[0]
-            self.master.after(0, lambda name=base_name, num=i+1, total=len(self.image_files): self.status_bar.config(text=f"Processant {num}/{total}: {name}"))
-            
-            processed_img = self._process_image_for_preview(img_path)
-            if processed_img is None:
-                errors.append(base_name); continue
-
-            mode = self.mode_var.get()
-            svg_path = os.path.join(output_dir, f"{base_name}__{mode}.svg")
-            
-            vectorizer = self._vectorize_outline_potrace if mode == 'outline' else self._vectorize_centerline
-            success, paths = vectorizer(processed_img, svg_path)
-            
-            if success:
-                preset = self.preset_profile_var.get()
-                h, w = processed_img.shape
-                dpi = self.dpi_var.get()
-                if "Làser" in preset and paths:
-                    layer, color = ("CUT", 1) if "Tall" in preset else ("SCORE", 5)
-                    dxf_path = os.path.join(output_dir, f"{base_name}__{mode}.dxf")
-                    self._export_dxf_from_svg_paths(dxf_path, paths, w, h, dpi, layer, color)
-                elif "Brodat" in preset and paths:
-                    csv_path = os.path.join(output_dir, f"{base_name}__{mode}.csv")
-                    self._export_csv_from_paths(csv_path, paths, w, h, dpi, self.stitch_length_mm_var.get())
-                results.append(base_name)
-            else:
-                errors.append(base_name)
-        
-        self.master.after(0, self._finish_batch_export, len(results), len(self.image_files), output_dir, errors)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.batch_progress.config(maximum=len(image_files), value=0)
+        self.batch_runner = batch.BatchRunner(self._get_params(), output_dir, workers=self._batch_workers(), progress=self._on_batch_progress, combined_dxf=self.combined_dxf_var.get(), cache=self._result_cache(), trace=self.batch_trace_var.get())
+        threading.Thread(target=self._export_batch_thread, args=(self.batch_runner, output_dir, image_files, len(self.image_files) - len(image_files)), daemon=True).start()
+
+    def _batch_workers(self):
+        try: return max(0, self.batch_workers_var.get())
+        except tk.TclError: return 0
+
+    def _result_cache(self):
+        if not self.result_cache_var.get(): return None
+        try: return result_cache.ResultCache(max_bytes=max(0, self.result_cache_mb_var.get()) << 20)
+        except tk.TclError: return result_cache.ResultCache()
+
+    def cancel_batch(self):
+        if self.batch_runner is not None:
+            self.batch_runner.cancel()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_bar.config(text="Cancel·lant el lot...")
+
+    def _on_batch_progress(self, done, total, result):
+        name = os.path.basename(result.image)
+        self.master.after(0, lambda: (self.batch_progress.config(value=done), self.status_bar.config(text=f"Processat {done}/{total}: {name}")))
+
+    def _export_batch_thread(self, runner, output_dir, image_files, skipped=0):
+        results = runner.run(image_files)
+        self.master.after(0, self._finish_batch_export, results, output_dir, skipped)
+
+    def toggle_watch(self):
+        """Engega o atura la vigilància de la carpeta segons la casella (i la reinicia amb els paràmetres actuals)."""
+        previous, self.watch_service = self.watch_service, None
+        folder = self.folder_path_label.cget("text")
+        if self.watch_folder_var.get() and not os.path.isdir(folder):
+            self.watch_folder_var.set(False)
+            self.status_bar.config(text="Error: Cal triar una carpeta per vigilar.")
+        if self.watch_folder_var.get():
+            watcher = watch.FolderWatcher(folder, include_existing=False)
+            self.watch_service = watch.WatchService(folder, self._get_params(), os.path.join(folder, "output_vector"), workers=self._batch_workers(), cache=self._result_cache(), on_result=self._on_watch_result, watcher=watcher)
+            self.status_bar.config(text=f"Vigilant {folder} ({watcher.backend})...")
+        if previous is None and self.watch_service is None: return
+        self._watch_thread = threading.Thread(target=self._restart_watch, args=(self._watch_thread, previous, self.watch_service), daemon=True)
+        self._watch_thread.start()
+
+    def _restart_watch(self, before, previous, service):
+        # Fora del fil de Tk: stop() espera els fils del servei anterior, que
+        # ha d'haver escrit el manifest abans que el nou comenci.
+        if before is not None: before.join()
+        if previous is not None: previous.stop()
+        if service is not None: service.start()
+
+    def _on_watch_result(self, result):
+        self.master.after(0, self._show_watch_result, result)
+
+    def _show_watch_result(self, result):
+        folder = self.folder_path_label.cget("text")
+        if self.watch_service is None or os.path.dirname(result.image) != folder: return
+        current = self.image_files[self.current_image_index] if getattr(self, 'image_files', None) else None
+        self.image_files = engine.list_images(folder)
+        if current in self.image_files: self.current_image_index = self.image_files.index(current)
+        elif self.image_files:
+            self.current_image_index = 0
+            self.preview_image()
+        name = os.path.basename(result.image)
+        if result.status == "ok": self.status_bar.config(text=f"Vigilant: {name} convertida ({len(self.watch_service.results)} en total).")
+        else: self.status_bar.config(text=f"Vigilant: error en {name}: {result.error}")
+
+class ContactSheetWindow:
+    """Finestra amb les miniatures de totes les imatges de la carpeta.
+
+    Les miniatures es calculen en un fil amb ``contact_sheet.ContactSheet`` i
+    es dibuixen a mesura que s'acaben. Un clic obre la imatge a la
+    previsualització; el clic dret la marca perquè no entri al lot.
+    """
+    COLUMNS = 4
+    FLAG_COLOR = "#C0392B"
+
+    def __init__(self, app):
+        self.app = app
+        self.sheet = contact_sheet.ContactSheet(workers=app._batch_workers() or None, pipeline=app.pipeline) # Comparteix la memòria cau de la previsualització
+        self.window = tk.Toplevel(app.master)
+        self.window.title("Full de contactes")
+        self.window.geometry("1080x720")
+        self.window.configure(bg=COLORS["Nexe_50"])
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.status = ttk.Label(self.window, text="", relief=tk.SUNKEN, anchor=tk.W, background=COLORS["Nexe_100"])
+        self.status.pack(side="bottom", fill="x")
+        self.canvas = tk.Canvas(self.window, bg=COLORS["Nexe_50"], highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self.window, orient="vertical", command=self.canvas.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", expand=True, fill="both")
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.grid = ttk.Frame(self.canvas)
+        self.canvas.create_window((0, 0), window=self.grid, anchor="nw")
+        self.grid.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        self.blank = ImageTk.PhotoImage(Image.new("L", self.sheet.size, 235))
+        self.cells, self.photos, self.paths, self.params = [], {}, [], None
+        self.generation, self.done, self.started, self.elapsed = 0, 0, 0.0, None
+
+    def refresh(self, paths, params):
+        """Torna a fer les miniatures si han canviat les imatges o els paràmetres de preprocés."""
+        if paths == self.paths and self.params is not None and contact_sheet.preprocess_key(params) == contact_sheet.preprocess_key(self.params): return
+        self.generation += 1
+        generation = self.generation
+        rebuild = paths != self.paths
+        self.paths, self.params, self.done, self.started, self.elapsed = list(paths), params, 0, time.perf_counter(), None
+        if rebuild: self._build_cells()
+        self._update_status()
+        on_thumbnail = lambda i, thumb: self.app.master.after(0, self._show, generation, i, thumb)
+        should_stop = lambda: generation != self.generation
+        threading.Thread(target=self.sheet.generate, args=(self.paths, params, on_thumbnail, should_stop), daemon=True).start()
+
+    def _build_cells(self):
+        for cell, _, _ in self.cells: cell.destroy()
+        self.cells, self.photos = [], {}
+        w, h = self.sheet.size
+        for i, path in enumerate(self.paths):
+            cell = tk.Frame(self.grid, bd=0, padx=3, pady=3)
+            cell.grid(row=i // self.COLUMNS, column=i % self.COLUMNS, padx=4, pady=4)
+            image = tk.Label(cell, image=self.blank, width=w, height=h, bg=COLORS["Nexe_100"])
+            image.pack()
+            caption = tk.Label(cell, text=os.path.basename(path), font=FONTS["UI_Small"], bg=COLORS["Nexe_50"], fg=COLORS["Nexe_800"], wraplength=w)
+            caption.pack(fill="x")
+            for widget in (cell, image, caption):
+                widget.bind("<Button-1>", lambda e, i=i: self.app.show_image(i))
+                widget.bind("<Button-3>", lambda e, i=i: self.toggle_flag(i))
+            self.cells.append((cell, image, caption))
+            self._paint_flag(i)
+
+    def _show(self, generation, i, thumb):
+        if generation != self.generation: return
+        _, image, caption = self.cells[i]
+        name = os.path.basename(thumb.path)
+        if thumb.image is None:
+            image.configure(image=self.blank)
+            caption.configure(text=f"{name}\nError: {thumb.error}")
+        else:
+            self.photos[i] = ImageTk.PhotoImage(Image.fromarray(thumb.image))
+            image.configure(image=self.photos[i])
+            caption.configure(text=f"{name}\nBlanc: {thumb.foreground:.0%}")
+        self.done += 1
+        if self.done == len(self.paths): self.elapsed = time.perf_counter() - self.started
+        self._update_status()
+
+    def toggle_flag(self, i):
+        path = self.paths[i]
+        if path in self.app.flagged_images: self.app.flagged_images.discard(path)
+        else: self.app.flagged_images.add(path)
+        self._paint_flag(i)
+        self._update_status()
+
+    def _paint_flag(self, i):
+        cell = self.cells[i][0]
+        cell.configure(bg=self.FLAG_COLOR if self.paths[i] in self.app.flagged_images else COLORS["Nexe_50"])
+
+    def _update_status(self):
+        text = f"{self.done}/{len(self.paths)} miniatures"
+        if self.elapsed is not None: text += f" en {self.elapsed:.1f} s"
+        flagged = sum(1 for p in self.paths if p in self.app.flagged_images)
+        text += f" · {flagged} marcades (no s'exportaran)" if flagged else " · Clic: obre la imatge · Clic dret: marca-la perquè no s'exporti"
+        self.status.config(text=text)
+
+    def close(self):
+        self.generation += 1 # Atura les miniatures pendents
+        self.window.destroy()
+        self.app.contact_sheet_window = None
+
+
+class AutoTuneWindow:
+    """Llista dels millors candidats de l'auto-ajust. En triar-ne un, s'aplica com a preset temporal."""
+    COLUMNS = (("block_size", "Bloc", 60), ("C", "C", 50), ("opening_radius", "Obertura", 70),
+               ("score", "Puntuació", 80), ("specks", "Taques", 70), ("endpoints", "Extrems", 70), ("fragments", "Trossos", 70),
+               ("false_ink", "Traç clar", 80), ("missed_ink", "Traç perdut", 90))
+
+    def __init__(self, app, candidates):
+        self.app, self.candidates = app, candidates
+        # Configuració d'abans de provar cap candidat, per poder-hi tornar
+        self.before = {key: getattr(app, key).get() for key in dir(app) if key.endswith("_var")}
+        preset = self.before["preset_profile_var"]
+        self.temporary_before = dict(config_manager.PRESETS[preset]) if preset != config_manager.base_preset_name(preset) and preset in config_manager.PRESETS else None
+        self.window = tk.Toplevel(app.master)
+        self.window.title("Auto-ajust")
+        self.window.configure(bg=COLORS["Nexe_50"])
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        ttk.Label(self.window, text="Puntuació més baixa, millor: menys taques, traços trencats i trossos per cada 100 píxels de traç, i més fidelitat a l'original.", wraplength=700, font=FONTS["UI_Small"]).pack(fill="x", padx=8, pady=(8, 4))
+        self.tree = ttk.Treeview(self.window, columns=[c[0] for c in self.COLUMNS], show="headings", height=len(candidates), selectmode="browse")
+        for key, title, width in self.COLUMNS:
+            self.tree.heading(key, text=title)
+            self.tree.column(key, width=width, anchor="e")
+        for i, c in enumerate(candidates):
+            p, m = c.params, c.metrics
+            self.tree.insert("", "end", iid=str(i), values=(p.block_size, p.C, p.opening_radius, f"{c.score:.2f}", m["specks"], m["endpoints"], m["fragments"], f"{m['false_ink']:.0%}", f"{m['missed_ink']:.0%}"))
+        self.tree.pack(fill="both", expand=True, padx=8)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        buttons = ttk.Frame(self.window)
+        buttons.pack(fill="x", padx=8, pady=8)
+        ttk.Button(buttons, text="Torna a la configuració anterior", command=self.restore).pack(side="left")
+        ttk.Button(buttons, text="Tanca", command=self.close).pack(side="right")
+
+    def _on_select(self, event=None):
+        selection = self.tree.selection()
+        if selection: self.app.apply_autotune_candidate(self.candidates[int(selection[0])])
+
+    def restore(self):
+        self.tree.selection_remove(self.tree.selection())
+        for key, value in self.before.items(): getattr(self.app, key).set(value)
+        # Fora els presets temporals dels candidats, i el menú sense ells
+        preset = self.before["preset_profile_var"]
+        config_manager.remove_temporary_presets()
+        if self.temporary_before is not None: config_manager.add_temporary_preset(preset, self.temporary_before)
+        self.app.preset_menu.set_menu(preset, *config_manager.get_preset_names())
+        self.app.update_parameters_visibility()
+
+    def close(self):
+        self.window.destroy()
+        self.app.autotune_window = None
+
 
 class ToolTip:
     def __init__(self, widget, text):
@@ -0,0 +1,112 @@
+"""Dibuix de la previsualització (imatge de treball i camins vectorials) en una sola imatge.
+
+Els camins es preparen una vegada (``VectorOverlay``): tots els punts en un
+sol array, amb l'índex del camí de cada punt i el requadre de cada camí.
+Per dibuixar-los a una escala donada es transformen tots alhora, es
+descarten els camins que queden fora de la vista i els punts consecutius
+que cauen al mateix píxel de pantalla (nivell de detall), i es
+rasteritzen amb una sola crida a ``cv2.polylines``. El zoom i el
+desplaçament (``View``) només tornen a fer aquest dibuix: els camins no es
+tornen a calcular.
+"""
+import dataclasses
+
+import cv2
+import numpy as np
+
+MARGIN = 20 # Píxels de marge al voltant de la imatge ajustada a la finestra
+MAX_ZOOM = 64.0
+BACKGROUND = 224 # Gris del voltant de la imatge (com COLORS["Nexe_100"] de main.py)
+LINE_COLOR = (0, 255, 0)
+
+
+@dataclasses.dataclass(frozen=True)
+class View:
+    """Zoom i centre de la vista, independents de la resolució de la imatge.
+
+    ``zoom`` és relatiu a la imatge ajustada a la finestra; ``center`` és
+    el punt de la imatge que queda al centre, en fraccions de l'amplada i
+    l'alçada. Així la vista es conserva en passar de la previsualització
+    reduïda a la de resolució completa.
+    """
+    zoom: float = 1.0
+    center: tuple = (0.5, 0.5)
+
+    def transform(self, img_shape, canvas_size):
+        """``(escala, ox, oy)``: un punt ``(x, y)`` de la imatge va a ``(x * escala + ox, y * escala + oy)``."""
+        h, w = img_shape[:2]
+        cw, ch = canvas_size
+        scale = max(1e-6, min((cw - MARGIN) / w, (ch - MARGIN) / h)) * self.zoom
+        return scale, cw / 2 - self.center[0] * w * scale, ch / 2 - self.center[1] * h * scale
+
+    def zoomed(self, factor, sx, sy, img_shape, canvas_size):
+        """Vista amb el zoom multiplicat per ``factor``, amb el punt de pantalla ``(sx, sy)`` fix."""
+        zoom = min(MAX_ZOOM, max(1.0, self.zoom * factor))
+        scale, ox, oy = self.transform(img_shape, canvas_size)
+        x, y = (sx - ox) / scale, (sy - oy) / scale # Punt de la imatge sota el cursor
+        new_scale = scale * zoom / self.zoom
+        h, w = img_shape[:2]
+        cw, ch = canvas_size
+        return View(zoom, ((x - (sx - cw / 2) / new_scale) / w, (y - (sy - ch / 2) / new_scale) / h)).clamped()
+
+    def panned(self, dx, dy, img_shape, canvas_size):
+        """Vista desplaçada ``(dx, dy)`` píxels de pantalla."""
+        scale = self.transform(img_shape, canvas_size)[0]
+        h, w = img_shape[:2]
+        return View(self.zoom, (self.center[0] - dx / scale / w, self.center[1] - dy / scale / h)).clamped()
+
+    def clamped(self):
+        """El centre sempre dins de la imatge; amb zoom 1, la imatge centrada."""
+        if self.zoom <= 1.0: return View()
+        return View(self.zoom, tuple(min(1.0, max(0.0, c)) for c in self.center))
+
+
+class VectorOverlay:
+    """Camins preparats per dibuixar-los de cop a qualsevol escala."""
+
+    def __init__(self, paths):
+        paths = [np.asarray(p, np.float32).reshape(-1, 2) for p in paths if len(p) > 1]
+        self.count = len(paths)
+        self.points = np.concatenate(paths) if paths else np.empty((0, 2), np.float32)
+        lengths = [len(p) for p in paths]
+        self.ids = np.repeat(np.arange(self.count), lengths)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.intp)
+        self.boxes = np.hstack((np.minimum.reduceat(self.points, starts), np.maximum.reduceat(self.points, starts))) if paths else np.empty((0, 4), np.float32)
+
+    def draw(self, canvas, scale, ox, oy, color=LINE_COLOR, thickness=1):
+        """Dibuixa els camins a ``canvas`` (RGB). Retorna el nombre de punts dibuixats."""
+        if not self.count: return 0
+        ch, cw = canvas.shape[:2]
+        boxes = self.boxes * scale + np.float32((ox, oy, ox, oy))
+        visible = (boxes[:, 2] >= -thickness) & (boxes[:, 0] <= cw + thickness) & (boxes[:, 3] >= -thickness) & (boxes[:, 1] <= ch + thickness)
+        keep = visible[self.ids]
+        pts = np.rint(self.points[keep] * scale + np.float32((ox, oy))).astype(np.int32)
+        ids = self.ids[keep]
+        if not len(pts): return 0
+        # Nivell de detall: fora els punts que cauen al mateix píxel que l'anterior del mateix camí.
+        new = np.ones(len(pts), bool)
+        new[1:] = (pts[1:] != pts[:-1]).any(axis=1) | (ids[1:] != ids[:-1])
+        pts, ids = pts[new], ids[new]
+        polys = [p for p in np.split(pts, np.flatnonzero(ids[1:] != ids[:-1]) + 1) if len(p) > 1]
+        cv2.polylines(canvas, polys, False, color, thickness, cv2.LINE_AA)
+        return len(pts)
+
+
+def render(img, overlay, view, canvas_size, background=BACKGROUND):
+    """Imatge RGB de ``canvas_size`` amb ``img`` (grisos) i ``overlay`` segons ``view``.
+
+    Retorna ``(imatge, punts)``, on ``punts`` és el nombre de punts
+    vectorials dibuixats després del nivell de detall.
+    """
+    cw, ch = canvas_size
+    scale, ox, oy = view.transform(img.shape, canvas_size)
+    src, m = img, np.float32([[scale, 0, ox], [0, scale, oy]])
+    if scale < 1: # INTER_AREA no perd els traços prims en reduir; llavors warpAffine només desplaça
+        h, w = img.shape
+        src = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+        m = np.float32([[1, 0, ox], [0, 1, oy]])
+    gray = np.full((ch, cw), background, np.uint8)
+    cv2.warpAffine(src, m, (cw, ch), dst=gray, flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_TRANSPARENT)
+    canvas = cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+    points = overlay.draw(canvas, scale, ox, oy) if overlay is not None else 0
+    return canvas, points
@@ -0,0 +1,221 @@
+"""Operacions sobre conjunts de polilínies: índex espacial, unió d'extrems i
+ordenació per reduir el recorregut en buit."""
+import collections
+import heapq
+import math
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Extrems veïns que es proven a cada pas del 2-opt.
+NEIGHBOURS = 16
+
+
+class SpatialGrid:
+    """Índex espacial de punts en una graella uniforme (hash de cel·les).
+
+    Cada element es guarda amb les seves coordenades. Les consultes d'un radi
+    ``r`` no més gran que la mida de cel·la només han de mirar 3x3 cel·les.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self._cells = collections.defaultdict(dict)
+
+    def _key(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, item, x, y):
+        self._cells[self._key(x, y)][item] = (x, y)
+
+    def remove(self, item, x, y):
+        key = self._key(x, y)
+        cell = self._cells.get(key)
+        if cell is not None:
+            cell.pop(item, None)
+            if not cell: del self._cells[key]
+
+    def query(self, x, y, radius):
+        """Elements dins del quadrat de costat ``2 * radius`` centrat a (x, y)."""
+        x0, y0 = self._key(x - radius, y - radius)
+        x1, y1 = self._key(x + radius, y + radius)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self._cells.get((cx, cy))
+                if cell: yield from cell.items()
+
+    def __len__(self):
+        return sum(len(c) for c in self._cells.values())
+
+
+def _closest_ends(p1, p2):
+    """Distància mínima entre extrems i el cas (extrem de p1, extrem de p2).
+
+    Els casos es comproven en l'ordre (inici, inici), (inici, final),
+    (final, inici), (final, final) i, en cas d'empat, guanya el primer.
+    """
+    min_dist, best_case = float('inf'), (-1, -1)
+    for i1, a in enumerate((p1[0], p1[-1])):
+        for i2, b in enumerate((p2[0], p2[-1])):
+            dx, dy = a[0] - b[0], a[1] - b[1]
+            dist = math.sqrt(dx * dx + dy * dy)
+            if dist < min_dist: min_dist, best_case = dist, (i1, i2)
+    return min_dist, best_case
+
+
+def _merge(p1, p2, case):
+    if case == (1, 0): return p1 + p2 # end1 -> start2
+    if case == (0, 0): return p1[::-1] + p2 # start1 -> start2
+    if case == (1, 1): return p1 + p2[::-1] # end1 -> end2
+    return p1[::-1] + p2[::-1] # start1 -> end2
+
+
+def join_paths(paths, max_dist):
+    """Uneix camins amb extrems a menys de ``max_dist`` píxels.
+
+    La unió és voraç: a cada pas s'uneix la primera parella (i, j), en
+    l'ordre de la llista, amb extrems prou propers; el resultat ocupa la
+    posició de ``i`` i ``j`` desapareix. Els extrems es guarden en un
+    ``SpatialGrid`` que s'actualitza després de cada unió, de manera que
+    només es comparen camins veïns.
+    """
+    paths = [list(p) for p in paths]
+    if max_dist <= 0 or len(paths) < 2: return paths
+    grid = SpatialGrid(max_dist)
+    heap = []
+
+    def index_ends(i, insert=True):
+        for end, (x, y) in enumerate((paths[i][0], paths[i][-1])):
+            if insert: grid.insert((i, end), x, y)
+            else: grid.remove((i, end), x, y)
+
+    def push_neighbours(i):
+        seen = set()
+        for x, y in (paths[i][0], paths[i][-1]):
+            for (j, _), _ in grid.query(x, y, max_dist):
+                if j == i or j in seen: continue
+                seen.add(j)
+                if _closest_ends(paths[i], paths[j])[0] < max_dist: heapq.heappush(heap, (min(i, j), max(i, j)))
+
+    for i in range(len(paths)): index_ends(i)
+    for i in range(len(paths)): push_neighbours(i)
+
+    while heap:
+        i, j = heapq.heappop(heap)
+        if paths[i] is None or paths[j] is None: continue
+        dist, case = _closest_ends(paths[i], paths[j])
+        if dist >= max_dist: continue
+        index_ends(i, insert=False); index_ends(j, insert=False)
+        paths[i], paths[j] = _merge(paths[i], paths[j], case), None
+        index_ends(i)
+        push_neighbours(i)
+    return [p for p in paths if p is not None]
+
+
+def travel_length(paths, start=(0.0, 0.0)):
+    """Recorregut en buit: de ``start`` al primer camí i del final de cada camí a l'inici del següent."""
+    x, y = start
+    total = 0.0
+    for p in paths:
+        total += math.hypot(p[0][0] - x, p[0][1] - y)
+        x, y = p[-1]
+    return total
+
+
+def order_paths(paths, start=(0.0, 0.0), passes=3):
+    """Ordena i orienta els camins per reduir el recorregut en buit.
+
+    Primer es construeix un recorregut voraç pel veí més proper (cada camí
+    s'entra per l'extrem més proper, que en fixa el sentit) i després es
+    fan fins a ``passes`` passades de 2-opt. Invertir un tram de l'ordre
+    també inverteix el sentit dels camins del tram; només es proven els
+    canvis que creen una connexió amb un dels ``NEIGHBOURS`` extrems més
+    propers. Els extrems s'indexen en un arbre k-d, que s'adapta a la
+    densitat (dibuixos amb zones molt plenes, extrems repetits). Retorna una
+    llista nova; els camins recorreguts al revés s'inverteixen.
+    """
+    n = len(paths)
+    if n < 2: return [list(p) for p in paths]
+    ends = np.array([(p[0], p[-1]) for p in paths], dtype=float)
+    flat = ends.reshape(-1, 2) # El punt 2 * i + k és l'extrem k del camí i
+    ends_l = ends.tolist()
+    full_tree = cKDTree(flat)
+
+    # Veí més proper: l'arbre conté cada posició diferent un sol cop, amb la
+    # llista dels extrems que hi ha. Es demanen els k punts més propers i es
+    # descarten els ja buidats, multiplicant k si cal; quan més de la meitat
+    # dels punts de l'arbre estan buits, es reconstrueix amb els que queden.
+    points, which = np.unique(flat, axis=0, return_inverse=True)
+    at = [[] for _ in points]
+    for e, u in reversed(list(enumerate(which.ravel().tolist()))): at[u].append(e) # pop() dona el més baix
+    alive, left = np.ones(len(points), bool), len(points)
+    ids, tree = np.arange(len(points)), cKDTree(points)
+    visited = [False] * n
+    order, flip = [], []
+    x, y = start
+    while len(order) < n:
+        if 2 * left < len(ids): ids = np.flatnonzero(alive); tree = cKDTree(points[ids])
+        k, e = NEIGHBOURS, None
+        while e is None:
+            found = ids[np.atleast_1d(tree.query((x, y), k=min(k, len(ids)))[1])]
+            for u in found[alive[found]].tolist():
+                while at[u] and visited[at[u][-1] // 2]: at[u].pop()
+                if at[u]: e = at[u].pop(); break
+                alive[u] = False; left -= 1
+            k *= 4
+        i, k = divmod(e, 2)
+        visited[i] = True
+        order.append(i); flip.append(k)
+        x, y = ends_l[i][1 - k]
+
+    # 2-opt. La posició 0 és el punt de partida; S i E són l'entrada i la
+    # sortida de cada posició.
+    order, flip = [-1] + order, [0] + flip
+    S = [tuple(start)] + [tuple(ends_l[i][k]) for i, k in zip(order[1:], flip[1:])]
+    E = [tuple(start)] + [tuple(ends_l[i][1 - k]) for i, k in zip(order[1:], flip[1:])]
+    pos = [0] * n
+    for m, i in enumerate(order[1:], 1): pos[i] = m
+    near_d, near = (a.tolist() for a in full_tree.query(flat, k=min(NEIGHBOURS + 1, 2 * n)))
+    start_near = list(zip(*(a.tolist() for a in full_tree.query(start, k=min(NEIGHBOURS, 2 * n)))))
+    dist = math.dist
+
+    def neighbours(m, out):
+        # Extrems propers a la sortida (out) o a l'entrada de la posició m, per distància.
+        if m == 0: return start_near
+        e = 2 * order[m] + (1 - flip[m] if out else flip[m])
+        return zip(near_d[e], near[e])
+
+    def gain(i, j):
+        # Guany d'invertir les posicions i..j.
+        old, new = dist(E[i - 1], S[i]), dist(E[i - 1], E[j])
+        if j < n: old, new = old + dist(E[j], S[j + 1]), new + dist(S[i], S[j + 1])
+        return old - new
+
+    def reverse(i, j):
+        S[i:j + 1], E[i:j + 1] = E[i:j + 1][::-1], S[i:j + 1][::-1]
+        order[i:j + 1] = order[i:j + 1][::-1]
+        flip[i:j + 1] = [1 - f for f in flip[j:i - 1:-1]]
+        for m in range(i, j + 1): pos[order[m]] = m
+
+    for _ in range(passes):
+        improved = False
+        for i in range(1, n + 1):
+            edge = dist(E[i - 1], S[i])
+            if edge == 0: continue
+            candidates = set()
+            for d, q in neighbours(i - 1, True):
+                if d >= edge: break
+                p, k = divmod(q, 2); j = pos[p]
+                if j >= i and k != flip[j]: candidates.add(j) # Connexió E[i-1] -> E[j]
+            for d, q in neighbours(i, False):
+                if d >= edge: break
+                p, k = divmod(q, 2); j = pos[p] - 1
+                if j >= i and k == flip[j + 1]: candidates.add(j) # Connexió S[i] -> S[j+1]
+            best_gain, best_j = 1e-9, None
+            for j in candidates:
+                g = gain(i, j)
+                if g > best_gain: best_gain, best_j = g, j
+            if best_j is not None:
+                reverse(i, best_j); improved = True
+        if not improved: break
+    return [list(paths[i])[::-1] if k else list(paths[i]) for i, k in zip(order[1:], flip[1:])]
@@ -0,0 +1,113 @@
+"""Integració amb potrace sense fitxers temporals.
+
+El mapa de bits s'envia a l'executable ``potrace`` per l'entrada estàndard en
+format PBM i l'SVG es llegeix de la sortida estàndard. Si hi ha instal·lat un
+mòdul ``potrace`` (pypotrace o potracer), també es pot traçar dins del mateix
+procés, sense llançar cap subprocés.
+"""
+import inspect
+import re
+import shutil
+import subprocess
+
+import numpy as np
+
+try:
+    import potrace as _binding
+    if not hasattr(_binding, "Bitmap"): _binding = None
+except ImportError:
+    _binding = None
+
+POTRACE_TIMEOUT_S = 120
+BACKENDS = ("auto", "cli", "binding")
+
+_FILL_STYLE = 'fill="#000000" stroke="none"'
+_CUT_STYLE = 'fill="none" stroke="#000000" stroke-width="0.01mm"'
+
+
+class PotraceError(Exception):
+    """No s'ha pogut executar potrace."""
+
+
+def encode_pbm(mask):
+    """Codifica una màscara booleana (cert = negre) com a PBM binari (P4)."""
+    h, w = mask.shape
+    return b"P4\n%d %d\n" % (w, h) + np.packbits(mask, axis=1).tobytes()
+
+
+def resolve_backend(backend="auto"):
+    """Tria el motor: l'executable si és al PATH i, si no, el mòdul de Python."""
+    if backend == "auto":
+        if shutil.which("potrace"): return "cli"
+        if _binding is not None: return "binding"
+        raise PotraceError("No s'ha trobat potrace: instal·la l'executable o el mòdul de Python.")
+    if backend == "binding" and _binding is None:
+        raise PotraceError("El mòdul de Python 'potrace' no està instal·lat.")
+    return backend
+
+
+def trace_svg(mask, turdsize=2, alphamax=1.0, opttolerance=0.2, backend="auto"):
+    """Traça els píxels certs de ``mask`` i retorna l'SVG com a text.
+
+    ``turdsize``, ``alphamax`` i ``opttolerance`` són les opcions
+    ``-t``, ``-a`` i ``-O`` de potrace; ``opttolerance`` <= 0 desactiva
+    l'optimització de corbes (``-n``).
+    """
+    if resolve_backend(backend) == "binding":
+        return _trace_binding(mask, turdsize, alphamax, opttolerance)
+    return _trace_cli(mask, turdsize, alphamax, opttolerance)
+
+
+def _trace_cli(mask, turdsize, alphamax, opttolerance):
+    command = ["potrace", "-b", "svg", "-t", str(int(turdsize)), "-a", str(alphamax)]
+    command.extend(["-O", str(opttolerance)] if opttolerance > 0 else ["-n"])
+    command.extend(["-o", "-"])
+    result = subprocess.run(command, input=encode_pbm(mask), check=True, capture_output=True, timeout=POTRACE_TIMEOUT_S)
+    return result.stdout.decode("utf-8")
+
+
+def _xy(point):
+    return (point.x, point.y) if hasattr(point, "x") else (point[0], point[1])
+
+
+def _binding_traces_dark():
+    # potracer (Python pur) segueix la convenció d'imatge i traça els píxels
+    # foscos; pypotrace traça els valors certs.
+    try:
+        return "blacklevel" in inspect.signature(_binding.Bitmap).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _trace_binding(mask, turdsize, alphamax, opttolerance):
+    data = ~mask if _binding_traces_dark() else mask
+    path = _binding.Bitmap(data).trace(turdsize=int(turdsize), alphamax=alphamax, opticurve=opttolerance > 0, opttolerance=max(opttolerance, 0.0))
+    h, w = mask.shape
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}pt" height="{h}pt" viewBox="0 0 {w} {h}">', f'<g {_FILL_STYLE}>']
+    for curve in path.curves:
+        d = ["M%.3f,%.3f" % _xy(curve.start_point)]
+        for seg in curve.segments:
+            if seg.is_corner: d.append("L%.3f,%.3f L%.3f,%.3f" % (*_xy(seg.c), *_xy(seg.end_point)))
+            else: d.append("C%.3f,%.3f %.3f,%.3f %.3f,%.3f" % (*_xy(seg.c1), *_xy(seg.c2), *_xy(seg.end_point)))
+        parts.append(f'<path d="{" ".join(d)} z"/>')
+    parts.append('</g></svg>')
+    return "\n".join(parts)
+
+
+def style_for_cutting(svg_text):
+    """Canvia l'emplenat negre de potrace per un traç fi sense emplenat."""
+    return svg_text.replace(_FILL_STYLE, _CUT_STYLE, 1)
+
+
+_TRANSFORM_RE = re.compile(r"(?:translate\(\s*([-\d.eE]+)[\s,]+([-\d.eE]+)\s*\)\s*)?scale\(\s*([-\d.eE]+)(?:[\s,]+([-\d.eE]+))?\s*\)")
+
+
+def parse_group_transform(transform):
+    """Retorna ``(tx, ty, sx, sy)`` d'un ``translate(...) scale(...)`` de potrace.
+
+    El ``translate`` és opcional i ``scale(s)`` equival a ``scale(s, s)``.
+    """
+    match = _TRANSFORM_RE.search(transform or "")
+    if not match: return (0.0, 0.0, 1.0, 1.0)
+    tx, ty, sx, sy = match.groups()
+    return (float(tx or 0), float(ty or 0), float(sx), float(sy or sx))
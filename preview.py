@@ -0,0 +1,125 @@
+"""Planificador de previsualitzacions (un sol fil i l'última petició guanya)
+i precàrrega de les imatges veïnes en segon pla."""
+import threading
+import time
+import traceback
+
+import engine
+
+
+class PreviewScheduler:
+    """Executa les previsualitzacions en un únic fil de treball.
+
+    ``submit`` substitueix qualsevol petició pendent i incrementa el número de
+    generació. El fil espera ``delay`` segons sense peticions noves abans de
+    començar (debounce) i passa a ``work(request, should_stop)`` una funció
+    que es torna certa quan la feina ha quedat obsoleta, perquè pugui
+    abandonar-la entre etapes llançant ``engine.Cancelled``. ``on_done`` només
+    es crida amb el resultat de la generació més recent, des del fil de
+    treball.
+    """
+
+    def __init__(self, work, on_done, delay=0.1):
+        self.work = work
+        self.on_done = on_done
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._pending = None
+        self._generation = 0
+        self._last_submit = 0.0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def submit(self, request):
+        """Demana una previsualització; retorna el seu número de generació."""
+        with self._cond:
+            self._generation += 1
+            self._pending = request
+            self._last_submit = time.monotonic()
+            self._cond.notify()
+            return self._generation
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._generation += 1
+            self._cond.notify()
+
+    def _next_request(self):
+        with self._cond:
+            while self._pending is None and not self._stopped: self._cond.wait()
+            while not self._stopped:
+                remaining = self._last_submit + self.delay - time.monotonic()
+                if remaining <= 0: break
+                self._cond.wait(remaining)
+            if self._stopped: return None, None
+            request, self._pending = self._pending, None
+            return request, self._generation
+
+    def _loop(self):
+        while True:
+            request, generation = self._next_request()
+            if generation is None: return
+            should_stop = lambda: generation != self._generation
+            try:
+                result = self.work(request, should_stop)
+            except engine.Cancelled:
+                continue
+            except Exception:
+                traceback.print_exc(); continue
+            if not should_stop(): self.on_done(request, result)
+
+
+def neighbour_indices(index, count, radius=2):
+    """Índexs de les imatges veïnes de ``index``, de la més propera a la més llunyana.
+
+    A igual distància va primer la següent, que és cap on se sol avançar.
+    """
+    order = []
+    for d in range(1, radius + 1):
+        order += [i for i in (index + d, index - d) if 0 <= i < count]
+    return order
+
+
+class Prefetcher:
+    """Carrega elements en un fil de segon pla, de més a menys prioritari.
+
+    ``prefetch(items)`` substitueix la llista pendent (les imatges veïnes de
+    l'actual canvien quan l'usuari avança). Els errors s'ignoren: la
+    imatge es tornarà a llegir, i l'error es mostrarà, quan es demani de debò.
+    """
+
+    def __init__(self, load):
+        self.load = load
+        self._cond = threading.Condition()
+        self._pending = []
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def prefetch(self, items):
+        with self._cond:
+            self._pending = list(items)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._pending = []
+            self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped: self._cond.wait()
+                if self._stopped: return
+                item = self._pending.pop(0)
+            try:
+                self.load(item)
+            except Exception:
+                pass
@@ -0,0 +1,166 @@
+"""Instrumentació lleugera de les etapes de conversió.
+
+``span`` mesura un bloc: temps de rellotge, memòria màxima del procés (RSS)
+durant el bloc i els comptadors que hi afegeixi el codi (píxels, camins,
+punts...). A Linux el màxim de cada etapa es mesura posant a zero
+``VmHWM`` amb ``/proc/self/clear_refs``; en altres sistemes és el màxim
+del procés fins aquell moment. La mesura és de tot el procés: un interval
+que coincideix amb intervals oberts en un altre fil no posa el màxim a zero
+(falsejaria el de l'altre) i no té ``peak_mb``.
+
+Els intervals es poden desar en format Chrome trace-event, que obren
+``chrome://tracing`` i Perfetto. ``cprofile`` desa les estadístiques de
+cProfile d'un bloc per llegir-les amb ``pstats`` o snakeviz.
+"""
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+_STATUS = "/proc/self/status"
+_CLEAR_REFS = "/proc/self/clear_refs"
+_local = threading.local()
+_can_reset = os.path.exists(_CLEAR_REFS)
+_lock = threading.Lock()
+_open = {} # Fil -> intervals oberts
+_overlaps = 0 # Intervals començats amb intervals oberts en un altre fil
+
+
+def _after_fork():
+    # El procés fill només té el fil que ha fet el fork i comença de nou.
+    global _lock
+    _lock = threading.Lock()
+    _open.clear()
+
+
+if hasattr(os, "register_at_fork"): os.register_at_fork(after_in_child=_after_fork)
+
+
+def peak_rss_mb():
+    """Memòria resident màxima del procés en MB, o ``None`` si no es pot saber."""
+    try:
+        with open(_STATUS, encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024 # macOS: bytes
+
+
+def _reset_peak():
+    global _can_reset
+    if not _can_reset: return
+    try:
+        with open(_CLEAR_REFS, "w", encoding="ascii") as f: f.write("5")
+    except OSError:
+        _can_reset = False
+
+
+@contextlib.contextmanager
+def span(name, **counts):
+    """Mesura el bloc i hi dona un diccionari on afegir comptadors.
+
+    En sortir, el diccionari té ``name``, ``ts`` (inici en µs del rellotge
+    monòton, comú a tots els processos), ``seconds``, ``pid``, ``tid`` i,
+    si es pot mesurar i cap altre fil ha tingut intervals oberts mentrestant,
+    ``peak_mb``.
+    """
+    global _overlaps
+    tid = threading.get_ident()
+    stack = _local.__dict__.setdefault("stack", [])
+    with _lock:
+        alone = not _open.keys() - {tid}
+        if alone:
+            if stack: stack[-1] = max(stack[-1], peak_rss_mb() or 0.0) # Màxim del pare fins ara
+            _reset_peak()
+        else:
+            _overlaps += 1
+        overlaps = _overlaps
+        _open[tid] = _open.get(tid, 0) + 1
+    stack.append(0.0)
+    info = {"name": name, "ts": time.perf_counter_ns() // 1000, "pid": os.getpid(), "tid": tid, **counts}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        info["seconds"] = time.perf_counter() - start
+        with _lock:
+            peak = peak_rss_mb() if alone and overlaps == _overlaps else None
+            left = _open.pop(tid, 1) - 1
+            if left: _open[tid] = left
+        children = stack.pop()
+        if peak is not None:
+            info["peak_mb"] = round(max(peak, children), 1)
+            if stack: stack[-1] = max(stack[-1], info["peak_mb"])
+
+
+@contextlib.contextmanager
+def timed(stats, name, **counts):
+    """Mesura una etapa amb ``span`` i dona el diccionari de comptadors.
+
+    Suma els segons a ``stats["timings"][name]`` i afegeix l'interval a
+    ``stats["spans"]``. Amb ``stats=None`` no mesura res.
+    """
+    if stats is None:
+        yield {}; return
+    with span(name, **counts) as info:
+        try:
+            yield info
+        finally:
+            stats.setdefault("spans", []).append(info)
+    timings = stats.setdefault("timings", {})
+    timings[name] = timings.get(name, 0.0) + info["seconds"]
+
+
+_SPAN_KEYS = ("name", "ts", "seconds", "pid", "tid")
+
+
+def trace_events(spans):
+    """Esdeveniments Chrome trace-event (fase ``X``) dels intervals de ``span``."""
+    events = []
+    for s in spans:
+        events.append({
+            "name": s["name"], "cat": s.get("cat", "etapa"), "ph": "X", "ts": s["ts"], "dur": max(1, int(s["seconds"] * 1e6)),
+            "pid": s["pid"], "tid": s["tid"], "args": {k: v for k, v in s.items() if k not in _SPAN_KEYS and k != "cat"},
+        })
+    return events
+
+
+def write_chrome_trace(path, spans):
+    """Desa els intervals en un JSON per a ``chrome://tracing`` o Perfetto."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace_events(spans), "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def summarize(spans):
+    """Files ``(nom, segons, comptadors, peak_mb)`` en l'ordre d'execució."""
+    rows = []
+    for s in sorted(spans, key=lambda s: s["ts"]):
+        counts = {k: v for k, v in s.items() if k not in _SPAN_KEYS and k not in ("cat", "peak_mb")}
+        rows.append((s["name"], s["seconds"], counts, s.get("peak_mb")))
+    return rows
+
+
+@contextlib.contextmanager
+def cprofile(path):
+    """Executa el bloc amb cProfile i desa les estadístiques a ``path``. Amb ``None`` no fa res."""
+    if not path:
+        yield; return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,161 @@
+"""Memòria cau de resultats a disc, indexada pel contingut de les imatges.
+
+La clau d'una conversió és el hash del fitxer d'imatge, el dels paràmetres
+que afecten les sortides (``engine.OUTPUT_FIELDS``) i el del codi que les
+genera (``code_version``), de manera que una actualització no serveix
+sortides antigues.
+Així, tornar a exportar una carpeta només processa les imatges noves o
+modificades; la resta copien les sortides guardades. Cada entrada és una
+carpeta amb els fitxers de sortida i un ``meta.json``. S'escriu en una
+carpeta temporal que després es reanomena, de manera que diversos processos
+poden compartir la memòria cau. ``evict`` esborra les entrades usades fa
+més temps fins que la mida total no supera ``max_bytes``.
+"""
+import functools
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import skimage
+
+import dxf_writer
+import embroidery
+import engine
+import polylines
+import potrace_backend
+import simplify
+import skeleton_graph
+import svg_paths
+import svg_writer
+import tiling
+
+CACHE_VERSION = 1 # Format de les entrades (meta.json); el codi de la conversió ja és a code_version()
+DEFAULT_MAX_BYTES = 2 << 30
+META_FILE = "meta.json"
+_HASH_BLOCK = 1 << 20
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "trama_maker_conversor_2d", "results")
+
+
+def file_digest(path):
+    """Hash BLAKE2 del contingut d'un fitxer."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""): h.update(block)
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Hash dels mòduls que generen les sortides i de les versions de les biblioteques que hi intervenen."""
+    h = hashlib.blake2b(f"{CACHE_VERSION}:{np.__version__}:{cv2.__version__}:{skimage.__version__}".encode("utf-8"), digest_size=16)
+    for module in (dxf_writer, embroidery, engine, polylines, potrace_backend, simplify, skeleton_graph, svg_paths, svg_writer, tiling):
+        with open(module.__file__, "rb") as f: h.update(f.read())
+    return h.hexdigest()
+
+
+def params_digest(params):
+    """Hash dels paràmetres que afecten les sortides (``engine.OUTPUT_FIELDS``) i de ``code_version``."""
+    text = json.dumps({name: getattr(params, name) for name in engine.OUTPUT_FIELDS}, sort_keys=True, default=str)
+    return hashlib.blake2b(f"{code_version()}:{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _base_name(img_path):
+    return os.path.splitext(os.path.basename(img_path))[0]
+
+
+class ResultCache:
+    """Sortides de conversions anteriors, guardades a ``root``."""
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def key(self, img_path, params):
+        return f"{file_digest(img_path)}-{params_digest(params)}"
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key, img_path, output_dir):
+        """Copia les sortides guardades a ``output_dir`` amb el nom de ``img_path``.
+
+        Retorna ``(outputs, stats)`` o ``None`` si la clau no hi és.
+        """
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, META_FILE), encoding="utf-8") as f: meta = json.load(f)
+            base = _base_name(img_path)
+            outputs = []
+            for suffix in meta["suffixes"]:
+                dest = os.path.join(output_dir, base + suffix)
+                shutil.copyfile(os.path.join(entry, suffix), dest)
+                outputs.append(dest)
+            os.utime(os.path.join(entry, META_FILE)) # Marca l'entrada com a usada
+        except (OSError, ValueError, KeyError):
+            return None
+        return outputs, meta.get("stats", {})
+
+    def put(self, key, img_path, outputs, stats=None):
+        """Guarda les sortides d'una conversió. Si l'entrada ja existeix, no fa res."""
+        entry = self._entry(key)
+        if os.path.isdir(entry): return
+        base = _base_name(img_path)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(entry))
+        try:
+            suffixes = []
+            for path in outputs:
+                suffix = os.path.basename(path)[len(base):]
+                shutil.copyfile(path, os.path.join(tmp, suffix))
+                suffixes.append(suffix)
+            with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+                json.dump({"suffixes": suffixes, "stats": stats or {}, "created": time.time()}, f)
+            os.rename(tmp, entry)
+        except OSError:
+            # Una altra còpia ja l'ha guardada, o no hi ha espai.
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _entries(self):
+        """``(darrer ús, mida, carpeta)`` de cada entrada."""
+        result = []
+        if not os.path.isdir(self.root): return result
+        for shard in os.scandir(self.root):
+            if not shard.is_dir(): continue
+            for entry in os.scandir(shard.path):
+                if not entry.is_dir() or entry.name.startswith(".tmp-"): continue
+                try:
+                    files = list(os.scandir(entry.path))
+                    used = os.stat(os.path.join(entry.path, META_FILE)).st_mtime
+                except OSError:
+                    continue
+                result.append((used, sum(f.stat().st_size for f in files if f.is_file()), entry.path))
+        return result
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Esborra les entrades menys usades fins a quedar per sota de ``max_bytes``.
+
+        Retorna el nombre d'entrades esborrades.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes: break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size; removed += 1
+        return removed
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
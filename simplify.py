@@ -0,0 +1,110 @@
+"""Simplificació de polilínies: Ramer–Douglas–Peucker i Visvalingam–Whyatt.
+
+Les dues versions són iteratives (sense recursió) i retornen els punts
+originals que es conserven, en el mateix ordre. ``simplify_paths`` simplifica
+tots els camins d'una imatge amb una sola conversió a array.
+"""
+import heapq
+
+import numpy as np
+
+METHODS = ("rdp", "vw")
+
+
+def _rdp_keep(pts, epsilon):
+    """Màscara dels punts que conserva RDP per a l'array ``pts`` (N x 2)."""
+    n = len(pts)
+    keep = np.zeros(n, bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2: continue
+        p1 = pts[start]
+        seg = pts[start + 1:end] - p1
+        line = pts[end] - p1
+        line_len = np.sqrt(line @ line)
+        if line_len == 0:
+            # Extrems coincidents (camí tancat): distància al punt.
+            d = np.hypot(seg[:, 0], seg[:, 1])
+        else:
+            d = np.abs(line[0] * seg[:, 1] - line[1] * seg[:, 0]) / line_len
+        index = int(np.argmax(d))
+        if d[index] > epsilon:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((split, end))
+            stack.append((start, split))
+    return keep
+
+
+def _vw_keep(pts, min_area):
+    """Màscara dels punts que conserva Visvalingam–Whyatt.
+
+    S'eliminen, de menor a major, els punts el triangle efectiu dels quals
+    té una àrea inferior a ``min_area``.
+    """
+    n = len(pts)
+    keep = np.ones(n, bool)
+    if n < 3: return keep
+    x, y = pts[:, 0], pts[:, 1]
+    areas = np.full(n, np.inf)
+    areas[1:-1] = np.abs((x[:-2] - x[2:]) * (y[1:-1] - y[:-2]) - (x[:-2] - x[1:-1]) * (y[2:] - y[:-2])) / 2
+    prev, nxt = list(range(-1, n - 1)), list(range(1, n + 1))
+    area = areas.tolist()
+    heap = [(a, i) for i, a in enumerate(area) if a < min_area]
+    heapq.heapify(heap)
+    xs, ys = x.tolist(), y.tolist()
+
+    def triangle(i):
+        a, b = prev[i], nxt[i]
+        return abs((xs[a] - xs[b]) * (ys[i] - ys[a]) - (xs[a] - xs[i]) * (ys[b] - ys[a])) / 2
+
+    while heap:
+        a, i = heapq.heappop(heap)
+        if not keep[i] or a != area[i]: continue # Entrada obsoleta
+        keep[i] = False
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                # L'àrea efectiva no pot baixar per sota de la del punt eliminat.
+                area[j] = max(triangle(j), a)
+                if area[j] < min_area: heapq.heappush(heap, (area[j], j))
+    return keep
+
+
+def _keep_mask(pts, epsilon, method):
+    if method == "vw": return _vw_keep(pts, epsilon * epsilon)
+    return _rdp_keep(pts, epsilon)
+
+
+def simplify(points, epsilon, method="rdp"):
+    """Simplifica una polilínia.
+
+    ``epsilon`` és la distància màxima en píxels per a RDP; per a
+    Visvalingam–Whyatt s'eliminen els punts amb triangle d'àrea < ``epsilon²``.
+    """
+    if len(points) < 3 or epsilon <= 0: return list(points)
+    pts = np.asarray(points, dtype=float)
+    return [points[i] for i in np.flatnonzero(_keep_mask(pts, epsilon, method))]
+
+
+def simplify_paths(paths, epsilon, method="rdp"):
+    """Simplifica tots els camins d'una imatge amb una sola conversió a array.
+
+    Si ``epsilon`` > 0, els camins de menys de dos punts es descarten.
+    """
+    if epsilon <= 0: return [list(p) for p in paths]
+    paths = [p for p in paths if len(p) > 1]
+    if not paths: return []
+    lengths = [len(p) for p in paths]
+    pts = np.array([pt for p in paths for pt in p], dtype=float)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    result = []
+    for path, start, end in zip(paths, offsets[:-1], offsets[1:]):
+        if end - start < 3:
+            result.append(list(path)); continue
+        keep = _keep_mask(pts[start:end], epsilon, method)
+        result.append([path[i] for i in np.flatnonzero(keep)])
+    return result
@@ -0,0 +1,106 @@
+"""Graf compacte dels píxels d'un esquelet per al mode traç únic.
+
+Els nodes són els índexs dels píxels de l'esquelet en ordre de files
+(l'ordre de ``np.argwhere``) i l'adjacència és una taula d'enters de mida
+``N x 8``, una columna per a cada direcció. Els veïns, extrems i
+bifurcacions es calculen amb operacions sobre arrays i el recorregut treballa
+amb índexs enters en comptes de tuples.
+"""
+import numpy as np
+
+# Direccions en el mateix ordre en què es llisten els veïns: (dr, dc).
+# La direcció inversa de ``OFFSETS[k]`` és ``OFFSETS[7 - k]``.
+OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+_POPCOUNT = [bin(m).count("1") for m in range(256)]
+_FIRST_BIT = [(m & -m).bit_length() - 1 for m in range(256)]
+
+
+class SkeletonGraph:
+    """Graf de 8-veïnatge dels píxels actius d'un esquelet."""
+
+    def __init__(self, skeleton):
+        h, w = skeleton.shape
+        self.coords = np.argwhere(skeleton).astype(np.int32)
+        n = len(self.coords)
+        rows, cols = self.coords[:, 0].astype(np.int64), self.coords[:, 1].astype(np.int64)
+        linear = rows * w + cols  # Ordenat, perquè argwhere recorre per files
+        self.neighbors = np.full((n, 8), -1, np.int32)
+        for k, (dr, dc) in enumerate(OFFSETS):
+            valid = (rows + dr >= 0) & (rows + dr < h) & (cols + dc >= 0) & (cols + dc < w)
+            target = linear + dr * w + dc
+            pos = np.minimum(np.searchsorted(linear, target), max(n - 1, 0))
+            found = valid & (linear[pos] == target) if n else valid
+            self.neighbors[found, k] = pos[found]
+        self.degree = (self.neighbors >= 0).sum(axis=1)
+
+    def __len__(self):
+        return len(self.coords)
+
+    @property
+    def endpoints(self):
+        return np.flatnonzero(self.degree == 1)
+
+    @property
+    def junctions(self):
+        return np.flatnonzero(self.degree > 2)
+
+    def trace(self):
+        """Descompon el graf en camins d'índexs de píxel.
+
+        Primer es recorren les branques que surten dels nodes amb grau
+        diferent de 2 (extrems, bifurcacions i punts aïllats) i després els
+        cicles que queden. Cada aresta es fa servir una sola vegada.
+        """
+        n = len(self.coords)
+        nbrs = memoryview(self.neighbors.reshape(-1))
+        bits = (self.neighbors >= 0).astype(np.uint8) << np.arange(8, dtype=np.uint8)
+        mask = memoryview(bits.sum(axis=1, dtype=np.uint8))
+        present = memoryview(np.ones(n, np.uint8))
+        popcount, first_bit = _POPCOUNT, _FIRST_BIT
+
+        def remove_edge(a, b, k):
+            # Treu l'aresta a-b (b és el veí de ``a`` en la direcció ``k``).
+            if present[a]: mask[a] &= ~(1 << k) & 0xFF
+            if present[b]: mask[b] &= ~(1 << (7 - k)) & 0xFF
+            if present[a] and not mask[a]: present[a] = 0
+            if present[b] and not mask[b]: present[b] = 0
+
+        paths = []
+        for start in np.flatnonzero(self.degree != 2).tolist():
+            if not present[start]: continue
+            start_mask = mask[start]
+            for k in range(8):
+                if not start_mask >> k & 1: continue
+                neighbor = nbrs[start * 8 + k]
+                path = [start, neighbor]
+                remove_edge(start, neighbor, k)
+                curr = neighbor
+                while present[curr] and popcount[mask[curr]] == 1:
+                    k2 = first_bit[mask[curr]]
+                    prev, curr = curr, nbrs[curr * 8 + k2]
+                    path.append(curr)
+                    remove_edge(prev, curr, k2)
+                paths.append(path)
+
+        start = 0
+        while True:
+            while start < n and not present[start]: start += 1
+            if start == n: break
+            path = [start]
+            curr = start
+            while present[curr] and mask[curr]:
+                k = first_bit[mask[curr]]
+                neighbor = nbrs[curr * 8 + k]
+                remove_edge(curr, neighbor, k)
+                curr = neighbor
+                path.append(curr)
+                if curr == start: break
+            if len(path) == 1: present[start] = 0 # Píxel aïllat: un sol punt
+            paths.append(path)
+        return paths
+
+    def to_xy(self, path):
+        """Converteix un camí d'índexs en una llista de punts ``(x, y)``."""
+        pts = self.coords[path]
+        return list(zip(pts[:, 1].tolist(), pts[:, 0].tolist()))
@@ -0,0 +1,141 @@
+"""Lectura i aproximació per segments dels camins SVG de potrace.
+
+potrace només fa servir ``M``, ``L``, ``C`` i ``Z`` (absoluts o relatius,
+amb repetició implícita), un grup amb ``translate(...) scale(...)`` i cap
+altra transformació. Aquí es llegeixen els atributs ``d`` sense cap parser
+XML genèric, es conserven les corbes com a segments cúbics i s'aproximen per
+polilínies totes alhora amb arrays: cada corba es divideix en el nombre
+mínim de trams perquè l'error de corda no superi la tolerància.
+"""
+import re
+
+import numpy as np
+
+import potrace_backend
+
+DEFAULT_TOLERANCE = 0.25 # Error de corda màxim, en píxels
+
+_TOKEN_RE = re.compile(r"[MmLlHhVvCcSsZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_PATH_D_RE = re.compile(r"<path\b[^>]*?\sd=\"([^\"]*)\"", re.S)
+_GROUP_RE = re.compile(r"<g\b[^>]*?\stransform=\"([^\"]*)\"", re.S)
+_ARGS = {"M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Z": 0}
+
+
+def parse_path_data(d):
+    """Llegeix un atribut ``d`` i retorna una llista de subcamins.
+
+    Cada subcamí és ``(start, segments, closed)``: ``start`` és el punt
+    inicial i ``segments`` una llista de quaternes de punts de control
+    cúbics ``(p0, p1, p2, p3)``; les rectes es guarden com a cúbiques
+    degenerades (``p1 = p0``, ``p2 = p3``).
+    """
+    tokens = _TOKEN_RE.findall(d)
+    subpaths = []
+    x = y = 0.0
+    start = segments = None
+    closed = False
+    last_ctrl = None
+    cmd = None
+    i = 0
+
+    def finish():
+        if segments is not None: subpaths.append((start, segments, closed))
+
+    while i < len(tokens):
+        token = tokens[i]
+        if token.isalpha():
+            cmd = token; i += 1
+        elif cmd is None or cmd in "Zz":
+            raise ValueError(f"Dades de camí no vàlides: {d[:40]!r}")
+        upper = cmd.upper()
+        n = _ARGS.get(upper)
+        if n is None: raise ValueError(f"Ordre de camí no admesa: {cmd}")
+        if upper == "Z":
+            if segments is not None:
+                closed = True; finish()
+                segments, x, y = None, *start
+            cmd, last_ctrl = None, None
+            continue
+        if len(tokens) < i + n or any(t.isalpha() for t in tokens[i:i + n]):
+            raise ValueError(f"Falten arguments per a l'ordre {cmd}")
+        args = [float(v) for v in tokens[i:i + n]]
+        i += n
+        dx, dy = (x, y) if cmd.islower() else (0.0, 0.0)
+        p0 = (x, y)
+        if upper == "M":
+            finish()
+            x, y = args[0] + dx, args[1] + dy
+            start, segments, closed = (x, y), [], False
+            cmd = "l" if cmd == "m" else "L" # Els parells següents són rectes
+            last_ctrl = None
+            continue
+        if segments is None: start, segments, closed = p0, [], False
+        if upper in "LHV":
+            if upper == "L": x, y = args[0] + dx, args[1] + dy
+            elif upper == "H": x = args[0] + dx
+            else: y = args[0] + dy
+            segments.append((p0, p0, (x, y), (x, y)))
+            last_ctrl = None
+            continue
+        if upper == "C":
+            c1 = (args[0] + dx, args[1] + dy)
+            c2, end = (args[2] + dx, args[3] + dy), (args[4] + dx, args[5] + dy)
+        else: # S: el primer control és el reflex de l'anterior
+            c1 = (2 * x - last_ctrl[0], 2 * y - last_ctrl[1]) if last_ctrl else p0
+            c2, end = (args[0] + dx, args[1] + dy), (args[2] + dx, args[3] + dy)
+        segments.append((p0, c1, c2, end))
+        last_ctrl = c2
+        x, y = end
+    finish()
+    return subpaths
+
+
+def flatten(subpaths, tolerance=DEFAULT_TOLERANCE):
+    """Converteix subcamins de ``parse_path_data`` en arrays de punts ``N x 2``.
+
+    El nombre de trams de cada cúbica surt de la fórmula de Wang,
+    ``n = ceil(sqrt(0.75 * M / tolerance))``, on ``M`` és la norma màxima
+    de les segones diferències dels punts de control; les rectes fan un sol
+    tram. Tots els segments s'avaluen en una sola operació vectoritzada. Els
+    subcamins tancats acaben al punt inicial.
+    """
+    subpaths = [s for s in subpaths if s[1]]
+    if not subpaths: return []
+    ctrl = np.array([seg for _, segs, _ in subpaths for seg in segs], dtype=float) # K x 4 x 2
+    d1 = ctrl[:, 0] - 2 * ctrl[:, 1] + ctrl[:, 2]
+    d2 = ctrl[:, 1] - 2 * ctrl[:, 2] + ctrl[:, 3]
+    m = np.maximum(np.hypot(d1[:, 0], d1[:, 1]), np.hypot(d2[:, 0], d2[:, 1]))
+    m[(ctrl[:, 1] == ctrl[:, 0]).all(1) & (ctrl[:, 2] == ctrl[:, 3]).all(1)] = 0 # Rectes
+    counts = np.maximum(1, np.ceil(np.sqrt(0.75 * m / max(tolerance, 1e-9)))).astype(np.int64)
+
+    owner = np.repeat(np.arange(len(ctrl)), counts)
+    first = np.cumsum(counts) - counts
+    t = ((np.arange(owner.size) - first[owner] + 1) / counts[owner])[:, None]
+    s = 1 - t
+    c = ctrl[owner]
+    pts = s**3 * c[:, 0] + 3 * s * s * t * c[:, 1] + 3 * s * t * t * c[:, 2] + t**3 * c[:, 3]
+
+    seg_counts = [len(segs) for _, segs, _ in subpaths]
+    ends = np.cumsum(counts)[np.cumsum(seg_counts) - 1]
+    result = []
+    for (start, _, closed), lo, hi in zip(subpaths, np.concatenate(([0], ends[:-1])), ends):
+        poly = np.vstack((start, pts[lo:hi]))
+        if closed and not np.array_equal(poly[-1], poly[0]): poly = np.vstack((poly, poly[:1]))
+        result.append(poly)
+    return result
+
+
+def paths_from_svg(svg_text, tolerance=DEFAULT_TOLERANCE):
+    """Llegeix un SVG de potrace i retorna les polilínies en píxels.
+
+    Aplica la transformació del grup (``translate`` i ``scale``) i separa
+    cada subcamí (contorn exterior o forat) en una polilínia pròpia.
+    ``tolerance`` és l'error de corda màxim en píxels de la imatge.
+    """
+    group = _GROUP_RE.search(svg_text)
+    tx, ty, sx, sy = potrace_backend.parse_group_transform(group.group(1) if group else None)
+    scale = max(abs(sx), abs(sy)) or 1.0
+    subpaths = [s for d in _PATH_D_RE.findall(svg_text) for s in parse_path_data(d)]
+    offset, factor = np.array([tx, ty]), np.array([sx, sy])
+    return [offset + factor * poly for poly in flatten(subpaths, tolerance / scale)]
+
@@ -0,0 +1,78 @@
+"""Escriptura d'SVG compacta i en streaming.
+
+Cada polilínia s'escriu com un ``<path>`` amb coordenades relatives
+(``M x y l dx dy ...``). Com fa potrace, les coordenades es guarden com a
+enters en unitats de ``10**-precision`` dins d'un grup amb
+``transform="scale(...)"``: les diferències entre enters no acumulen error
+d'arrodoniment i formatar enters és molt més ràpid que formatar decimals.
+Els números es formaten per blocs amb una sola operació ``%`` i el text
+s'escriu al fitxer a mesura que es genera. Els fitxers ``.svgz`` es
+comprimeixen amb gzip.
+"""
+import gzip
+
+import numpy as np
+
+DEFAULT_PRECISION = 2
+CHUNK_VALUES = 1 << 16 # Números per bloc de text
+GZIP_LEVEL = 6
+
+
+def open_text(path):
+    """Obre ``path`` per escriure text; si acaba en ``.svgz``, comprimit."""
+    if path.lower().endswith(".svgz"): return gzip.open(path, "wt", encoding="utf-8", compresslevel=GZIP_LEVEL)
+    return open(path, "w", encoding="utf-8")
+
+
+def _encode_chunk(paths, precision):
+    """Text dels ``<path>`` d'un bloc de camins, calculat amb arrays.
+
+    Es quantitzen tots els punts alhora; els passos nuls (punts repetits) i
+    el pas que torna al punt inicial d'un camí tancat (que passa a ser ``z``)
+    s'eliminen amb màscares.
+    """
+    lengths = np.array([len(p) for p in paths])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    q = np.rint(np.array([pt for p in paths for pt in p], dtype=float) * 10 ** precision).astype(np.int64)
+    closed = (lengths > 2) & (q[starts] == q[ends - 1]).all(axis=1)
+    steps = q[1:] - q[:-1] # El pas i va del punt i al i + 1
+    keep = steps.any(axis=1)
+    keep[starts[1:] - 1] = False # Entre camins
+    keep[ends[closed] - 2] = False # Tancament, substituït per "z"
+    owner = np.repeat(np.arange(len(paths)), lengths)[:-1]
+    counts = np.bincount(owner[keep], minlength=len(paths))
+    live = counts > 0
+    rows = np.insert(steps[keep], (np.cumsum(counts) - counts)[live], q[starts[live]], axis=0)
+    template = "".join('<path d="M%d %dl%d %d' + " %d %d" * (c - 1) + ('z"/>\n' if z else '"/>\n') for c, z in zip(counts[live].tolist(), closed[live].tolist()))
+    return template % tuple(rows.reshape(-1).tolist())
+
+
+def path_elements(paths, precision=DEFAULT_PRECISION):
+    """Genera el text dels elements ``<path>`` per blocs de ``CHUNK_VALUES`` números.
+
+    Les coordenades són enters en unitats de ``10**-precision``.
+    """
+    chunk, count = [], 0
+    for points in paths:
+        if len(points) < 2: continue
+        chunk.append(points)
+        count += 2 * len(points)
+        if count >= CHUNK_VALUES:
+            yield _encode_chunk(chunk, precision); chunk, count = [], 0
+    if chunk: yield _encode_chunk(chunk, precision)
+
+
+def write_svg(path, paths, view_w, view_h, width, height, stroke, stroke_width, precision=DEFAULT_PRECISION):
+    """Escriu un SVG amb ``viewBox="0 0 view_w view_h"`` i mida ``width`` x ``height``.
+
+    Els camins van en un grup sense emplenat, amb traç ``stroke`` de gruix
+    ``stroke_width`` en unitats del ``viewBox``.
+    """
+    factor = 10 ** precision
+    transform = f' transform="scale({1 / factor:g})"' if precision else ""
+    with open_text(path) as f:
+        f.write(f'<svg width="{width}" height="{height}" viewBox="0 0 {view_w} {view_h}" xmlns="http://www.w3.org/2000/svg">\n')
+        f.write(f'<g{transform} fill="none" stroke="{stroke}" stroke-width="{stroke_width * factor:g}" stroke-linejoin="round">\n')
+        for chunk in path_elements(paths, precision): f.write(chunk)
+        f.write('</g>\n</svg>\n')
@@ -0,0 +1,98 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import autotune
+import benchmark
+import config_manager
+import engine
+
+SMALL_GRID = {"block_size": (9, 25), "C": (3, 10), "opening_radius": (0, 1)}
+
+
+@pytest.fixture(scope="module")
+def noisy_folder(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("autotune")
+    for i in range(4): cv2.imwrite(str(folder / f"s{i}.png"), benchmark.synthetic_sketch(900, 700, noise=0.1, seed=i))
+    return str(folder)
+
+
+def _ink(work):
+    ink = work > 127
+    return ~ink if ink.mean() > 0.5 else ink
+
+
+def _f1(found, truth):
+    kernel = np.ones((3, 3), np.uint8)
+    near_found, near_truth = cv2.dilate(found.view(np.uint8), kernel) > 0, cv2.dilate(truth.view(np.uint8), kernel) > 0
+    precision, recall = (found & near_truth).sum() / max(1, found.sum()), (truth & near_found).sum() / max(1, truth.sum())
+    return 2 * precision * recall / max(1e-9, precision + recall)
+
+
+def test_measure_counts_specks_breaks_and_fidelity():
+    gray = np.full((60, 100), 230, np.uint8)
+    cv2.line(gray, (10, 30), (40, 30), 40, 3); cv2.line(gray, (50, 30), (90, 30), 40, 3) # Un traç trencat
+    work = np.full_like(gray, 255)
+    work[gray < 128] = 0
+    work[5:7, 5:7] = 0 # Taca
+    work[50:53, 10:90] = 0 # Traç on l'original és paper
+    m = autotune.measure(work, autotune.normalized(gray))
+    assert m["specks"] == 1 and m["fragments"] == 3 and m["endpoints"] == 6
+    assert 0.3 < m["false_ink"] < 0.7 and m["missed_ink"] == 0
+    work[29:32, 60:90] = 255 # Part del traç perduda
+    assert autotune.measure(work, autotune.normalized(gray))["missed_ink"] > 0.2
+
+
+def test_sample_images_spread_over_the_folder():
+    assert autotune.sample_images(list("abcdefg"), 3) == ["a", "d", "g"]
+    assert autotune.sample_images(list("ab"), 3) == ["a", "b"]
+
+
+def test_tuned_params_beat_defaults_against_ground_truth(noisy_folder):
+    base = engine.ConversionParams.from_preset(config_manager.get_preset_names()[0])
+    ranked = autotune.AutoTuner(base, workers=1, time_budget=0).run(engine.list_images(noisy_folder), top=3)
+    assert len(ranked) == 3 and [c.score for c in ranked] == sorted(c.score for c in ranked)
+    best = ranked[0].params
+    assert best.replace(**{name: getattr(base, name) for name in autotune.TUNED_FIELDS}) == base # La resta, com el preset
+    noisy = benchmark.synthetic_sketch(900, 700, noise=0.1, seed=9)
+    truth = _ink(engine.preprocess(benchmark.synthetic_sketch(900, 700, noise=0.0, seed=9), base))
+    assert _f1(_ink(engine.preprocess(noisy, best)), truth) > _f1(_ink(engine.preprocess(noisy, base)), truth) + 0.03
+
+
+def test_parallel_search_matches_serial_and_refines(noisy_folder):
+    base = engine.ConversionParams()
+    paths = engine.list_images(noisy_folder)
+    stages = []
+    serial = autotune.AutoTuner(base, workers=1, grid=SMALL_GRID, progress=lambda stage, n, s: stages.append((stage, n))).run(paths, top=4)
+    parallel = autotune.AutoTuner(base, workers=2, grid=SMALL_GRID).run(paths, top=4)
+    assert [(c.values, c.score) for c in serial] == [(c.values, c.score) for c in parallel]
+    assert stages[0] == ("gruixuda", 8) and stages[1][0] == "fina" and stages[1][1] > 8
+
+
+def test_temporary_preset_keeps_base_name():
+    base = "Làser - Tall (CUT)"
+    settings = {**config_manager.get_preset_settings(base), "block_size_var": 31, "C_var": 9}
+    name = config_manager.add_temporary_preset(base, settings)
+    try:
+        assert name.startswith(base) and config_manager.base_preset_name(name) == base
+        assert config_manager.add_temporary_preset(name, settings) == name # No s'encadenen
+        params = engine.ConversionParams.from_preset(name)
+        assert (params.block_size, params.C) == (31, 9) and engine.dxf_layer_for_preset(params.preset) == engine.dxf_layer_for_preset(base)
+    finally:
+        config_manager.remove_temporary_presets()
+    assert name not in config_manager.PRESETS and base in config_manager.PRESETS
+
+
+def test_samples_use_the_base_illumination_on_the_whole_image(noisy_folder):
+    base = engine.ConversionParams(illum_sigma=60.0, illum_method="exact", median_filter=True)
+    path = engine.list_images(noisy_folder)[0]
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    expected = engine.estimate_background(cv2.medianBlur(img, 5), 60.0, "exact")
+    assert np.array_equal(autotune.illuminated(img, base), cv2.divide(cv2.medianBlur(img, 5), expected, scale=255))
+    ranked = autotune.AutoTuner(base, workers=1, grid=SMALL_GRID, time_budget=0).run([path], top=1)
+    assert (ranked[0].params.illum_sigma, ranked[0].params.illum_method) == (60.0, "exact") # El que s'ha puntuat
@@ -0,0 +1,44 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import batch
+import engine
+from test_engine import make_sketch
+
+
+def test_inline_batch_reports_each_file(tmp_path):
+    make_sketch(tmp_path / "good.png")
+    (tmp_path / "bad.png").write_bytes(b"not an image")
+    files = [str(tmp_path / "good.png"), str(tmp_path / "bad.png")]
+    out_dir = tmp_path / "output_vector"
+    runner = batch.BatchRunner(engine.ConversionParams.from_preset("Brodat (Running Stitch)"), str(out_dir), workers=1)
+    results = runner.run(files)
+    assert [r.status for r in results] == ["ok", "error"]
+    assert results[1].attempts == 1  # una imatge il·legible no es reintenta
+    manifest = json.loads((out_dir / batch.MANIFEST_JSON).read_text(encoding="utf-8"))
+    assert manifest["summary"]["ok"] == 1 and manifest["summary"]["error"] == 1
+    assert manifest["files"][0]["outputs"] == results[0].outputs
+    assert (out_dir / batch.MANIFEST_CSV).exists()
+
+
+def test_cancelled_batch_marks_pending_files(tmp_path):
+    make_sketch(tmp_path / "a.png")
+    runner = batch.BatchRunner(engine.ConversionParams(mode="centerline"), str(tmp_path / "out"), workers=1)
+    runner.cancel()
+    results = runner.run([str(tmp_path / "a.png")])
+    assert [r.status for r in results] == ["cancelled"]
+
+
+def test_process_pool_batch(tmp_path):
+    files = []
+    for i in range(3):
+        make_sketch(tmp_path / f"s{i}.png")
+        files.append(str(tmp_path / f"s{i}.png"))
+    seen = []
+    runner = batch.BatchRunner(engine.ConversionParams(mode="centerline"), str(tmp_path / "out"), workers=2, progress=lambda done, total, r: seen.append(done))
+    results = runner.run(files)
+    assert [r.status for r in results] == ["ok"] * 3
+    assert seen == [1, 2, 3]
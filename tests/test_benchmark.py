@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import benchmark
+import engine
+
+
+def test_synthetic_sketch_is_deterministic():
+    a = benchmark.synthetic_sketch(320, 240, noise=0.05, seed=3)
+    assert a.shape == (240, 320) and a.dtype == np.uint8
+    assert np.array_equal(a, benchmark.synthetic_sketch(320, 240, noise=0.05, seed=3))
+    assert not np.array_equal(a, benchmark.synthetic_sketch(320, 240, noise=0.05, seed=4))
+    clean = benchmark.synthetic_sketch(320, 240)
+    assert (clean < 100).mean() > 0.01 # Hi ha traços foscos sobre el paper
+    assert np.median(clean) > 180
+
+
+def test_time_case_reports_centerline_stages():
+    img = benchmark.synthetic_sketch(240, 180)
+    case = benchmark.time_case(img, engine.ConversionParams(mode="centerline", optimize_travel=True), repeat=1)
+    for stage in ("illumination", "binarize", "skeletonize", "graph_trace", "join_paths", "simplify", "order_paths", "write_svg", "write_dxf", "write_dst"):
+        assert stage in case["stages"]
+    assert case["paths"] > 0 and case["total"] >= max(case["stages"].values())
+
+
+def test_compare_flags_only_significant_slowdowns():
+    base = {"cases": {"a": {"stages": {"skeletonize": 1.0, "binarize": 0.001}, "total": 2.0}}}
+    current = {"cases": {"a": {"stages": {"skeletonize": 1.5, "binarize": 0.004, "nou": 9.0}, "total": 2.1}, "b": {"stages": {}, "total": 1.0}}}
+    assert benchmark.compare(current, base) == [("a", "skeletonize", 1.0, 1.5)]
+    assert benchmark.compare(current, base, tolerance=0.6) == []
+
+
+def test_main_writes_results_and_checks_baseline(tmp_path, capsys):
+    out, base = tmp_path / "res.json", tmp_path / "base.json"
+    argv = ["--size", "200x150", "--noise", "0", "--mode", "centerline", "--repeat", "1", "-o", str(out)]
+    assert benchmark.main(argv + ["--save-baseline", str(base)]) == 0
+    results = json.loads(out.read_text(encoding="utf-8"))
+    assert list(results["cases"]) == ["200x150/soroll0/centerline"]
+    baseline = json.loads(base.read_text(encoding="utf-8"))
+    assert baseline["cases"] == results["cases"] and "numpy" in baseline["meta"]
+    for case in baseline["cases"].values(): # Una referència molt més lenta
+        case["total"] *= 100
+        case["stages"] = {k: v * 100 for k, v in case["stages"].items()}
+    base.write_text(json.dumps(baseline), encoding="utf-8")
+    assert benchmark.main(argv + ["--baseline", str(base)]) == 0
+    assert "Sense regressions" in capsys.readouterr().out
+
+
+def test_background_error_measures_each_method():
+    results = benchmark.background_error(benchmark.synthetic_sketch(320, 240), 40, repeat=1)
+    assert list(results) == list(engine.ILLUM_METHODS)
+    assert results["exact"]["max_error"] == 0 and 0 < results["fastest"]["max_error"] <= 8
+
+
+def test_illum_results_do_not_replace_stage_results(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stages = {"cases": {}, "meta": {}}
+    (tmp_path / benchmark.DEFAULT_OUTPUT).write_text(json.dumps(stages), encoding="utf-8")
+    argv = ["--illum", "--size", "200x150", "--sigma", "20", "--repeat", "1"]
+    assert benchmark.main(argv) == 0
+    assert "illumination" in json.loads((tmp_path / benchmark.ILLUM_OUTPUT).read_text(encoding="utf-8"))
+    with pytest.raises(SystemExit):
+        benchmark.main(argv + ["-o", benchmark.DEFAULT_OUTPUT])
+    assert json.loads((tmp_path / benchmark.DEFAULT_OUTPUT).read_text(encoding="utf-8")) == stages
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import contact_sheet
+import engine
+from test_engine import make_sketch
+
+
+def _folder(tmp_path, n=5):
+    paths = []
+    for i in range(n):
+        paths.append(str(tmp_path / f"s{i}.png")); make_sketch(paths[-1], w=400 + 40 * i)
+    (tmp_path / "trencada.png").write_bytes(b"no es una imatge")
+    return paths + [str(tmp_path / "trencada.png")]
+
+
+def test_thumbnails_match_proxy_preview_and_report_errors(tmp_path):
+    paths = _folder(tmp_path)
+    params = engine.ConversionParams(min_area=20)
+    sheet = contact_sheet.ContactSheet(size=(120, 90), workers=3)
+    delivered = []
+    thumbs = sheet.generate(paths, params, on_thumbnail=lambda i, t: delivered.append(i))
+    assert sorted(delivered) == list(range(len(paths)))
+    for path, thumb in zip(paths[:-1], thumbs):
+        expected, _ = engine.Pipeline().process_proxy(path, params, 120, 90)
+        assert thumb.path == path and np.array_equal(thumb.image, expected) and 0 < thumb.foreground < 1
+    assert thumbs[-1].image is None and thumbs[-1].error
+
+
+def test_thumbnails_are_cached_per_preprocess_params(tmp_path):
+    paths = _folder(tmp_path, 3)[:3]
+    params = engine.ConversionParams()
+    sheet = contact_sheet.ContactSheet(size=(120, 90), workers=2)
+    first = sheet.generate(paths, params)
+    assert not any(t.cached for t in first)
+    assert all(t.cached for t in sheet.generate(paths, params.replace(mode="centerline", dpi=300))) # No afecten el preprocés
+    changed = sheet.generate(paths, params.replace(min_area=500))
+    assert not any(t.cached for t in changed)
+    assert all(t.cached for t in sheet.generate(paths, params))
+
+
+def test_generate_stops_when_asked(tmp_path):
+    paths = _folder(tmp_path, 4)[:4]
+    thumbs = contact_sheet.ContactSheet(size=(120, 90), workers=1).generate(paths, engine.ConversionParams(), should_stop=lambda: True)
+    assert thumbs.count(None) >= len(paths) - 1
+
+
+def test_sheet_shares_the_preview_pipeline(tmp_path):
+    paths = _folder(tmp_path, 2)[:2]
+    params, pipeline = engine.ConversionParams(), engine.Pipeline()
+    preview, _ = pipeline.process_proxy(paths[0], params, 120, 90)
+    sheet = contact_sheet.ContactSheet(size=(120, 90), workers=2, pipeline=pipeline)
+    assert sheet.pipeline is pipeline and np.array_equal(sheet.generate(paths, params)[0].image, preview)
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import batch
+import dxf_writer
+import engine
+
+ezdxf = pytest.importorskip("ezdxf")
+
+
+def _vertices(path):
+    return [[tuple(v.dxf.location)[:2] for v in e.vertices] for e in ezdxf.readfile(path).modelspace()]
+
+
+def test_writer_output_is_valid_r12(tmp_path):
+    out = str(tmp_path / "a.dxf")
+    with dxf_writer.DxfWriter(out, {"CUT": 1}, ((0, 0), (30, 20))) as writer:
+        writer.add_polylines([[(0, 0), (10, 0), (10, 10), (0, 0)], np.array([[1, 1], [5, 5.5]]), [(7, 7)]], "CUT")
+    doc = ezdxf.readfile(out)
+    entities = list(doc.modelspace())
+    assert [e.dxf.layer for e in entities] == ["CUT", "CUT"] and doc.layers.get("CUT").color == 1
+    assert entities[0].is_closed and not entities[1].is_closed
+    assert _vertices(out) == [[(0, 0), (10, 0), (10, 10)], [(1, 1), (5, 5.5)]]
+    assert dxf_writer.read_extents(out) == ((0, 0), (30, 20))
+    header = open(out).read().split("ENDSEC")[0]
+    assert "AC1009" in header and "$INSUNITS" not in header # Variable que R12 no té
+
+
+def test_combine_places_drawings_side_by_side(tmp_path, monkeypatch):
+    monkeypatch.setattr(dxf_writer, "COMBINE_CHUNK_CHARS", 37) # Força talls a mig registre
+    sources = []
+    for i, width in enumerate((30, 12)):
+        sources.append(str(tmp_path / f"{i}.dxf"))
+        with dxf_writer.DxfWriter(sources[-1], {"SCORE": 5}, ((0, 0), (width, 10))) as writer:
+            writer.add_polylines([[(0, 0), (width, 10)], [(1, 2), (3, 4), (5, 0)]], "SCORE")
+    out = str(tmp_path / "all.dxf")
+    dxf_writer.combine(out, sources, {"SCORE": 5}, gap_mm=5)
+    assert _vertices(out) == [[(0, 0), (30, 10)], [(1, 2), (3, 4), (5, 0)], [(35, 0), (47, 10)], [(36, 2), (38, 4), (40, 0)]]
+    assert dxf_writer.read_extents(out) == ((0, 0), (47, 10))
+
+
+def test_batch_writes_combined_dxf(tmp_path):
+    if engine.potrace_backend._binding is None: pytest.skip("cal el mòdul potrace")
+    from test_engine import make_sketch
+    files = [str(tmp_path / f"{n}.png") for n in "ab"]
+    for f in files: make_sketch(f)
+    params = engine.ConversionParams.from_preset("Làser - Tall (CUT)").replace(potrace_backend="binding")
+    runner = batch.BatchRunner(params, str(tmp_path / "out"), workers=1, combined_dxf=True)
+    results = runner.run(files)
+    assert all(r.status == "ok" for r in results)
+    assert runner.combined_dxf_path.endswith(batch.COMBINED_DXF)
+    combined = _vertices(runner.combined_dxf_path)
+    assert len(combined) == sum(len(_vertices(r.outputs[1])) for r in results)
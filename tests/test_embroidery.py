@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import embroidery
+import engine
+
+
+def test_resample_uses_equal_stitches_and_marks_jumps():
+    xy, jump = embroidery.resample_paths([[(0, 0), (10, 0), (10, 4)], [(0, 20), (0, 30)], [(20, 20)]], 2.5)
+    corner, straight = xy[:7], xy[7:12]
+    assert np.allclose(corner[[0, 3, -1]], [(0, 0), (7, 0), (10, 4)]) # 14 mm en 6 punts
+    assert np.allclose(np.hypot(*np.diff(straight, axis=0).T), 2.5)
+    assert jump.tolist() == [True] + [False] * 6 + [True] + [False] * 4 + [True]
+
+
+def test_dst_records_round_trip_and_split_long_moves():
+    moves = np.array([(0, 0), (1, -1), (121, -121), (-40, 41), (300, -5)])
+    jump = np.array([True, False, False, False, True])
+    split, split_jump = embroidery._split_moves(moves, jump)
+    assert np.abs(split).max() <= embroidery.DST_MAX_STEP
+    assert (split[4:].sum(axis=0) == (300, -5)).all() and split_jump[4:].all()
+    decoded, decoded_jump = embroidery.decode_dst_records(embroidery.encode_dst_records(split, split_jump))
+    assert (decoded == split).all() and (decoded_jump == split_jump).all()
+
+
+def test_write_dst_layout(tmp_path):
+    xy, jump = embroidery.resample_paths([[(0, 0), (30, 0)], [(0, 10), (30, 10)]], 2.0)
+    out = tmp_path / "a.dst"
+    embroidery.write_dst(str(out), xy, jump)
+    data = out.read_bytes()
+    assert data[:3] == b"LA:" and b"+X:  150" in data[:512]
+    assert data.endswith(embroidery.DST_END) and (len(data) - 512) % 3 == 0
+    moves, jumps = embroidery.decode_dst_records(data[512:-3])
+    assert (moves.sum(axis=0) == np.rint((xy[-1] - (15, 5)) / 0.1)).all()
+    assert jumps.sum() == 2 + 3 # Salts de 15,8 mm i 31,6 mm partits en registres de 12,1 mm
+
+
+def test_embroidery_preset_writes_csv_and_dst(tmp_path):
+    from test_engine import make_sketch
+    make_sketch(str(tmp_path / "s.png"))
+    params = engine.ConversionParams.from_preset("Brodat (Running Stitch)")
+    outputs = engine.convert_image(str(tmp_path / "s.png"), params, str(tmp_path))
+    assert [os.path.splitext(o)[1] for o in outputs] == [".svg", ".csv", ".dst"]
+    rows = np.loadtxt(outputs[1], delimiter=",", skiprows=1)
+    stitches = rows[1:][rows[1:, 2] == 0]
+    prev = rows[:-1][rows[1:, 2] == 0]
+    assert np.hypot(*(stitches[:, :2] - prev[:, :2]).T).max() <= params.stitch_length_mm + 1e-3
@@ -0,0 +1,172 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import cli
+import config_manager
+import engine
+
+
+def make_sketch(path=None, w=400, h=300):
+    img = np.full((h, w), 235, np.uint8)
+    cv2.line(img, (20, 30), (380, 250), 40, 4)
+    cv2.circle(img, (200, 150), 80, 30, 3)
+    if path: cv2.imwrite(str(path), img)
+    return img
+
+
+def test_params_from_preset_match_config_manager():
+    params = engine.ConversionParams.from_preset("Brodat (Running Stitch)")
+    settings = config_manager.get_preset_settings("Brodat (Running Stitch)")
+    assert params.mode == settings["mode_var"]
+    assert params.stitch_length_mm == settings["stitch_length_mm_var"]
+    assert params.preset == "Brodat (Running Stitch)"
+
+
+def test_params_defaults_match_config_manager():
+    # La GUI i la CLI parteixen de config_manager; el motor, el lot i el benchmark, dels valors per defecte.
+    assert engine.ConversionParams.from_settings(config_manager.get_default_standard_settings(), preset="") == engine.ConversionParams()
+    assert engine.ConversionParams.from_settings(config_manager.APP_SETTINGS, preset="") == engine.ConversionParams()
+
+
+def test_app_settings_are_not_preset_settings():
+    for name in config_manager.get_preset_names():
+        assert not config_manager.APP_SETTINGS.keys() & config_manager.get_preset_settings(name).keys()
+
+
+def test_params_from_settings_ignores_unknown_keys():
+    params = engine.ConversionParams.from_settings({"min_area_var": 7, "last_folder": "/tmp", "vector_preview_var": True})
+    assert params.min_area == 7
+
+
+def test_preprocess_returns_binary_image():
+    img = make_sketch()
+    out = engine.preprocess(img, engine.ConversionParams())
+    assert out.shape == img.shape and out.dtype == np.uint8
+    assert set(np.unique(out)) <= {0, 255}
+
+
+def test_convert_image_centerline_writes_svg_csv_and_dst(tmp_path):
+    img_path = tmp_path / "sketch.png"
+    make_sketch(img_path)
+    params = engine.ConversionParams.from_preset("Brodat (Running Stitch)")
+    outputs = engine.convert_image(str(img_path), params, str(tmp_path))
+    assert [os.path.basename(o) for o in outputs] == ["sketch__centerline.svg", "sketch__centerline.csv", "sketch__centerline.dst"]
+    assert all(os.path.getsize(o) > 0 for o in outputs)
+
+
+def test_cli_overrides_are_typed():
+    overrides = cli.parse_overrides(["min_area=300", "clahe_var=true", "illum_sigma=12.5"])
+    assert overrides == {"min_area": 300, "clahe": True, "illum_sigma": 12.5}
+
+
+def test_cli_converts_folder(tmp_path):
+    make_sketch(tmp_path / "a.png")
+    rc = cli.main([str(tmp_path), "-p", "Làser - Marcat / Gravat (SCORE)", "-q"])
+    assert rc == 0
+    assert {"a__centerline.dxf", "a__centerline.svg", "manifest.json"} <= set(os.listdir(tmp_path / "output_vector"))
+
+
+def test_pipeline_matches_preprocess_and_reuses_upstream_stages(tmp_path):
+    img_path = tmp_path / "sketch.png"
+    make_sketch(img_path)
+    params = engine.ConversionParams(median_filter=True, clahe=True, opening_radius=1, min_area=50)
+    pipeline = engine.Pipeline()
+    out = pipeline.process_file(str(img_path), params)
+    assert np.array_equal(out, engine.process_file(str(img_path), params))
+
+    misses = pipeline.cache.misses
+    out2 = pipeline.process_file(str(img_path), params.replace(min_area=500))
+    assert pipeline.cache.misses == misses + 1  # només es recalcula la neteja final
+    assert np.array_equal(out2, engine.process_file(str(img_path), params.replace(min_area=500)))
+
+
+def test_stage_cache_respects_memory_budget():
+    cache = engine.StageCache(max_bytes=250)
+    for i in range(5): cache.put(i, np.zeros(100, np.uint8))
+    assert len(cache) == 2 and cache.nbytes == 200
+    assert cache.get(0) is None and cache.get(4) is not None
+
+
+def test_scaled_params_rescale_pixel_quantities():
+    params = engine.ConversionParams(illum_sigma=60.0, block_size=15, opening_radius=2, min_area=400, prune_short=4.0, simplification_epsilon=2.0, dpi=200)
+    half = params.scaled(0.5)
+    assert (half.illum_sigma, half.block_size, half.opening_radius, half.min_area) == (30.0, 9, 1, 100)
+    assert (half.prune_short, half.simplification_epsilon, half.dpi) == (2.0, 1.0, 100.0)
+    assert params.scaled(0.1).block_size == 3
+    assert params.scaled(1) is params
+
+
+def test_pipeline_proxy_fits_requested_size(tmp_path):
+    img_path = tmp_path / "sketch.png"
+    make_sketch(img_path, w=800, h=600)
+    pipeline = engine.Pipeline()
+    img, scaled = pipeline.process_proxy(str(img_path), engine.ConversionParams(), 200, 200)
+    assert img.shape == (150, 200)
+    assert scaled.illum_sigma == 12.5
+
+
+def _blobs():
+    img = np.zeros((60, 80), np.uint8)
+    img[0:5, 0:5] = 255          # 25 px, toca la vora
+    img[10:14, 10:14] = 255      # 16 px
+    img[20:30, 20:30] = 255      # 100 px
+    img[24:26, 24:26] = 0        # forat de 4 px
+    img[35:55, 40:75] = 255      # 700 px
+    return img
+
+
+def test_filter_components_matches_per_component_loop():
+    img = _blobs()
+    expected = img.copy()
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(expected, 8, cv2.CV_32S)
+    for i in range(1, n):
+        if stats[i, cv2.CC_STAT_AREA] < 50: expected[labels == i] = 0
+    assert np.array_equal(engine.filter_components(img, min_area=50), expected)
+
+
+def test_cleanup_options():
+    img = _blobs()
+    areas = lambda out: sorted(cv2.connectedComponentsWithStats(out, 8, cv2.CV_32S)[2][1:, cv2.CC_STAT_AREA])
+    assert areas(engine.filter_components(img, max_area=200)) == [16, 25, 96]
+    assert areas(engine.filter_components(img, keep_largest=2)) == [96, 700]
+    assert areas(engine.filter_components(img, remove_border=True)) == [16, 96, 700]
+    assert engine.fill_holes(img, 10)[25, 25] == 255
+    assert engine.fill_holes(img, 4)[25, 25] == 0
+
+
+def test_fast_background_is_close_to_exact_blur():
+    img = cv2.GaussianBlur(make_sketch(w=800, h=600), (0, 0), 3)
+    exact = engine.estimate_background(img, 70).astype(int)
+    for method, max_error in (("fast", 4), ("fastest", 8)):
+        background = engine.estimate_background(img, 70, method)
+        assert background.shape == img.shape and background.dtype == np.uint8
+        assert np.abs(background.astype(int) - exact).max() <= max_error
+    assert np.array_equal(engine.estimate_background(img, 5, "fast"), engine.estimate_background(img, 5)) # Sigma petita: exacte
+
+
+def test_convert_image_reports_travel(tmp_path):
+    path = str(tmp_path / "sketch.png")
+    make_sketch(path)
+    stats = {}
+    params = engine.ConversionParams(mode="centerline", optimize_travel=True, join_max_dist=0)
+    engine.convert_image(path, params, str(tmp_path), stats=stats)
+    assert 0 < stats["travel_after_mm"] <= stats["travel_before_mm"]
+
+
+def test_proxy_is_decoded_reduced_and_cached_apart(tmp_path):
+    img_path = str(tmp_path / "sketch.jpg")
+    cv2.imwrite(img_path, make_sketch(w=1600, h=1200))
+    assert engine.image_size(img_path) == (1600, 1200)
+    assert engine.read_reduction((1600, 1200), 300, 300) == 4 and engine.read_reduction((1600, 1200), 1000, 1000) == 1
+    pipeline = engine.Pipeline()
+    key, proxy, factor = pipeline.load_proxy(img_path, 300, 300)
+    assert proxy.shape == (225, 300) and factor == 300 / 1600
+    assert ("reduced", 4, engine.file_key(img_path)) in pipeline.images._items
+    assert engine.file_key(img_path) not in pipeline.images._items # No s'ha llegit la imatge sencera
+    pipeline.run(proxy, key, engine.ConversionParams())
+    assert len(pipeline.images) == 2 and len(pipeline.cache) > 0
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import overlay
+
+
+def test_render_fits_image_and_draws_paths_in_one_image():
+    img = np.full((100, 200), 255, np.uint8)
+    paths = [[(10, 10), (190, 90)], [(0, 50), (200, 50)], [(5, 5)]]
+    vectors = overlay.VectorOverlay(paths)
+    assert vectors.count == 2
+    rgb, points = overlay.render(img, vectors, overlay.View(), (420, 220))
+    assert rgb.shape == (220, 420, 3) and points == 4
+    assert tuple(rgb[0, 0]) == (overlay.BACKGROUND,) * 3 # Marge
+    r, g, b = rgb[110, 210] # Escala 2: la línia horitzontal passa pel centre
+    assert g == 255 and r < 16 and b < 16
+
+
+def test_level_of_detail_drops_points_sharing_a_pixel():
+    dense = [[(x / 10, 20.0) for x in range(2000)]] # 2000 punts en 200 px
+    img = np.zeros((40, 200), np.uint8)
+    vectors = overlay.VectorOverlay(dense)
+    _, small = overlay.render(img, vectors, overlay.View(), (120, 44))
+    _, zoomed = overlay.render(img, vectors, overlay.View(8.0), (120, 44))
+    assert small <= 101 and small < zoomed
+
+
+def test_zoom_keeps_point_under_cursor_and_pan_is_clamped():
+    shape, canvas = (300, 400), (420, 320)
+    view = overlay.View()
+    zoomed = view.zoomed(2, 100, 80, shape, canvas)
+    before, after = view.transform(shape, canvas), zoomed.transform(shape, canvas)
+    point = lambda t: ((100 - t[1]) / t[0], (80 - t[2]) / t[0])
+    assert np.allclose(point(before), point(after))
+    assert zoomed.panned(10**6, 0, shape, canvas).center[0] == 0.0
+    assert zoomed.zoomed(0.1, 0, 0, shape, canvas) == overlay.View()
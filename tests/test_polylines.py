@@ -0,0 +1,74 @@
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import polylines
+
+
+def test_spatial_grid_query_and_remove():
+    grid = polylines.SpatialGrid(5)
+    grid.insert("a", 1, 1)
+    grid.insert("b", 7, 2)
+    grid.insert("c", 40, 40)
+    assert sorted(item for item, _ in grid.query(3, 3, 5)) == ["a", "b"]
+    grid.remove("a", 1, 1)
+    assert [item for item, _ in grid.query(3, 3, 5)] == ["b"]
+    assert len(grid) == 2
+
+
+def test_join_paths_connects_matching_ends():
+    a = [(0, 0), (10, 0)]
+    assert polylines.join_paths([a, [(11, 0), (20, 0)]], 5) == [[(0, 0), (10, 0), (11, 0), (20, 0)]]  # final -> inici
+    assert polylines.join_paths([a, [(-1, 0), (-9, 0)]], 5) == [[(10, 0), (0, 0), (-1, 0), (-9, 0)]]  # inici -> inici
+    assert polylines.join_paths([a, [(20, 0), (12, 0)]], 5) == [[(0, 0), (10, 0), (12, 0), (20, 0)]]  # final -> final
+    # inici -> final: el camí resultant ha de passar pel punt d'unió
+    assert polylines.join_paths([a, [(-9, 0), (-1, 0)]], 5) == [[(10, 0), (0, 0), (-1, 0), (-9, 0)]]
+
+
+def test_join_paths_is_greedy_in_list_order():
+    paths = [[(0, 0), (10, 0)], [(50, 0), (60, 0)], [(12, 0), (20, 0)], [(22, 0), (30, 0)]]
+    assert polylines.join_paths(paths, 5) == [[(0, 0), (10, 0), (12, 0), (20, 0), (22, 0), (30, 0)], [(50, 0), (60, 0)]]
+    assert polylines.join_paths(paths, 0) == paths
+
+
+def _random_segments(n, seed=0):
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(n):
+        x, y = rng.uniform(0, 1000), rng.uniform(0, 1000)
+        paths.append([(x, y), (x + rng.uniform(-10, 10), y + rng.uniform(-10, 10))])
+    return paths
+
+
+def test_order_paths_keeps_every_path_and_reduces_travel():
+    paths = _random_segments(500)
+    ordered = polylines.order_paths(paths)
+    assert sorted(map(sorted, ordered)) == sorted(map(sorted, paths))
+    nearest = polylines.travel_length(polylines.order_paths(paths, passes=0))
+    after = polylines.travel_length(ordered)
+    assert after <= nearest < polylines.travel_length(paths) / 5
+
+
+def test_order_paths_reverses_paths_to_avoid_travel():
+    paths = [[(10, 0), (0, 0)], [(20, 0), (11, 0)], [(12, 0), (30, 0)]]
+    assert polylines.order_paths(paths) == [[(0, 0), (10, 0)], [(11, 0), (20, 0)], [(12, 0), (30, 0)]]
+    assert polylines.travel_length(polylines.order_paths(paths)) == 1 + 8
+
+
+def test_order_paths_handles_clustered_and_repeated_ends():
+    # Extrems molt junts amb un camí aïllat lluny (la graella uniforme hi
+    # era quadràtica) i molts camins amb els mateixos extrems.
+    clustered = [[(x / 100, y / 100) for x, y in p] for p in _random_segments(4000)]
+    clustered.append([(1e5, 1e5), (1e5 + 1, 1e5)])
+    repeated = [[(5, 5), (6, 5)] for _ in range(3000)] + [[(6, 5), (5, 5)] for _ in range(3000)]
+    for paths in (clustered, repeated):
+        started = time.perf_counter()
+        ordered = polylines.order_paths(paths)
+        assert time.perf_counter() - started < 10
+        assert sorted(map(sorted, ordered)) == sorted(map(sorted, paths))
+        assert polylines.travel_length(ordered) <= polylines.travel_length(polylines.order_paths(paths, passes=0))
+    assert polylines.travel_length(polylines.order_paths(repeated)) == math.hypot(5, 5) # Anada i tornada sense buits
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import engine
+import preview
+
+
+def test_only_latest_request_is_delivered():
+    started, delivered, done = [], [], threading.Event()
+
+    def work(request, should_stop):
+        started.append(request)
+        return request * 10
+
+    def on_done(request, result):
+        delivered.append((request, result)); done.set()
+
+    scheduler = preview.PreviewScheduler(work, on_done, delay=0.05)
+    for i in range(5): scheduler.submit(i)
+    assert done.wait(2)
+    scheduler.stop()
+    assert started == [4]
+    assert delivered == [(4, 40)]
+
+
+def test_superseded_job_is_aborted_between_stages():
+    first_running, results, done = threading.Event(), [], threading.Event()
+
+    def work(request, should_stop):
+        if request == "slow":
+            first_running.set()
+            for _ in range(200):
+                engine.check_cancel(should_stop)
+                time.sleep(0.01)
+        return request
+
+    def on_done(request, result):
+        results.append(result); done.set()
+
+    scheduler = preview.PreviewScheduler(work, on_done, delay=0)
+    scheduler.submit("slow")
+    assert first_running.wait(2)
+    scheduler.submit("fast")
+    assert done.wait(2)
+    scheduler.stop()
+    assert results == ["fast"]
+
+
+def test_neighbour_indices_prefer_next_image():
+    assert preview.neighbour_indices(3, 10) == [4, 2, 5, 1]
+    assert preview.neighbour_indices(0, 3) == [1, 2]
+    assert preview.neighbour_indices(0, 1) == []
+
+
+def test_prefetcher_replaces_pending_items():
+    loaded, gate, done = [], threading.Event(), threading.Event()
+
+    def load(item):
+        if item == "lenta": gate.wait(2)
+        if item == "falla": raise OSError("no es pot llegir")
+        loaded.append(item)
+        if item == "c": done.set()
+
+    prefetcher = preview.Prefetcher(load)
+    prefetcher.prefetch(["lenta", "x", "y"])
+    time.sleep(0.05)
+    prefetcher.prefetch(["falla", "b", "c"]) # "x" i "y" ja no calen
+    gate.set()
+    assert done.wait(2)
+    prefetcher.stop()
+    assert loaded == ["lenta", "b", "c"]
@@ -0,0 +1,80 @@
+import json
+import os
+import pstats
+import sys
+import threading
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import batch
+import engine
+import profiling
+from test_engine import make_sketch
+
+
+def test_span_records_time_counts_and_memory():
+    with profiling.span("fora", pixels=10) as outer:
+        with profiling.span("dins") as inner:
+            block = np.ones(20 << 20, np.uint8) # 20 MB
+            inner["paths"] = 3
+        del block
+    assert inner["paths"] == 3 and outer["pixels"] == 10
+    assert 0 <= inner["seconds"] <= outer["seconds"]
+    assert outer["ts"] <= inner["ts"]
+    if inner.get("peak_mb") is not None:
+        assert outer["peak_mb"] >= inner["peak_mb"] >= 20
+
+
+def test_spans_overlapping_other_threads_have_no_peak():
+    started, done = threading.Event(), threading.Event()
+    spans = {}
+
+    def worker():
+        with profiling.span("fil") as spans["fil"]:
+            started.set(); done.wait(5)
+
+    thread = threading.Thread(target=worker)
+    thread.start(); started.wait(5)
+    with profiling.span("principal") as spans["principal"]:
+        with profiling.span("dins") as spans["dins"]: pass
+    done.set(); thread.join()
+    with profiling.span("sol") as spans["sol"]: pass
+    assert not any("peak_mb" in spans[name] for name in ("fil", "principal", "dins"))
+    assert ("peak_mb" in spans["sol"]) == (profiling.peak_rss_mb() is not None)
+
+
+def test_trace_events_and_summary():
+    spans = [{"name": "b", "ts": 20, "seconds": 0.5, "pid": 1, "tid": 2, "paths": 4, "peak_mb": 10.0},
+             {"name": "a", "ts": 10, "seconds": 0.0, "pid": 1, "tid": 2, "cat": "fitxer"}]
+    events = profiling.trace_events(spans)
+    assert events[0] == {"name": "b", "cat": "etapa", "ph": "X", "ts": 20, "dur": 500000, "pid": 1, "tid": 2, "args": {"paths": 4, "peak_mb": 10.0}}
+    assert events[1]["dur"] == 1 and events[1]["cat"] == "fitxer"
+    assert profiling.summarize(spans) == [("a", 0.0, {}, None), ("b", 0.5, {"paths": 4}, 10.0)]
+
+
+def test_convert_image_records_stage_spans(tmp_path):
+    make_sketch(tmp_path / "s.png")
+    stats = {}
+    engine.convert_image(str(tmp_path / "s.png"), engine.ConversionParams(mode="centerline"), str(tmp_path), stats=stats)
+    names = [s["name"] for s in stats["spans"]]
+    assert names[:2] == ["load", "illumination"] and "skeletonize" in names and "write_svg" in names
+    simplify = next(s for s in stats["spans"] if s["name"] == "simplify")
+    assert simplify["paths"] > 0 and simplify["points"] >= simplify["paths"]
+    assert stats["timings"]["skeletonize"] == next(s["seconds"] for s in stats["spans"] if s["name"] == "skeletonize")
+
+
+def test_batch_writes_chrome_trace_and_cprofile(tmp_path):
+    make_sketch(tmp_path / "a.png")
+    out_dir = tmp_path / "out"
+    runner = batch.BatchRunner(engine.ConversionParams(mode="centerline"), str(out_dir), workers=1, trace=True, profile_dir=str(tmp_path / "prof"))
+    results = runner.run([str(tmp_path / "a.png")])
+    assert results[0].status == "ok" and runner.trace_path == str(out_dir / batch.TRACE_JSON)
+    trace = json.loads((out_dir / batch.TRACE_JSON).read_text(encoding="utf-8"))
+    events = {e["name"]: e for e in trace["traceEvents"]}
+    assert events["convert"]["args"]["image"] == "a.png" and events["convert"]["cat"] == "fitxer"
+    assert events["convert"]["dur"] >= events["skeletonize"]["dur"]
+    assert pstats.Stats(str(tmp_path / "prof" / "a.prof")).total_calls > 0
+    manifest = json.loads((out_dir / batch.MANIFEST_JSON).read_text(encoding="utf-8"))
+    assert "spans" not in manifest["files"][0] and "skeletonize" in manifest["files"][0]["timings"]
@@ -0,0 +1,65 @@
+import dataclasses
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import batch
+import engine
+import result_cache
+from test_engine import make_sketch
+
+
+def test_key_depends_on_content_and_params(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / "cache"))
+    a, b = str(tmp_path / "a.png"), str(tmp_path / "b.png")
+    make_sketch(a); make_sketch(b)
+    params = engine.ConversionParams()
+    assert cache.key(a, params) == cache.key(b, params) # Mateix contingut, nom diferent
+    assert cache.key(a, params) != cache.key(a, params.replace(min_area=10))
+    make_sketch(b, w=401)
+    assert cache.key(a, params) != cache.key(b, params)
+
+
+def test_key_ignores_fields_that_do_not_change_outputs(tmp_path, monkeypatch):
+    fields = {f.name for f in dataclasses.fields(engine.ConversionParams)}
+    assert fields - set(engine.OUTPUT_FIELDS) == {"tile_budget_mb", "potrace_backend"} # Cal classificar els camps nous
+    cache = result_cache.ResultCache(str(tmp_path / "cache"))
+    make_sketch(tmp_path / "a.png")
+    a, params = str(tmp_path / "a.png"), engine.ConversionParams()
+    assert cache.key(a, params) == cache.key(a, params.replace(tile_budget_mb=1, potrace_backend="cli"))
+    key = cache.key(a, params)
+    monkeypatch.setattr(result_cache, "code_version", lambda: "codi nou")
+    assert cache.key(a, params) != key
+
+
+def test_batch_reuses_cached_outputs(tmp_path):
+    files = [str(tmp_path / f"{n}.png") for n in "ab"]
+    make_sketch(files[0]); make_sketch(files[1], w=420)
+    cache = result_cache.ResultCache(str(tmp_path / "cache"))
+    params = engine.ConversionParams.from_preset("Brodat (Running Stitch)")
+    first = batch.BatchRunner(params, str(tmp_path / "out1"), workers=1, cache=cache).run(files)
+    assert [r.cached for r in first] == [False, False]
+
+    make_sketch(str(tmp_path / "c.png"), w=380)
+    second = batch.BatchRunner(params, str(tmp_path / "out2"), workers=1, cache=cache).run(files + [str(tmp_path / "c.png")])
+    assert [r.cached for r in second] == [True, True, False]
+    for old, new in zip(first, second):
+        assert [os.path.basename(o) for o in old.outputs] == [os.path.basename(o) for o in new.outputs]
+        for o, n in zip(old.outputs, new.outputs):
+            with open(o, "rb") as f1, open(n, "rb") as f2: assert f1.read() == f2.read()
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / "cache"), max_bytes=0)
+    out = tmp_path / "x__outline.svg"
+    for i, key in enumerate(["aa-1", "bb-2", "cc-3"]):
+        out.write_bytes(b"x" * 100)
+        cache.put(key, str(tmp_path / "x.png"), [str(out)])
+        meta = os.path.join(cache._entry(key), result_cache.META_FILE)
+        os.utime(meta, (1000 + i, 1000 + i))
+    assert cache.get("aa-1", str(tmp_path / "y.png"), str(tmp_path))[0] == [str(tmp_path / "y__outline.svg")]
+    cache.max_bytes = cache.size() - 1
+    assert cache.evict() == 1 # "bb-2" és ara la menys usada
+    assert cache.get("bb-2", str(tmp_path / "y.png"), str(tmp_path)) is None
+    assert cache.get("cc-3", str(tmp_path / "y.png"), str(tmp_path)) is not None
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import simplify
+
+
+def test_rdp_keeps_corners_and_original_points():
+    pts = [(0, 0), (1, 0.1), (2, 0), (3, 0.1), (4, 0), (4, 1), (4, 2), (4, 3)]
+    assert simplify.simplify(pts, 0.5) == [(0, 0), (4, 0), (4, 3)]
+
+
+def test_rdp_keeps_closed_paths():
+    square = [(0, 0), (5, 0), (10, 0), (10, 10), (0, 10), (0, 0)]
+    assert simplify.simplify(square, 1) == [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]
+
+
+def test_rdp_handles_long_paths_without_recursion():
+    t = np.linspace(0, 50 * np.pi, 100000)
+    pts = list(zip((t * 10).tolist(), (np.sin(t) * 20).tolist()))
+    out = simplify.simplify(pts, 0.5)
+    assert out[0] == pts[0] and out[-1] == pts[-1] and 100 < len(out) < len(pts)
+
+
+def test_visvalingam_removes_small_triangles():
+    pts = [(0, 0), (1, 0.01), (2, 0), (3, 5), (4, 0)]
+    assert simplify.simplify(pts, 1, method="vw") == [(0, 0), (2, 0), (3, 5), (4, 0)]
+
+
+def test_simplify_paths_batch():
+    paths = [[(0, 0), (1, 0.1), (2, 0)], [(5, 5)], [(0, 0), (3, 3)]]
+    assert simplify.simplify_paths(paths, 0.5) == [[(0, 0), (2, 0)], [(0, 0), (3, 3)]]
+    assert simplify.simplify_paths(paths, 0) == paths
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import skeleton_graph
+
+
+def test_degrees_endpoints_and_junctions():
+    sk = np.zeros((7, 7), bool)
+    sk[3, 1:6] = True  # horitzontal
+    sk[4:6, 3] = True  # branca cap avall: forma de T
+    graph = skeleton_graph.SkeletonGraph(sk)
+    xy = [tuple(graph.coords[i]) for i in graph.endpoints]
+    assert sorted(xy) == [(3, 1), (3, 5), (5, 3)]
+    assert len(graph.junctions) >= 1
+
+
+def test_trace_straight_line():
+    sk = np.zeros((3, 6), bool)
+    sk[1, 1:5] = True
+    graph = skeleton_graph.SkeletonGraph(sk)
+    assert [graph.to_xy(p) for p in graph.trace()] == [[(1, 1), (2, 1), (3, 1), (4, 1)]]
+
+
+def test_trace_cycle_and_isolated_pixel():
+    sk = np.zeros((8, 8), bool)
+    for r, c in [(0, 2), (1, 1), (1, 3), (2, 0), (2, 4), (3, 1), (3, 3), (4, 2)]:
+        sk[r, c] = True         # rombe tancat, tots els píxels de grau 2
+    sk[6, 6] = True             # píxel aïllat
+    graph = skeleton_graph.SkeletonGraph(sk)
+    paths = [graph.to_xy(p) for p in graph.trace()]
+    assert [(6, 6)] in paths
+    cycle = next(p for p in paths if len(p) > 1)
+    assert cycle[0] == cycle[-1] and len(cycle) == 9
+
+
+def test_empty_skeleton():
+    graph = skeleton_graph.SkeletonGraph(np.zeros((4, 4), bool))
+    assert len(graph) == 0 and graph.trace() == []
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import svg_paths
+
+POTRACE_SVG = """<?xml version="1.0" standalone="no"?>
+<svg version="1.0" xmlns="http://www.w3.org/2000/svg" width="40pt" height="20pt" viewBox="0 0 40 20">
+<g transform="translate(0.000000,20.000000) scale(0.100000,-0.100000)"
+fill="#000000" stroke="none">
+<path d="M100 50 l200 0 0 100 -200 0 0 -100z m50 25 l0 50 100 0 0 -50 -100
+0z"/>
+</g>
+</svg>"""
+
+
+def _bezier(ctrl, t):
+    t = np.asarray(t)[:, None]
+    s = 1 - t
+    return s**3 * ctrl[0] + 3 * s * s * t * ctrl[1] + 3 * s * t * t * ctrl[2] + t**3 * ctrl[3]
+
+
+def test_relative_commands_with_implicit_repeats():
+    (start, segments, closed), = svg_paths.parse_path_data("m10 10 c0 10 10 10 10 0 10 -10 20 -10 20 0 l5 5z")
+    assert start == (10, 10) and closed
+    assert [seg[3] for seg in segments] == [(20, 10), (40, 10), (45, 15)]
+    assert segments[1][1] == (30, 0)
+
+
+def test_unsupported_command_raises():
+    with pytest.raises(ValueError):
+        svg_paths.parse_path_data("M0 0 A 5 5 0 0 1 10 10")
+
+
+def test_flatten_respects_chord_tolerance():
+    ctrl = np.array([(0, 0), (0, 100), (100, 100), (100, 0)], float)
+    for tolerance in (2.0, 0.25):
+        poly, = svg_paths.flatten([((0.0, 0.0), [tuple(map(tuple, ctrl))], False)], tolerance)
+        dense = _bezier(ctrl, np.linspace(0, 1, 5001))
+        seg_a, seg_b = poly[:-1], poly[1:]
+        # Distància de cada punt dens a la polilínia.
+        d = seg_b - seg_a
+        t = np.clip(((dense[:, None] - seg_a) * d).sum(-1) / (d * d).sum(-1), 0, 1)
+        dist = np.linalg.norm(dense[:, None] - (seg_a + t[..., None] * d), axis=-1).min(axis=1)
+        assert dist.max() <= tolerance
+        assert np.allclose(poly[0], ctrl[0]) and np.allclose(poly[-1], ctrl[3])
+    assert len(poly) < 60
+
+
+def test_paths_from_svg_splits_subpaths_and_applies_transform():
+    outer, hole = svg_paths.paths_from_svg(POTRACE_SVG)
+    assert len(outer) == 5 and len(hole) == 5
+    assert np.allclose(outer[0], outer[-1]) and np.allclose(hole[0], hole[-1])
+    assert np.allclose(outer.min(axis=0), [10, 5]) and np.allclose(outer.max(axis=0), [30, 15])
+    assert np.allclose(hole.min(axis=0), [15, 7.5]) and np.allclose(hole.max(axis=0), [25, 12.5])
@@ -0,0 +1,47 @@
+import gzip
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import engine
+import svg_paths
+import svg_writer
+
+
+def _random_paths(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return [list(map(tuple, np.cumsum(rng.normal(0, 3, (rng.integers(2, 40), 2)), axis=0) + 100)) for _ in range(n)]
+
+
+def test_relative_paths_round_trip_without_drift(tmp_path, monkeypatch):
+    monkeypatch.setattr(svg_writer, "CHUNK_VALUES", 64) # Força diversos blocs
+    paths = _random_paths()
+    out = tmp_path / "a.svg"
+    svg_writer.write_svg(str(out), paths, 200, 200, "10mm", "10mm", "blue", 0.1, precision=2)
+    read = svg_paths.paths_from_svg(out.read_text())
+    assert len(read) == len(paths)
+    for original, parsed in zip(paths, read):
+        assert np.abs(np.asarray(original) - parsed).max() <= 0.005 + 1e-9
+
+
+def test_integer_relative_coordinates_and_closed_paths():
+    text = "".join(svg_writer.path_elements([[(0, 0), (1.5, 0), (1.5, 2.25), (0, 0)], [(3, 3), (3, 3), (4, 3)]], precision=2))
+    assert text == '<path d="M0 0l150 0 0 225z"/>\n<path d="M300 300l100 0"/>\n'
+
+
+def test_svgz_output_is_gzip(tmp_path):
+    out = tmp_path / "a.svgz"
+    engine.create_svg_from_paths(str(out), _random_paths(5), 200, 200, 96, 0.1, "blue")
+    with gzip.open(out, "rt", encoding="utf-8") as f: text = f.read()
+    assert text.startswith("<svg") and text.count("<path") == 5
+
+
+def test_convert_image_writes_svgz(tmp_path):
+    from test_engine import make_sketch
+    make_sketch(str(tmp_path / "s.png"))
+    params = engine.ConversionParams(mode="centerline", svg_compress=True)
+    outputs = engine.convert_image(str(tmp_path / "s.png"), params, str(tmp_path))
+    assert outputs[0].endswith("__centerline.svgz") and os.path.getsize(outputs[0]) > 0
@@ -0,0 +1,93 @@
+import os
+import sys
+
+import tracemalloc
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import benchmark
+import engine
+import tiling
+
+TINY_BUDGET = 1 # MB: franges de poques files
+
+
+@pytest.fixture(scope="module")
+def sketch():
+    return benchmark.synthetic_sketch(400, 900, noise=0.04, seed=5)
+
+
+@pytest.mark.parametrize("changes", [
+    {},
+    {"median_filter": True, "opening_radius": 2, "min_area": 30},
+    {"keep_largest": 7, "remove_border": True},
+    {"max_area": 400, "fill_holes": 60},
+    {"bin_method": "global", "threshold": 150, "invert": True, "min_area": 10},
+    {"clahe": True, "illum_sigma": 8.0, "block_size": 25, "C": 4},
+    {"illum_method": "fast", "opening_radius": 1}, # Piràmide per franges
+    {"illum_method": "fastest", "illum_sigma": 150.0},
+    {"illum_method": "fast", "illum_sigma": 10.0}, # Sense nivells: difuminat exacte per franges
+])
+def test_tiled_preprocess_matches_untiled(sketch, changes):
+    params = engine.ConversionParams(mode="centerline", illum_method="exact", tile_budget_mb=0).replace(**changes)
+    expected = engine.preprocess(sketch, params)
+    stats = {}
+    tiled = tiling.preprocess_tiled(sketch, params, engine.PREPROCESS_STAGES, TINY_BUDGET, stats)
+    assert np.array_equal(tiled, expected)
+    assert any(s.get("strip", 0) > 0 for s in stats["spans"]) # S'ha processat per franges
+
+
+def test_components_across_strips_are_joined():
+    img = np.zeros((100, 60), np.uint8)
+    cv2.line(img, (5, 5), (50, 95), 255, 1) # Diagonal: travessa les franges en connectivitat 8
+    img[40:44, 40:44] = 255
+    img[0:100, 58] = 255 # Toca la vora
+    comps = tiling.StripComponents(lambda a, b: img[a:b], img.shape, 8, 16)
+    assert len(comps.offsets) == 7
+    assert sorted(comps.area[1:].tolist()) == [16, 91, 100]
+    keep = comps.select(keep_largest=1, remove_border=True)
+    out = np.zeros_like(img)
+    def write(y0, strip): out[y0:y0 + len(strip)] = strip
+    comps.paint(keep, write)
+    assert np.count_nonzero(out) == 91 and out[5, 5] == 255 and out[40, 40] == 0
+
+
+def test_keep_largest_breaks_ties_by_position():
+    img = np.zeros((50, 50), np.uint8)
+    for y, x in ((30, 30), (5, 40), (5, 10), (30, 2)): img[y:y + 3, x:x + 3] = 255
+    out = engine.filter_components(img, keep_largest=2)
+    assert out[5, 10] == 255 and out[5, 40] == 255 and out[30, 2] == 0 and out[30, 30] == 0
+
+
+def test_preprocess_tiles_only_large_images(sketch):
+    assert not tiling.should_tile(sketch.shape, 1024) and not tiling.should_tile((10**5, 10**5), 0)
+    assert tiling.should_tile(sketch.shape, TINY_BUDGET)
+    params = engine.ConversionParams(tile_budget_mb=TINY_BUDGET)
+    stats = {}
+    work = engine.Pipeline().run(sketch, ("img",), params, stats=stats)
+    assert np.array_equal(work, engine.preprocess(sketch, params.replace(tile_budget_mb=0)))
+    assert any("strip" in s for s in stats["spans"])
+
+
+def _peak_mb(fn):
+    tracemalloc.start()
+    try:
+        fn(); return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def test_pyramid_illumination_stays_within_budget():
+    img = benchmark.synthetic_sketch(3000, 2000, noise=0.04, seed=1)
+    params = engine.ConversionParams(tile_budget_mb=0) # Il·luminació "fast" per defecte
+    stages = [stage for stage in engine.PREPROCESS_STAGES if stage.name == "illumination"]
+    budget_mb = 2
+    assert _peak_mb(lambda: engine._illumination(img, params)) > 3 * budget_mb # Sense franges no hi cap
+    stats, out = {}, []
+    assert _peak_mb(lambda: out.append(tiling.preprocess_tiled(img, params, stages, budget_mb, stats))) <= budget_mb
+    assert np.array_equal(out[0], engine._illumination(img, params))
+    assert [s.get("strips") for s in stats["spans"]] == [True]
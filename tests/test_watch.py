@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import batch
+import engine
+import watch
+from test_engine import make_sketch
+
+
+def _poll_until(watcher, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        ready = watcher.poll()
+        if ready: return ready
+    return []
+
+
+@pytest.mark.parametrize("use_inotify", [False, True])
+def test_watcher_reports_new_and_changed_images(tmp_path, use_inotify):
+    watcher = watch.FolderWatcher(str(tmp_path), settle=0.2, poll_interval=0.05, use_inotify=use_inotify)
+    if use_inotify and watcher.backend != "inotify": pytest.skip("inotify no disponible")
+    try:
+        assert watcher.poll() == []
+        (tmp_path / "a.png").write_bytes(b"x" * 10)
+        (tmp_path / "notes.txt").write_text("no")
+        assert _poll_until(watcher) == [str(tmp_path / "a.png")]
+        assert watcher.poll() == [] # Ja lliurada
+        time.sleep(0.01)
+        (tmp_path / "a.png").write_bytes(b"y" * 20)
+        assert _poll_until(watcher) == [str(tmp_path / "a.png")]
+    finally:
+        watcher.close()
+
+
+def test_watcher_waits_until_file_stops_growing(tmp_path):
+    watcher = watch.FolderWatcher(str(tmp_path), settle=0.3, poll_interval=0.05, use_inotify=False)
+    path = tmp_path / "foto.jpg"
+    with open(path, "wb") as f:
+        for _ in range(5):
+            f.write(b"z" * 100); f.flush()
+            assert watcher.poll() == []
+            time.sleep(0.1)
+    assert _poll_until(watcher) == [str(path)]
+
+
+def test_watcher_can_skip_existing_images(tmp_path):
+    (tmp_path / "old.png").write_bytes(b"x")
+    watcher = watch.FolderWatcher(str(tmp_path), settle=0.1, poll_interval=0.05, use_inotify=False, include_existing=False)
+    assert _poll_until(watcher, 0.5) == []
+    (tmp_path / "new.png").write_bytes(b"x")
+    assert _poll_until(watcher) == [str(tmp_path / "new.png")]
+
+
+def test_watch_service_converts_dropped_images(tmp_path):
+    folder, out_dir = tmp_path / "entrada", tmp_path / "sortida"
+    folder.mkdir()
+    done = threading.Event()
+    results = []
+    watcher = watch.FolderWatcher(str(folder), settle=0.2, poll_interval=0.05)
+    service = watch.WatchService(str(folder), engine.ConversionParams(mode="centerline"), str(out_dir), workers=1, on_result=lambda r: (results.append(r), done.set()), watcher=watcher)
+    service.start()
+    try:
+        make_sketch(tmp_path / "sketch.png")
+        os.replace(tmp_path / "sketch.png", folder / "sketch.png") # Com una sincronització que reanomena
+        assert done.wait(30)
+    finally:
+        service.stop()
+    assert not service.running
+    assert [r.status for r in results] == ["ok"]
+    assert results[0].outputs and all(os.path.exists(o) for o in results[0].outputs)
+    manifest = json.loads((out_dir / (watch.MANIFEST_PREFIX + batch.MANIFEST_JSON)).read_text(encoding="utf-8"))
+    assert manifest["summary"]["ok"] == 1
+    assert not (out_dir / batch.MANIFEST_JSON).exists() # L'informe del lot no es toca
+
+
+def test_watch_service_throttles_manifest_writes(tmp_path, monkeypatch):
+    writes = []
+    monkeypatch.setattr(batch, "write_manifest", lambda output_dir, results, params=None, prefix="": writes.append(len(results)))
+    service = watch.WatchService(str(tmp_path), engine.ConversionParams(), str(tmp_path / "sortida"), workers=1, watcher=watch.FolderWatcher(str(tmp_path), use_inotify=False))
+    for i in range(200): service._record(batch.FileResult(str(tmp_path / f"{i}.png"), "ok"))
+    assert writes == [1] # La primera de seguida, la resta esperen
+    service.stop()
+    assert writes == [1, 200]
+    service.stop()
+    assert writes == [1, 200] # Sense resultats nous no es torna a escriure
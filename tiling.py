@@ -0,0 +1,231 @@
+"""Preprocés per franges, amb la memòria limitada, per a escanejos molt grans.
+
+Un A1 escanejat a 600 dpi té centenars de megapíxels, i el preprocés normal
+en guarda diverses còpies senceres (grisos, difuminat, binària, etiquetes
+``int32``...). Aquí la imatge es processa per franges horitzontals de la
+mida que permet el pressupost de memòria, i els resultats intermedis es
+guarden en fitxers mapats a memòria.
+
+- Les etapes locals (mediana, il·luminació, binarització, inversió,
+  obertura) s'apliquen juntes a cada franja amb un marge de files a dalt i
+  a baix igual a la suma dels seus radis (``Stage.halo``); del resultat
+  només es conserva la part central, que és idèntica a la del procés sencer.
+- La neteja de components s'etiqueta franja a franja; els components que
+  travessen la frontera entre dues franges s'uneixen (union-find) i les
+  àrees i els requadres se sumen abans de decidir què es conserva.
+- La il·luminació amb piràmide té la seva pròpia versió per franges
+  (``Stage.strips``): cada nivell es redueix i es difumina franja a franja
+  i el fons s'amplia per franges.
+- Les etapes no locals sense versió per franges (CLAHE) s'apliquen a la
+  imatge sencera.
+
+El resultat és el mateix que el de ``engine.preprocess``. La imatge en
+grisos d'entrada i la de sortida ocupen un byte per píxel i no compten dins
+del pressupost.
+"""
+import tempfile
+
+import cv2
+import numpy as np
+
+import profiling
+
+DEFAULT_BUDGET_MB = 1024
+UNTILED_BYTES_PER_PX = 10 # Estimació del preprocés sencer (còpies, etiquetes int32)
+LOCAL_BYTES_PER_PX = 8 # Còpies vives en una franja d'etapes locals
+COMPONENT_BYTES_PER_PX = 10 # Franja, etiquetes int32 i taula de sortida
+MIN_STRIP_ROWS = 16
+
+
+def should_tile(shape, budget_mb):
+    """Cert si el preprocés sencer d'una imatge ``shape`` no cap a ``budget_mb`` MB (0 = sense límit)."""
+    return budget_mb > 0 and shape[0] * shape[1] * UNTILED_BYTES_PER_PX > budget_mb << 20
+
+
+def strip_rows(width, budget_bytes, bytes_per_px, halo=0):
+    """Files útils de cada franja perquè la franja amb els marges càpiga al pressupost.
+
+    Mai menys que ``halo``: amb franges més primes que els marges, el temps
+    de recalcular-los domina i el pressupost ja no es pot complir igualment.
+    """
+    return max(MIN_STRIP_ROWS, halo, budget_bytes // max(1, width * bytes_per_px) - 2 * halo)
+
+
+def temporary_array(shape):
+    """Array ``uint8`` en un fitxer temporal mapat a memòria, que no compta dins del pressupost."""
+    # El fitxer temporal no té nom; el mapatge el manté viu fins que s'allibera l'array.
+    with tempfile.TemporaryFile(prefix="trama-") as f:
+        return np.memmap(f, dtype=np.uint8, mode="w+", shape=shape)
+
+
+def select_components(area, top, left, sum_y, sum_x, touches, min_area=0, max_area=0, keep_largest=0, remove_border=False):
+    """Decideix quins components es conserven. L'índex 0 és el fons.
+
+    Amb ``keep_largest``, els empats d'àrea es desfan per la posició
+    (fila i columna del requadre, i suma de coordenades dels píxels), de
+    manera que el resultat no depèn de la numeració de les etiquetes.
+    """
+    keep = np.ones(len(area), bool); keep[0] = False
+    if min_area > 0: keep &= area >= min_area
+    if max_area > 0: keep &= area <= max_area
+    if remove_border: keep &= ~touches
+    if keep_largest > 0 and np.count_nonzero(keep) > keep_largest:
+        kept = np.flatnonzero(keep)
+        order = np.lexsort((sum_x[kept], sum_y[kept], left[kept], top[kept], -area[kept]))
+        keep[kept[order[keep_largest:]]] = False
+    return keep
+
+
+def component_stats(stats, centroids, shape, y0=0):
+    """Àrea, requadre, sumes de coordenades i contacte amb la vora de cada etiqueta.
+
+    ``y0`` és la fila de la imatge on comença la franja; ``shape`` és la
+    mida de la imatge sencera.
+    """
+    h, w = shape
+    area = stats[:, cv2.CC_STAT_AREA].astype(np.int64)
+    top, left = stats[:, cv2.CC_STAT_TOP] + y0, stats[:, cv2.CC_STAT_LEFT]
+    sum_y = np.rint(centroids[:, 1] * area).astype(np.int64) + y0 * area
+    sum_x = np.rint(centroids[:, 0] * area).astype(np.int64)
+    touches = (left == 0) | (top == 0) | (left + stats[:, cv2.CC_STAT_WIDTH] == w) | (top + stats[:, cv2.CC_STAT_HEIGHT] == h)
+    return area, top, left, sum_y, sum_x, touches
+
+
+def _find_roots(parent):
+    while True:
+        up = parent[parent]
+        if np.array_equal(up, parent): return parent
+        parent = up
+
+
+def _seam_pairs(last, first, connectivity):
+    """Parelles d'etiquetes globals que es toquen entre dues files consecutives."""
+    pairs = []
+    for shift in ((0,) if connectivity == 4 else (-1, 0, 1)):
+        a = last[max(0, -shift):len(last) - max(0, shift)]
+        b = first[max(0, shift):len(first) - max(0, -shift)]
+        mask = (a > 0) & (b > 0)
+        if mask.any(): pairs.append(np.column_stack((a[mask], b[mask])))
+    return np.unique(np.concatenate(pairs), axis=0) if pairs else np.empty((0, 2), np.int64)
+
+
+class StripComponents:
+    """Components connexos d'una imatge binària llegida per franges.
+
+    ``read(y0, y1)`` ha de retornar les files ``[y0, y1)`` amb el primer pla
+    a 255. Cada component global s'identifica amb la menor de les etiquetes
+    dels seus trossos (``roots``).
+    """
+
+    def __init__(self, read, shape, connectivity, rows):
+        self.read, self.shape, self.connectivity, self.rows = read, shape, connectivity, rows
+        columns = [[np.zeros(1, np.int64)] for _ in range(5)] + [[np.zeros(1, bool)]] # Índex 0: fons
+        self.offsets, seams, prev_last, offset = [], [], None, 0
+        for y0 in range(0, shape[0], rows):
+            n, labels, stats, centroids = self._label(y0)
+            for column, values in zip(columns, component_stats(stats[1:], centroids[1:], shape, y0)): column.append(values)
+            first, last = labels[0], labels[-1]
+            if prev_last is not None: seams.append(_seam_pairs(prev_last, np.where(first > 0, first + offset, 0), connectivity))
+            prev_last = np.where(last > 0, last + offset, 0)
+            del labels, first, last # Les etiquetes d'una franja no han de conviure amb les de la següent
+            self.offsets.append(offset)
+            offset += n - 1
+        area, top, left, sum_y, sum_x, touches = (np.concatenate(c) for c in columns)
+        parent = np.arange(offset + 1)
+        for a, b in (np.concatenate(seams) if seams else np.empty((0, 2), np.int64)).tolist():
+            ra, rb = self._find(parent, a), self._find(parent, b)
+            if ra != rb: parent[max(ra, rb)] = min(ra, rb)
+        self.roots = _find_roots(parent)
+        ids = np.unique(self.roots)
+        self.index = np.zeros(offset + 1, np.int64)
+        self.index[ids] = np.arange(len(ids)) # Posició de cada arrel a les taules compactes
+        r = self.index[self.roots]
+        self.area = np.bincount(r, area, len(ids)).astype(np.int64)
+        self.sum_y = np.bincount(r, sum_y, len(ids)).astype(np.int64)
+        self.sum_x = np.bincount(r, sum_x, len(ids)).astype(np.int64)
+        self.top = np.full(len(ids), np.iinfo(np.int64).max); np.minimum.at(self.top, r, top)
+        self.left = np.full(len(ids), np.iinfo(np.int64).max); np.minimum.at(self.left, r, left)
+        self.touches = np.zeros(len(ids), bool); np.logical_or.at(self.touches, r, touches)
+
+    @staticmethod
+    def _find(parent, a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]; a = parent[a]
+        return a
+
+    def _label(self, y0):
+        strip = np.ascontiguousarray(self.read(y0, min(self.shape[0], y0 + self.rows)))
+        return cv2.connectedComponentsWithStats(strip, self.connectivity, cv2.CV_32S)
+
+    def select(self, **criteria):
+        return select_components(self.area, self.top, self.left, self.sum_y, self.sum_x, self.touches, **criteria)
+
+    def paint(self, keep, write):
+        """Torna a etiquetar cada franja i crida ``write(y0, franja)``, amb 255 als components de ``keep``."""
+        values = np.where(keep[self.index[self.roots]], 255, 0).astype(np.uint8)
+        for y0, offset in zip(range(0, self.shape[0], self.rows), self.offsets):
+            n, labels = self._label(y0)[:2]
+            lut = values[offset:offset + n].copy() # L'etiqueta local l és la global offset + l
+            lut[0] = 0
+            write(y0, lut[labels])
+
+
+def _cleanup(src, dst, params, budget_bytes, stats):
+    rows = strip_rows(src.shape[1], budget_bytes, COMPONENT_BYTES_PER_PX)
+    with profiling.timed(stats, "cleanup", pixels=src.size) as info:
+        comps = StripComponents(lambda a, b: src[a:b], src.shape, 8, rows)
+        keep = comps.select(min_area=params.min_area, max_area=params.max_area, keep_largest=params.keep_largest, remove_border=params.remove_border)
+        def write(y0, strip): dst[y0:y0 + len(strip)] = strip
+        comps.paint(keep, write)
+        info["strips"] = len(comps.offsets)
+    if params.fill_holes <= 0: return
+    with profiling.timed(stats, "fill_holes", pixels=src.size):
+        holes = StripComponents(lambda a, b: cv2.bitwise_not(np.ascontiguousarray(dst[a:b])), dst.shape, 4, rows)
+        fill = (holes.area < params.fill_holes) & ~holes.touches
+        fill[0] = False
+        def fill_write(y0, strip): dst[y0:y0 + len(strip)] |= strip
+        holes.paint(fill, fill_write)
+
+
+def _run_local(stages, src, dst, params, budget_bytes, stats):
+    halo = sum(stage.halo(params) for stage in stages)
+    h = src.shape[0]
+    rows = strip_rows(src.shape[1], budget_bytes, LOCAL_BYTES_PER_PX, halo)
+    for y0 in range(0, h, rows):
+        y1 = min(h, y0 + rows)
+        a, b = max(0, y0 - halo), min(h, y1 + halo)
+        strip = np.ascontiguousarray(src[a:b])
+        for stage in stages:
+            with profiling.timed(stats, stage.name, pixels=strip.size, strip=y0 // rows): strip = stage.run(strip, params)
+        dst[y0:y1] = strip[y0 - a:y1 - a]
+
+
+def preprocess_tiled(img_gray, params, stages, budget_mb=DEFAULT_BUDGET_MB, stats=None):
+    """Aplica les ``stages`` actives a ``img_gray`` per franges dins de ``budget_mb`` MB.
+
+    Les etapes amb ``halo`` per a ``params`` es fan per franges; l'etapa ``cleanup``, amb
+    components per franges; les que tenen ``strips``, amb la seva versió per
+    franges; la resta, a la imatge sencera. Retorna un array
+    amb el contingut en un fitxer temporal mapat a memòria.
+    """
+    budget_bytes = max(1, budget_mb) << 20
+    active = [stage for stage in stages if stage.key(params) is not None]
+    current, i = img_gray, 0
+    local = [stage.halo is not None and stage.halo(params) is not None for stage in active]
+    while i < len(active):
+        out = temporary_array(img_gray.shape)
+        if local[i]:
+            group = [active[i]]
+            while i + len(group) < len(active) and local[i + len(group)]: group.append(active[i + len(group)])
+            _run_local(group, current, out, params, budget_bytes, stats)
+            i += len(group)
+        elif active[i].name == "cleanup":
+            _cleanup(current, out, params, budget_bytes, stats); i += 1
+        elif active[i].strips is not None:
+            with profiling.timed(stats, active[i].name, pixels=current.size, strips=True): active[i].strips(current, out, params, budget_bytes)
+            i += 1
+        else:
+            with profiling.timed(stats, active[i].name, pixels=current.size): out[:] = active[i].run(np.asarray(current), params)
+            i += 1
+        current = out
+    return current.view(np.ndarray) if isinstance(current, np.memmap) else current.copy()
@@ -0,0 +1,284 @@
+"""Mode de vigilància: converteix les imatges que arriben a una carpeta.
+
+``FolderWatcher`` detecta les imatges noves o modificades d'una carpeta amb
+inotify (Linux, via ``ctypes``) o, si no n'hi ha o la carpeta és una unitat
+de xarxa, comparant la mida i la data de modificació a cada passada. Un
+fitxer es dona per complet quan fa ``settle`` segons que no canvia.
+
+``WatchService`` posa els fitxers complets en una cua limitada i els
+converteix amb un nombre fix de processos. Si la conversió no dona l'abast i
+la cua s'omple, el vigilant s'espera: els canvis nous s'acumulen al nucli
+(o es veuen a la passada següent) en lloc de fer créixer la memòria.
+"""
+import concurrent.futures
+import ctypes
+import ctypes.util
+import multiprocessing
+import os
+import queue
+import select
+import struct
+import threading
+import time
+import traceback
+
+import batch
+import engine
+
+DEFAULT_SETTLE = 2.0 # Segons sense canvis per donar un fitxer per escrit
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_QUEUE_SIZE = 16
+EVICT_EVERY = 50 # Conversions entre neteges de la memòria cau
+MANIFEST_PREFIX = "watch_" # watch_manifest.json: no trepitja l'informe de l'exportació per lots
+MANIFEST_INTERVAL = 5.0 # Segons mínims entre reescriptures del manifest
+
+_IN_MODIFY, _IN_CLOSE_WRITE, _IN_MOVED_FROM, _IN_MOVED_TO = 0x2, 0x8, 0x40, 0x80
+_IN_CREATE, _IN_DELETE, _IN_Q_OVERFLOW = 0x100, 0x200, 0x4000
+_IN_NONBLOCK, _IN_CLOEXEC = 0o4000, 0o2000000
+_IN_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII")
+_STEP = 0.2 # Període de comprovació de l'aturada als fils del servei
+
+
+def _is_image(name):
+    return name.lower().endswith(engine.IMAGE_EXTENSIONS) and not name.startswith('.')
+
+
+def _signature(path):
+    try: st = os.stat(path)
+    except OSError: return None
+    return st.st_size, st.st_mtime_ns
+
+
+class _Inotify:
+    """Noms dels fitxers que canvien en una carpeta, llegits d'inotify."""
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0: raise OSError(ctypes.get_errno(), "inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), _IN_MASK) < 0:
+            err = ctypes.get_errno(); os.close(self.fd)
+            raise OSError(err, "inotify_add_watch")
+
+    def read(self, timeout):
+        """Espera fins a ``timeout`` segons. Retorna ``None`` si el nucli ha perdut esdeveniments."""
+        if not select.select([self.fd], [], [], timeout)[0]: return set()
+        try: data = os.read(self.fd, 1 << 16)
+        except BlockingIOError: return set()
+        names, pos = set(), 0
+        while pos + _EVENT.size <= len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size + length
+            if mask & _IN_Q_OVERFLOW: return None
+            name = os.fsdecode(data[pos - length:pos].rstrip(b"\0"))
+            if name: names.add(name)
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Detecta les imatges d'una carpeta que s'acaben d'escriure.
+
+    Amb ``use_inotify`` es fa servir inotify si està disponible; si no, es
+    compara el contingut de la carpeta cada ``poll_interval`` segons.
+    inotify no veu els canvis fets des d'altres ordinadors en una carpeta
+    compartida, per això es pot desactivar. Amb ``include_existing`` les
+    imatges que ja hi són també es lliuren a la primera crida.
+    """
+
+    def __init__(self, folder, settle=DEFAULT_SETTLE, poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True, include_existing=True):
+        self.folder = folder
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self._inotify = None
+        if use_inotify:
+            try: self._inotify = _Inotify(folder)
+            except (OSError, AttributeError): pass # Sense inotify (no és Linux)
+        self._delivered = {} # nom -> signatura del fitxer ja lliurat
+        self._pending = {} # nom -> (signatura, instant del darrer canvi)
+        self._rescan = True
+        if not include_existing: self._delivered = self._scan() or {}
+
+    @property
+    def backend(self):
+        return "inotify" if self._inotify is not None else "polling"
+
+    def _scan(self):
+        try:
+            with os.scandir(self.folder) as it:
+                return {e.name: (e.stat().st_size, e.stat().st_mtime_ns) for e in it if _is_image(e.name) and e.is_file()}
+        except OSError:
+            return None # Carpeta no disponible (p. ex. unitat desconnectada)
+
+    def _timeout(self, now):
+        if not self._pending: return self.poll_interval
+        first = min(since for _, since in self._pending.values()) + self.settle
+        return max(0.05, min(self.poll_interval, first - now))
+
+    def poll(self):
+        """Espera canvis i retorna les rutes de les imatges ja completes."""
+        timeout = self._timeout(time.monotonic())
+        if self._inotify is not None and not self._rescan:
+            names = self._inotify.read(timeout)
+            if names is None: self._rescan = True # S'han perdut esdeveniments
+            current = None
+            changed = {n for n in names or () if _is_image(n)}
+        else:
+            if not self._rescan: time.sleep(timeout)
+            current = self._scan()
+            if current is None: return []
+            self._rescan = False
+            changed = {n for n, sig in current.items() if self._delivered.get(n) != sig}
+            for name in [n for n in self._delivered if n not in current]: del self._delivered[name]
+        now = time.monotonic()
+        ready = []
+        for name in changed | set(self._pending):
+            path = os.path.join(self.folder, name)
+            sig = current.get(name) if current is not None else _signature(path)
+            if sig is None or sig == self._delivered.get(name):
+                self._pending.pop(name, None)
+                if sig is None: self._delivered.pop(name, None)
+                continue
+            last = self._pending.get(name)
+            if last is None or last[0] != sig:
+                self._pending[name] = (sig, now)
+            elif now - last[1] >= self.settle and sig[0] > 0:
+                del self._pending[name]
+                self._delivered[name] = sig
+                ready.append(path)
+        return sorted(ready)
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close(); self._inotify = None
+
+
+class WatchService:
+    """Converteix, amb ``params``, cada imatge que arriba a ``folder``.
+
+    ``workers`` <= 1 converteix en un fil del mateix procés. Com a molt hi
+    ha ``queue_size`` fitxers esperant i ``workers`` en conversió.
+    ``on_result(result)`` es crida des d'un fil del servei amb cada
+    ``FileResult``; els resultats s'afegeixen a ``watch_manifest.json``, que es
+    reescriu com a molt cada ``MANIFEST_INTERVAL`` segons i en aturar el
+    servei. ``cache`` és un ``result_cache.ResultCache`` opcional.
+    """
+
+    def __init__(self, folder, params, output_dir, workers=None, queue_size=DEFAULT_QUEUE_SIZE, cache=None, on_result=None, watcher=None):
+        self.params = params
+        self.output_dir = output_dir
+        self.workers = batch.default_workers() if not workers else workers
+        self.cache = cache
+        self.on_result = on_result
+        self.watcher = watcher or FolderWatcher(folder)
+        self._queue = queue.Queue(max(1, queue_size))
+        self._slots = threading.BoundedSemaphore(max(1, self.workers))
+        self._stop = threading.Event()
+        self._ctx = multiprocessing.get_context("spawn")
+        self._cancel_event = self._ctx.Event() if self.workers > 1 else threading.Event()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._results = {}
+        self._converted = 0
+        self._manifest_lock = threading.Lock()
+        self._manifest_dirty = False
+        self._manifest_at = time.monotonic() - MANIFEST_INTERVAL
+        self._threads = []
+
+    @property
+    def results(self):
+        with self._lock: return list(self._results.values())
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._threads = [threading.Thread(target=self._watch_loop, daemon=True), threading.Thread(target=self._dispatch_loop, daemon=True)]
+        for t in self._threads: t.start()
+        return self
+
+    def stop(self, wait=True):
+        """Atura la vigilància i les conversions en curs."""
+        self._stop.set()
+        self._cancel_event.set()
+        with self._lock:
+            if self._executor is not None: self._executor.shutdown(wait=False, cancel_futures=True)
+        if wait:
+            for t in self._threads: t.join()
+        self._write_manifest(force=True)
+        if self.cache is not None:
+            try: self.cache.evict()
+            except OSError: traceback.print_exc()
+
+    def _watch_loop(self):
+        try:
+            while not self._stop.is_set():
+                for path in self.watcher.poll():
+                    while not self._stop.is_set(): # Contrapressió: espera lloc a la cua
+                        try: self._queue.put(path, timeout=_STEP); break
+                        except queue.Full: pass
+        finally:
+            self.watcher.close()
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            try: path = self._queue.get(timeout=_STEP)
+            except queue.Empty:
+                self._write_manifest(); continue # Resultats pendents d'escriure
+            if self.workers <= 1:
+                self._record(batch._convert_one(path, self.params, self.output_dir, self._cancel_event, self.cache))
+                continue
+            while not self._slots.acquire(timeout=_STEP):
+                if self._stop.is_set(): return
+            try:
+                future = self._pool().submit(batch._convert_one, path, self.params, self.output_dir, None, self.cache)
+            except RuntimeError: # Grup tancat per stop()
+                self._slots.release(); return
+            future.add_done_callback(lambda f, p=path: self._on_future(p, f))
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=self._ctx, initializer=batch._init_worker, initargs=(self._cancel_event,))
+            return self._executor
+
+    def _on_future(self, path, future):
+        self._slots.release()
+        if future.cancelled(): return
+        try:
+            result = future.result()
+        except concurrent.futures.process.BrokenProcessPool:
+            # Un procés ha mort: el grup es torna a crear per al fitxer següent.
+            with self._lock:
+                if self._executor is not None: self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            result = batch.FileResult(path, "error", error="El procés de conversió s'ha aturat inesperadament.")
+        self._record(result)
+
+    def _record(self, result):
+        if result.status == "cancelled": return
+        with self._lock:
+            self._results.pop(result.image, None) # La conversió més recent va al final
+            self._results[result.image] = result
+            self._converted += 1
+            evict = self._converted % EVICT_EVERY == 0
+            self._manifest_dirty = True
+        self._write_manifest()
+        if self.cache is not None and evict:
+            try: self.cache.evict()
+            except OSError: traceback.print_exc()
+        if self.on_result: self.on_result(result)
+
+    def _write_manifest(self, force=False):
+        """Reescriu el manifest si hi ha resultats nous i fa prou que no s'ha escrit (o amb ``force``)."""
+        with self._manifest_lock:
+            with self._lock:
+                if not self._manifest_dirty or (not force and time.monotonic() - self._manifest_at < MANIFEST_INTERVAL): return
+                results, self._manifest_dirty = list(self._results.values()), False
+            batch.write_manifest(self.output_dir, results, self.params, prefix=MANIFEST_PREFIX)
+            self._manifest_at = time.monotonic()